@@ -1,22 +1,36 @@
 import os
+import stat
 import shutil
-import psutil
-from win32gui import GetOpenFileNameW
-from backup_manager import BackupManager  # Предполагается, что ваш BackupManager уже существует
+from backup_manager import BackupManager, BACKUP_DIR_ENV  # Предполагается, что ваш BackupManager уже существует
+from delta_sync import sync_file
+from dir_walker import walk_tree, stat_or_none, is_stale
+from copy_scheduler import CopyScheduler
+from preflight import fit_files
+from change_recorder import consumer_name, read_changes, commit_changes, CHANGE_LOG_FILENAME
+from drive_manifest import DriveManifest, manifest_key
+from backup_plan import build_plan, select_items, parse_choices, ACTION_SKIP, POLICY_ALL
+from hashers import DEFAULT_ALGORITHM, format_digest
+import run_report
+
+CHANGE_CONSUMER = "backup_info"  # Имя движка в позициях журнала изменений (change_recorder)
+# Статусы меню -> статусы проверки, по которым строится план (остальные записи актуальны)
+CHANGE_STATUSES = {"Добавить": "отсутствует", "Обновить": "неактуален"}
 
 
 def get_flash_drive():
-    """Определяет первую подключенную флешку."""
+    """Определяет точку монтирования первой подключенной флешки (на Windows совпадает с именем устройства)."""
+    import psutil
     partitions = psutil.disk_partitions()
     for partition in partitions:
         if 'removable' in partition.opts.lower():
-            return partition.device
+            return partition.mountpoint
     return None
 
 
 def auto_backup():
     """Основная логика автоматического резервирования."""
-    flash_drive_path = get_flash_drive()
+    with run_report.phase("drive_detection"):
+        flash_drive_path = get_flash_drive()
     if not flash_drive_path:
         print("Флешка не обнаружена. Завершение работы.")
         return
@@ -24,35 +38,28 @@ def auto_backup():
     flash_drive_backup = os.path.join(flash_drive_path, "backup_info.txt")
     local_backup = "backup_info.txt"
 
-    backup_manager = BackupManager()
+    with run_report.phase("metadata_load"):
+        backup_manager = BackupManager()
 
-    if not backup_manager.check_backup_info_exists():
-        print("Локальный файл резервирования отсутствует. Копируем с флешки...")
-        shutil.copy2(flash_drive_backup, local_backup)
-        print("Файл резервирования успешно скопирован с флешки.")
-    else:
-        print("Локальный файл резервирования найден. Используем его.")
-
-    entries = backup_manager.read_backup_info()
-    changes = []
-    for entry in entries:
-        source_file = entry['From']
-        target_file = os.path.join(flash_drive_path, entry['To'], entry['Name'])
-
-        if not os.path.exists(source_file):
-            changes.append((entry, "Пропущен (файл отсутствует)"))
-            continue
-
-        if os.path.exists(target_file):
-            source_modified = os.path.getmtime(source_file)
-            target_modified = os.path.getmtime(target_file)
-            if source_modified > target_modified:
-                changes.append((entry, "Обновить"))
-            else:
-                changes.append((entry, "Актуален"))
+        if not backup_manager.check_backup_info_exists():
+            print("Локальный файл резервирования отсутствует. Копируем с флешки...")
+            shutil.copy2(flash_drive_backup, local_backup)
+            print("Файл резервирования успешно скопирован с флешки.")
         else:
-            changes.append((entry, "Добавить"))
-
+            print("Локальный файл резервирования найден. Используем его.")
+        backup_manager.read_backup_info()
+
+    # Журнал изменений (если ведётся): проверяются только записи, изменившиеся с прошлого копирования на эту флешку.
+    # Без журнала идентификатор на флешку не записывается
+    journal_dir = os.path.dirname(backup_manager.backup_file)
+    consumer, dirty, token = None, None, None
+    if os.path.exists(os.path.join(journal_dir, CHANGE_LOG_FILENAME)):
+        consumer = consumer_name(CHANGE_CONSUMER, flash_drive_path)
+        dirty, token = read_changes(journal_dir, consumer)
+    changes = refresh_changes(backup_manager, flash_drive_path, dirty)
+
+    if not any(status in ("Добавить", "Обновить") for _, status in changes):
+        commit_changes(journal_dir, consumer, token)
     if not changes:
         print("Все файлы актуальны. Резервирование не требуется.")
         return
@@ -80,53 +87,113 @@ def auto_backup():
             except ValueError:
                 print("Неверный ввод. Попробуйте снова.")
         elif user_input == "*":
-            update_all_files(changes, backup_manager, flash_drive_path)
+            # Позиция журнала сдвигается, только если скопированы все изменившиеся записи
+            if update_all_files(changes, backup_manager, flash_drive_path):
+                commit_changes(journal_dir, consumer, token)
+            else:
+                print("Не все файлы скопированы: при следующем запуске они будут проверены снова.")
         elif user_input == "+":
             add_new_file(backup_manager)
-            changes = refresh_changes(backup_manager, flash_drive_path)
+            changes = refresh_changes(backup_manager, flash_drive_path, dirty)
         elif user_input == "-":
             remove_file_from_backup(backup_manager)
-            changes = refresh_changes(backup_manager, flash_drive_path)
+            changes = refresh_changes(backup_manager, flash_drive_path, dirty)
         else:
             print("Неверный ввод. Попробуйте снова.")
 
 
+def changes_plan(changes, flash_drive_path):
+    """
+    План резервирования (backup_plan) по списку изменений: номера пунктов меню — номера записей плана.
+    Записи, которые нужно добавить или обновить, — неактуальные записи плана, остальные пропускаются.
+    """
+    statuses = [CHANGE_STATUSES.get(status, "актуален") for _, status in changes]
+    entries = [dict(entry, To=os.path.join(entry['To'], entry['Name'])) for entry, _ in changes]
+    return build_plan(entries, statuses, flash_drive_path)
+
+
 def update_selected_files(file_indices, changes, backup_manager, flash_drive_path):
     """Обновление выбранных файлов."""
     for idx in file_indices:
         if idx < 1 or idx > len(changes):
             print(f"Файл с номером {idx} отсутствует в списке.")
-            continue
-        entry, status = changes[idx - 1]
-        if status in ("Добавить", "Обновить"):
-            copy_file(entry, backup_manager, flash_drive_path)
-    print("Выбранные файлы обновлены.")
+    items = parse_choices(changes_plan(changes, flash_drive_path), ",".join(map(str, file_indices)))
+    selected = [changes[item["index"] - 1][0] for item in items if item["action"] != ACTION_SKIP]
+    copied, _ = copy_files(selected, backup_manager, flash_drive_path)
+    print(f"Выбранные файлы обновлены: {len(copied)} из {len(selected)}.")
 
 
 def update_all_files(changes, backup_manager, flash_drive_path):
-    """Обновление всех файлов."""
-    for entry, status in changes:
-        if status in ("Добавить", "Обновить"):
-            copy_file(entry, backup_manager, flash_drive_path)
-    print("Все файлы обновлены.")
+    """
+    Обновление всех файлов. Возвращает True, если скопированы все файлы, которые нужно было обновить:
+    файлы, не поместившиеся на флешку или не скопированные из-за ошибки, остаются неактуальными.
+    """
+    items = select_items(changes_plan(changes, flash_drive_path), POLICY_ALL)
+    selected = [changes[item["index"] - 1][0] for item in items]
+    run_report.count("files_skipped", len(changes) - len(selected))
+    copied, deferred = copy_files(selected, backup_manager, flash_drive_path)
+    print(f"Обновлено файлов: {len(copied)} из {len(selected)}.")
+    return not deferred and len(copied) == len(selected)
+
+
+def copy_files(entries, backup_manager, flash_drive_path):
+    """
+    Копирование файлов на флешку через планировщик: чтение источников идёт параллельно,
+    запись на флешку — через очередь устройства. О каждом файле сообщается по мере готовности.
+    Хэши копий записываются в манифест флешки (drive_manifest.py) после партии копирования.
+
+    :return: Кортеж (скопированные записи, записи, отложенные из-за нехватки места).
+    """
+    jobs = []
+    for entry in entries:
+        source_file = entry['From']
+        target_file = os.path.join(flash_drive_path, entry['To'], entry['Name'])
+        # stat источника снимается до копирования — для записи хэша в кэш
+        jobs.append(((entry, stat_or_none(source_file), target_file), source_file, target_file))
+    # Копируется только то, что поместится на флешку
+    fitting = set(fit_files([(source_file, target_file) for _, source_file, target_file in jobs], flash_drive_path))
+    deferred = [job[0][0] for job in jobs if (job[1], job[2]) not in fitting]
+    jobs = [job for job in jobs if (job[1], job[2]) in fitting]
+
+    # Копирование и расчёт хэша за один проход; у больших файлов перезаписываются только изменившиеся блоки
+    scheduler = CopyScheduler(
+        lambda source, target, blocks: sync_file(source, target, flash_drive_path, DEFAULT_ALGORITHM, blocks)
+    )
+    manifest = DriveManifest(flash_drive_path)
+    copied_entries = []
+    with run_report.phase("copy"):
+        for (entry, source_stat, target_file), result, error in scheduler.run(jobs):
+            if error:
+                print(f"Ошибка при копировании файла {entry['Name']}: {error}")
+                run_report.count("files_failed")
+                continue
+            file_hash, copied = result
+            target_stat = stat_or_none(target_file)
+            if file_hash is not None and target_stat is not None:
+                manifest.record(manifest_key(flash_drive_path, target_file), target_stat,
+                                format_digest(DEFAULT_ALGORITHM, file_hash))
+            if source_stat and copied == source_stat.st_size:
+                # Хэш сохраняется в кэш менеджера
+                backup_manager.hash_cache.put(entry['From'], DEFAULT_ALGORITHM, file_hash, source_stat)
+            print(f"Файл {entry['Name']} скопирован на флешку.")
+            run_report.count("files_copied")
+            copied_entries.append(entry)
+    with run_report.phase("metadata_save"):
+        backup_manager.hash_cache.save()
+        manifest.save()
+    return copied_entries, deferred
 
 
 def copy_file(entry, backup_manager, flash_drive_path):
-    """Копирование файла на флешку."""
-    source_file = entry['From']
-    target_file = os.path.join(flash_drive_path, entry['To'], entry['Name'])
-    os.makedirs(os.path.dirname(target_file), exist_ok=True)
-    shutil.copy2(source_file, target_file)
-    print(f"Файл {entry['Name']} скопирован на флешку.")
-
-
-import win32gui
-import win32con
-import os
+    """Копирование файла на флешку. Возвращает True, если файл скопирован."""
+    return bool(copy_files([entry], backup_manager, flash_drive_path)[0])
 
 
 def add_new_file(backup_manager):
     """Добавление нового файла в резервирование."""
+    # pywin32 нужен только для диалога выбора файла
+    import win32gui
+    import win32con
 
     # Перемещение текущего окна на передний план
     current_window = win32gui.GetForegroundWindow()
@@ -171,6 +238,7 @@ def add_new_file(backup_manager):
         "Size": os.path.getsize(file_path),
         "Hash": backup_manager.calculate_file_hash(file_path),
     }
+    backup_manager.hash_cache.save()
     if backup_manager.add_new_entry(entry):
         print(f"Файл {entry['Name']} добавлен в резервирование.")
     else:
@@ -187,8 +255,8 @@ def remove_file_from_backup(backup_manager):
     try:
         file_index = int(input("Введите номер файла для удаления: ").strip())
         if 1 <= file_index <= len(entries):
-            removed_entry = entries.pop(file_index - 1)
-            backup_manager.write_backup_info(entries)
+            removed_entry = entries[file_index - 1]
+            backup_manager.remove_entry(removed_entry['Name'])
             print(f"Файл {removed_entry['Name']} удален из резервирования.")
         else:
             print("Неверный номер. Попробуйте снова.")
@@ -196,29 +264,68 @@ def remove_file_from_backup(backup_manager):
         print("Неверный ввод. Попробуйте снова.")
 
 
-def refresh_changes(backup_manager, flash_drive_path):
+def refresh_changes(backup_manager, flash_drive_path, dirty=None):
     """Обновить список изменений после добавления или удаления."""
     entries = backup_manager.read_backup_info()
-    changes = []
+    with run_report.phase("stat_scan"):
+        return list(iter_changes(entries, flash_drive_path, dirty))
+
+
+def iter_changes(entries, flash_drive_path, dirty=None):
+    """
+    Потоково сравнивает записи с копиями на флешке и выдаёт пары (запись, статус).
+    dirty — изменения из журнала (change_recorder.DirtySet): остальные записи считаются актуальными без stat.
+    """
     for entry in entries:
         source_file = entry['From']
         target_file = os.path.join(flash_drive_path, entry['To'], entry['Name'])
 
-        if not os.path.exists(source_file):
-            changes.append((entry, "Пропущен (файл отсутствует)"))
+        if dirty is not None and not dirty.affects(source_file):
+            yield entry, "Актуален"
             continue
 
-        if os.path.exists(target_file):
-            source_modified = os.path.getmtime(source_file)
-            target_modified = os.path.getmtime(target_file)
-            if source_modified > target_modified:
-                changes.append((entry, "Обновить"))
-            else:
-                changes.append((entry, "Актуален"))
+        source_stat = stat_or_none(source_file)
+        if source_stat is None:
+            yield entry, "Пропущен (файл отсутствует)"
+        elif stat.S_ISDIR(source_stat.st_mode):
+            yield from iter_directory_changes(entry, target_file)
         else:
-            changes.append((entry, "Добавить"))
-    return changes
+            target_stat = stat_or_none(target_file)
+            if target_stat is None:
+                yield entry, "Добавить"
+            elif is_stale(source_stat, target_stat):
+                yield entry, "Обновить"
+            else:
+                yield entry, "Актуален"
+
+
+def iter_directory_changes(entry, target_root):
+    """
+    Раскрывает запись-папку: выдаёт отдельные записи только для файлов, которые нужно скопировать,
+    и в конце — саму папку с числом актуальных файлов.
+    """
+    up_to_date = 0
+    for source_path, target_path, source_stat, target_stat in walk_tree(entry['From'], target_root):
+        if not is_stale(source_stat, target_stat):
+            up_to_date += 1
+            continue
+        relative_path = os.path.relpath(source_path, entry['From'])
+        file_entry = dict(entry, Name=os.path.join(entry['Name'], relative_path), From=source_path)
+        yield file_entry, "Добавить" if target_stat is None else "Обновить"
+    yield entry, f"Папка (актуальных файлов: {up_to_date})"
+
+
+def main():
+    """
+    Запуск с замерами этапов; отчёт сохраняется в папке программы рядом с backup_info.txt
+    (папка из переменной окружения BackupManager, если она задана, иначе папка скрипта).
+    """
+    run_report.start_run("auto_backup")
+    try:
+        auto_backup()
+    finally:
+        run_report.finish_run(os.getenv(BACKUP_DIR_ENV) or os.path.dirname(os.path.abspath(__file__)))
 
 
 if __name__ == "__main__":
-    auto_backup()
+    main()
@@ -1,50 +1,163 @@
 import os
-import hashlib
+import stat
 from datetime import datetime
-import psutil
-
-
-
-def calculate_file_hash(file_path):
-    """Вычисление хэша файла для проверки актуальности."""
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
-
-
-def read_metadata(metadata_path):
-    """Чтение метаданных из файла metadata.txt."""
-    metadata = []
-    with open(metadata_path, "r") as file:
-        entry = {}
-        for line in file:
-            line = line.strip()
-            if line == "----------------------------------------":  # Разделитель записей
-                if entry:
-                    metadata.append(entry)
-                entry = {}
-            elif ": " in line:  # Ключ-значение
-                key, value = line.split(": ", 1)
-                entry[key] = value
-            else:
-                print(f"Предупреждение: строка пропущена из-за некорректного формата: '{line}'")
-        if entry:  # Добавляем последнюю запись
-            metadata.append(entry)
-    return metadata
+from hash_cache import HashCache, HASH_CACHE_FILENAME, cached_file_hash
+from hash_engine import hash_files, DEFAULT_WORKERS_PER_DEVICE
+from file_copy import copy_file_with_hash, files_equal
+from metadata_store import MetadataStore, METADATA_DB_FILENAME, read_metadata
+from dir_walker import iter_stale_files, stat_or_none
+from compression import choose_codec, compress_copy, stored_path, CODEC_SUFFIXES
+
+from snapshot import create_snapshot, apply_retention
+from backup_plan import build_plan, print_plan_totals, parse_choices, select_items, plan_choices, covers_pending
+from change_recorder import consumer_name, read_changes, commit_changes, stick_id
+from copy_scheduler import CopyScheduler
+from multi_target import select_targets, target_entries, store_target_entries
+from preflight import fit_plan_items
+from drive_manifest import DriveManifest, manifest_key
+from packs import (PackStore, is_pack_reference, pack_reference, pack_member, member_name, should_pack,
+                   iter_stale_packed)
+from hashers import DEFAULT_ALGORITHM, format_digest, parse_digest, is_available
+from verify import (TIER_QUICK, TIER_FULL, quick_fingerprint, quick_matches, can_verify_quick, select_full_rotation,
+                    mark_verified)
+import run_report
+
+# Сжимать копии на флешке, если это заметно уменьшает их размер
+COMPRESS_COPIES = False
+# Хранить мелкие файлы в пакетах (packs.py): меньше записей каталога и обновлений FAT на флешке
+PACK_SMALL_FILES = False
+PACKED = "pack"  # Формат копии «в пакете» для remove_other_variants
+
+# Режим снимков: каждый запуск создаёт новую версию на флешке вместо перезаписи копий
+SNAPSHOT_MODE = False
+SNAPSHOT_KEEP_DAILY = 7  # Последних дней с ежедневным снимком
+SNAPSHOT_KEEP_WEEKLY = 4  # Последних недель с еженедельным снимком
+CHANGE_CONSUMER = "metadata"  # Имя движка в позициях журнала изменений (change_recorder)
+# Алгоритм хэшей в метаданных; hashers.FAST_ALGORITHM (xxhash, если установлен) быстрее, но только для этой машины
+HASH_ALGORITHM = DEFAULT_ALGORITHM
+
+
+
+def calculate_file_hash(file_path, cache=None):
+    """Вычисление хэша файла с префиксом алгоритма для проверки актуальности (с кэшем, если он передан)."""
+    return format_digest(HASH_ALGORITHM, cached_file_hash(file_path, HASH_ALGORITHM, cache))
+
 
+def check_files_on_flash_drive(metadata, flash_drive_path, cache=None, workers_per_device=DEFAULT_WORKERS_PER_DEVICE,
+                               changes=None, tier=TIER_QUICK, packs=None, manifest=None):
+    """
+    Проверяет наличие файлов на флешке и их актуальность. Возвращает список статусов в порядке метаданных.
+    Если передан журнал изменений (change_recorder.DirtySet), проверяются только затронутые им записи.
+    При tier=quick копии с отпечатком проверяются по нескольким участкам, а полностью хэшируется
+    только очередная часть записей (см. verify.py); при tier=full хэшируются все копии.
+    Уровень и время проверки записываются в записи метаданных.
+    Если переданы пакеты флешки (packs.PackStore), мелкие файлы папок сверяются с индексом пакетов;
+    файлы из записей с полем To вида pack:... проверяются по пакетам всегда.
+    Если передан манифест флешки (drive_manifest.DriveManifest), при быстрой проверке хэш копии, размер и время
+    изменения которой совпадают с манифестом, берётся из манифеста без чтения файла (кроме очередной части
+    записей, проверяемых полностью; участки копий с отпечатком при этом сверяются как обычно);
+    хэши прочитанных целиком копий записываются в манифест.
+    """
+    statuses = []
+    pack_store = packs
+    # Сжатые копии лежат на флешке с суффиксом кодека
+    paths_on_flash = [
+        stored_path(os.path.join(flash_drive_path, entry.get("To", "")), entry.get("Codec")) for entry in metadata
+    ]
+    checked = [changes is None or changes.affects(entry.get("From") or "") for entry in metadata]
+    # Хэш в метаданных — хэш прошлой копии, поэтому изменившиеся по журналу файлы сравниваются с источником
+    changed = [changes is not None and changes.changed(entry.get("From") or "") for entry in metadata]
+    # Копия хэшируется тем же алгоритмом, что и хэш в метаданных (старые MD5/SHA-256 без префикса — тоже)
+    stored_hashes = [parse_digest(entry.get("Hash")) for entry in metadata]
+    to_hash = [
+        position for position, path in enumerate(paths_on_flash)
+        if checked[position] and not changed[position] and is_available(stored_hashes[position][0])
+        and os.path.isfile(path)
+    ]
+    quick = set()
+    listed = {}  # Позиция -> хэш копии из манифеста
+    if tier == TIER_QUICK:
+        candidates = [position for position in to_hash if can_verify_quick(metadata[position])]
+        rotation = {id(entry) for entry in select_full_rotation([metadata[position] for position in candidates])}
+        quick = {position for position in candidates if id(metadata[position]) not in rotation}
+        if manifest is not None:
+            full_rotation = set(candidates) - quick
+            for position in to_hash:
+                if position in full_rotation:
+                    continue  # Очередная полная проверка читает копию целиком
+                algorithm, known = parse_digest(manifest.known_hash(
+                    manifest_key(flash_drive_path, paths_on_flash[position]), os.stat(paths_on_flash[position])))
+                if algorithm == stored_hashes[position][0]:
+                    listed[position] = known
+        to_hash = [position for position in to_hash if position not in quick and position not in listed]
+    # Хэши файлов на флешке считаются параллельно, по группе на каждый алгоритм
+    flash_hashes = {}
+    for algorithm in {stored_hashes[position][0] for position in to_hash}:
+        group = [position for position in to_hash if stored_hashes[position][0] == algorithm]
+        flash_hashes.update(zip(group, hash_files(
+            [paths_on_flash[position] for position in group], algorithm, cache, workers_per_device,
+            [metadata[position].get("Codec") for position in group]
+        )))
 
-def check_files_on_flash_drive(metadata, flash_drive_path):
-    """Проверяет наличие файлов на флешке и их актуальность."""
-    for index, entry in enumerate(metadata, 1):
-        file_path_on_flash = os.path.join(flash_drive_path, entry.get("To", ""))
-        if os.path.exists(file_path_on_flash):
+    for index, (entry, file_path_on_flash, check, change) in enumerate(
+            zip(metadata, paths_on_flash, checked, changed), 1):
+        if not check:
+            # Источник не менялся с прошлого копирования на эту флешку
+            status = "актуален"
+        elif is_directory_entry(entry):
+            # Папка проверяется по stat файлов (без хэширования), файлы обходятся лениво
+            stale_count = sum(1 for _ in stale_directory_files(entry["From"], file_path_on_flash, flash_drive_path,
+                                                               packs))
+            status = "актуален" if stale_count == 0 else f"неактуален (файлов: {stale_count})"
+        elif is_pack_reference(entry.get("To")):
+            # Файл в пакете: его участок читается целиком и сверяется с хэшем (или с источником, если он изменился)
+            if pack_store is None:
+                pack_store = PackStore(flash_drive_path)
+            member = pack_member(entry["To"])
+            if member not in pack_store:
+                status = "отсутствует"
+            elif change:
+                try:
+                    with open(entry["From"], "rb") as source:
+                        status = "актуален" if pack_store.read(member) == source.read() else "неактуален"
+                except OSError as e:
+                    print(f"Ошибка при сравнении {entry['Name']}: {e}")
+                    status = "неактуален"
+            else:
+                status = "актуален" if pack_store.verify(member, entry.get("Hash")) else "неактуален"
+                if status == "актуален":
+                    mark_verified(entry, TIER_FULL)
+        elif os.path.isfile(file_path_on_flash):
             # Проверка актуальности файла
-            local_hash = entry.get("Hash")
-            flash_hash = calculate_file_hash(file_path_on_flash)
-            if local_hash == flash_hash:
-                status = "актуален"
+            local_hash = stored_hashes[index - 1][1]
+            flash_hash = flash_hashes.get(index - 1)
+            if index - 1 in listed:
+                # Копия не менялась с записи в манифест: хэш известен без чтения, но участки копии
+                # с отпечатком всё равно сверяются — манифест не замечает подмены с тем же размером и временем
+                status = "актуален" if listed[index - 1] == local_hash and (
+                    index - 1 not in quick or quick_matches(entry, file_path_on_flash)) else "неактуален"
+                if status == "актуален":
+                    mark_verified(entry, TIER_QUICK)
+            elif index - 1 in quick:
+                # Быстрая проверка: размер и несколько участков копии
+                status = "актуален" if quick_matches(entry, file_path_on_flash) else "неактуален"
+                if status == "актуален":
+                    mark_verified(entry, TIER_QUICK)
+            elif index - 1 in flash_hashes:
+                status = "актуален" if flash_hash is not None and local_hash == flash_hash else "неактуален"
+                if flash_hash is not None and manifest is not None:
+                    manifest.record(manifest_key(flash_drive_path, file_path_on_flash), os.stat(file_path_on_flash),
+                                    format_digest(stored_hashes[index - 1][0], flash_hash))
+                if status == "актуален":
+                    mark_verified(entry, TIER_FULL, file_path_on_flash)
+            elif not entry.get("Codec") and os.path.isfile(entry.get("From") or ""):
+                # Хэш сравнить не с чем (или источник изменился по журналу): побайтовое сравнение источника
+                # с копией, которое останавливается на первом отличии
+                try:
+                    status = "актуален" if files_equal(entry["From"], file_path_on_flash) else "неактуален"
+                except OSError as e:
+                    print(f"Ошибка при сравнении {entry['Name']}: {e}")
+                    status = "неактуален"
             else:
                 status = "неактуален"
         else:
@@ -52,105 +165,426 @@ def check_files_on_flash_drive(metadata, flash_drive_path):
 
         # Вывод статуса
         print(f"[{index}] {entry['Name']} — {status}")
+        statuses.append(status)
 
+    return statuses
 
-def update_files(metadata, flash_drive_path, choices, metadata_file):
-    """Обновляет файлы на флешке в соответствии с выбором и обновляет метаданные."""
-    updated_metadata = []  # Для хранения обновлённых записей
-
-    for entry in reversed(metadata):  # Обрабатываем список с конца
-        if entry["Name"] == "metadata.txt":
-            # Обновляем metadata.txt
-            entry["Modified"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            entry["To"] = "metadata.txt"
-            entry["Backup"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            entry["Size"] = f"{os.path.getsize(metadata_file)} bytes"
-            entry["Hash"] = calculate_file_hash(metadata_file)
-            print(f"Файл {entry['Name']} обновлён.")
-        elif str(metadata.index(entry) + 1) in choices or "*" in choices:
-            file_path_local = entry.get("From")
-            # Формируем путь к файлу на флешке
-            relative_path = entry["To"] if entry["To"] != "null" else entry["Name"]
-            file_path_on_flash = os.path.join(flash_drive_path, relative_path)
 
-            if not file_path_local or not os.path.exists(file_path_local):
-                print(f"Пропущен файл {entry['Name']} (локальный файл отсутствует).")
-                updated_metadata.append(entry)  # Сохраняем запись без изменений
+def is_directory_entry(entry):
+    """Запись описывает папку-источник, а не отдельный файл."""
+    source_stat = stat_or_none(entry.get("From") or "")
+    return source_stat is not None and stat.S_ISDIR(source_stat.st_mode)
+
+
+def remove_other_variants(file_path_on_flash, codec):
+    """
+    Удаляет копию файла в другом формате (сжатую или несжатую), оставшуюся от прежних запусков.
+    codec=PACKED удаляет все отдельные копии (файл перенесён в пакет).
+    """
+    for other_codec in [None] + list(CODEC_SUFFIXES):
+        if other_codec != codec:
+            other_path = stored_path(file_path_on_flash, other_codec)
+            if os.path.isfile(other_path):
+                os.remove(other_path)
+
+
+def update_files(metadata, flash_drive_path, choices, cache=None, compress=False, pack=False):
+    """
+    Обновляет файлы на флешке в соответствии с выбором и обновляет метаданные.
+    При compress=True файлы, которые хорошо сжимаются, хранятся на флешке в сжатом виде.
+    При pack=True мелкие файлы хранятся в пакетах (см. packs.py).
+    """
+    return update_targets([(flash_drive_path, metadata, choices)], cache, compress, pack)[0]
+
+
+def entry_relative_path(entry):
+    """Путь копии записи относительно корня флешки (для файла в пакете — путь, который имела бы его копия)."""
+    if is_pack_reference(entry.get("To")):
+        return pack_member(entry["To"])
+    return entry["To"] if entry.get("To") not in (None, "null") else entry["Name"]
+
+
+def stale_directory_files(source_dir, target_dir, flash_drive_path, packs=None):
+    """Устаревшие файлы папки; если переданы пакеты, мелкие файлы сверяются с индексом пакетов."""
+    if packs is None:
+        return iter_stale_files(source_dir, target_dir)
+    return iter_stale_packed(source_dir, target_dir, flash_drive_path, packs)
+
+
+def update_targets(targets, cache=None, compress=False, pack=False, failed=None):
+    """
+    Обновляет выбранные файлы сразу на нескольких флешках.
+
+    targets — список (флешка, записи метаданных этой флешки, выбор); записи всех флешек идут в одном порядке
+    (см. multi_target.target_entries). Каждый файл-источник читается один раз и параллельно записывается
+    на все флешки, где его выбрали. Записи обновляются на месте.
+    Запись metadata.txt (описание самого файла метаданных) не копируется и не изменяется:
+    метаданные хранятся в metadata.db, а metadata.txt после импорта не обновляется.
+    При pack=True файлы меньше packs.PACK_THRESHOLD дописываются в пакеты флешки, а не копируются по одному.
+    Если передано множество failed, в него добавляются флешки, на которые не удалось скопировать хотя бы один файл.
+
+    :return: Списки записей для каждой флешки.
+    """
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    many = len(targets) > 1
+    jobs = []  # (ключ, источник, [пути назначения])
+    # Путь назначения -> (номер флешки, кодек, алгоритм хэша, имя в пакете или None, путь копии на флешке).
+    # Для файла в пакете путь назначения условный: в папке пакетов, чтобы планировщик знал устройство
+    copy_options = {}
+    entry_targets = {}  # (позиция записи-файла, номер флешки) -> путь назначения
+    pending = {}  # Позиция записи -> номера флешек, на которые она копируется
+    packs = [PackStore(flash_drive_path) for flash_drive_path, _, _ in targets]
+    manifests = [DriveManifest(flash_drive_path) for flash_drive_path, _, _ in targets]
+
+    def record_copy(target, file_hash):
+        """Записывает новую копию в манифест флешки; копии в других форматах (и у файла в пакете) удалены."""
+        number, codec, _, member, path = copy_options[target]
+        flash_drive_path = targets[number][0]
+        plain_path = path[:len(path) - len(CODEC_SUFFIXES[codec])] if codec else path
+        for other_codec in [None] + list(CODEC_SUFFIXES):
+            variant = stored_path(plain_path, other_codec)
+            copy_stat = stat_or_none(variant) if member is None and other_codec == codec and file_hash else None
+            if copy_stat is not None:
+                manifests[number].record(manifest_key(flash_drive_path, variant), copy_stat,
+                                         format_digest(HASH_ALGORITHM, file_hash))
+            else:
+                manifests[number].remove(manifest_key(flash_drive_path, variant))
+
+    def add_target(number, codec, algorithm, member, path):
+        target = path if member is None else os.path.join(packs[number].pack_dir, f"member-{len(copy_options)}")
+        copy_options[target] = (number, codec, algorithm, member, path)
+        return target
+
+    for position in range(len(targets[0][1]) if targets else 0):
+        entry = targets[0][1][position]
+        selected = [number for number, (_, _, choices) in enumerate(targets)
+                    if str(position + 1) in choices or "*" in choices]
+        if entry["Name"] == "metadata.txt" or not selected:
+            continue
+        file_path_local = entry.get("From")
+        source_stat = stat_or_none(file_path_local or "")
+        if source_stat is None:
+            continue
+        relative_path = entry_relative_path(entry)
+        pending[position] = selected
+
+        if stat.S_ISDIR(source_stat.st_mode):
+            # Изменившиеся файлы папки у каждой флешки свои; файл, устаревший на нескольких флешках, читается один раз
+            stale_targets = {}
+            for number in selected:
+                flash_drive_path = targets[number][0]
+                target_dir = os.path.join(flash_drive_path, relative_path)
+                for source_path, target_path, file_stat, _ in stale_directory_files(
+                        file_path_local, target_dir, flash_drive_path, packs[number] if pack else None):
+                    member = member_name(flash_drive_path, target_path) if pack and should_pack(file_stat.st_size) \
+                        else None
+                    stale_targets.setdefault(source_path, []).append(
+                        add_target(number, None, HASH_ALGORITHM, member, target_path))
+            jobs.extend((("dir", position), source_path, paths) for source_path, paths in stale_targets.items())
+            continue
+
+        packed = pack and should_pack(source_stat.st_size)
+        codec = None
+        if compress and not packed:
+            codec, _ = choose_codec(file_path_local)
+        paths = []
+        for number in selected:
+            path = os.path.join(targets[number][0], relative_path)
+            member = member_name(targets[number][0], path) if packed else None
+            entry_targets[(position, number)] = add_target(number, codec, HASH_ALGORITHM, member,
+                                                           stored_path(path, codec))
+            paths.append(entry_targets[(position, number)])
+        jobs.append((("file", position), file_path_local, paths))
+
+    def copy_to_flash(source, target, blocks):
+        number, codec, algorithm, member, path = copy_options[target]
+        if member is not None:
+            result = packs[number].add(member, source, algorithm, blocks) + (None,)
+            # Отдельная копия, оставшаяся от прежних запусков, больше не нужна
+            remove_other_variants(path, PACKED)
+            return result
+        packs[number].discard(member_name(targets[number][0], path))
+        if codec:
+            return compress_copy(source, target, algorithm, blocks)
+        return copy_file_with_hash(source, target, algorithm, blocks) + (None,)
+
+    # Результаты копирования: путь назначения -> (результат или None, ошибка)
+    results = {}
+    copied_files = {}  # (позиция записи-папки, номер флешки) -> число скопированных файлов
+    source_stats = {position: stat_or_none(targets[0][1][position]["From"]) for position in pending}
+    for (kind, position), results_by_target in CopyScheduler(copy_to_flash).run_fanout(jobs):
+        for target_path, result, error in results_by_target:
+            if kind == "file":
+                results[target_path] = (result, error)
                 continue
+            number = copy_options[target_path][0]
+            if error:
+                print(f"Ошибка при копировании {copy_options[target_path][4]}: {error}")
+                run_report.count("files_failed")
+                if failed is not None:
+                    failed.add(targets[number][0])
+            else:
+                copied_files[(position, number)] = copied_files.get((position, number), 0) + 1
+                record_copy(target_path, result[0])
+    for store in packs:
+        # Индекс пакетов записывается один раз на запуск; пакеты с большой долей мусора пересобираются
+        store.repack()
 
-            # Копирование файла
-            os.makedirs(os.path.dirname(file_path_on_flash), exist_ok=True)
-            with open(file_path_local, "rb") as src, open(file_path_on_flash, "wb") as dst:
-                dst.write(src.read())
+    for number, (flash_drive_path, metadata, choices) in enumerate(targets):
+        suffix = f" ({flash_drive_path})" if many else ""
+        for index, entry in enumerate(metadata, 1):
+            position = index - 1
+            if entry["Name"] == "metadata.txt":
+                continue
+            if number not in pending.get(position, ()):
+                if str(index) in choices or "*" in choices:
+                    print(f"Пропущен файл {entry['Name']} (локальный файл отсутствует).")
+                else:
+                    print(f"Файл {entry['Name']} пропущен{suffix}.")
+                run_report.count("files_skipped")
+                continue
 
-            # Обновляем метаданные
-            entry["To"] = relative_path
-            entry["Backup"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            entry["Hash"] = calculate_file_hash(file_path_local)
-            entry["Size"] = f"{os.path.getsize(file_path_local)} bytes"
+            relative_path = entry_relative_path(entry)
+            file_path_on_flash = os.path.join(flash_drive_path, relative_path)
+            if (position, number) not in entry_targets:
+                # Запись-папка
+                count = copied_files.get((position, number), 0)
+                entry["To"] = relative_path
+                entry["Backup"] = now
+                print(f"Папка {entry['Name']} обновлена{suffix} (скопировано файлов: {count}).")
+                run_report.count("files_copied", count)
+                continue
 
-            print(f"Файл {entry['Name']} обновлён.")
-        else:
-            print(f"Файл {entry['Name']} пропущен.")
+            _, codec, _, member, _ = copy_options[entry_targets[(position, number)]]
+            result, error = results[entry_targets[(position, number)]]
+            if error:
+                print(f"Ошибка при копировании {entry['Name']}{suffix}: {error}")
+                run_report.count("files_failed")
+                if failed is not None:
+                    failed.add(flash_drive_path)
+                continue
+            file_hash, copied, stored_size = result
+            record_copy(entry_targets[(position, number)], file_hash)
+            if member is not None:
+                entry.pop("Codec", None)
+                entry.pop("Ratio", None)
+                entry.pop("QuickPrint", None)  # Файл в пакете проверяется чтением его участка целиком
+            elif codec:
+                entry["Codec"] = codec
+                entry["Ratio"] = f"{stored_size / copied:.2f}"
+                entry.pop("QuickPrint", None)  # Сжатая копия проверяется только полным хэшем
+            else:
+                entry.pop("Codec", None)
+                entry.pop("Ratio", None)
+                # Отпечаток новой копии для быстрых проверок при следующих подключениях
+                entry["QuickPrint"] = quick_fingerprint(file_path_on_flash)
+            if member is None:
+                # Копия в прежнем формате больше не нужна
+                remove_other_variants(file_path_on_flash, codec)
+            source_stat = source_stats[position]
+            if cache is not None and source_stat is not None and copied == source_stat.st_size:
+                cache.put(entry["From"], HASH_ALGORITHM, file_hash, source_stat)
 
-        updated_metadata.insert(0, entry)  # Добавляем обработанные записи в начало списка
+            # Обновляем метаданные
+            entry["To"] = pack_reference(member) if member is not None else relative_path
+            entry["Backup"] = now
+            entry["Hash"] = format_digest(HASH_ALGORITHM, file_hash)
+            entry["Size"] = f"{copied} bytes"
+
+            print(f"Файл {entry['Name']} обновлён{suffix}.")
+            run_report.count("files_copied")
 
-    return updated_metadata
+    for manifest in manifests:
+        manifest.save()
+    return [metadata for _, metadata, _ in targets]
 
 
-def save_metadata(metadata_file, metadata):
-    """Перезаписывает файл metadata.txt с обновлёнными данными."""
-    with open(metadata_file, "w") as file:
-        for entry in metadata:
-            for key, value in entry.items():
-                file.write(f"{key}: {value}\n")
-            file.write("----------------------------------------\n")
+def get_flash_drives():
+    """Находит все подключенные флешки (съёмные диски)."""
+    import psutil
+    return [partition.mountpoint for partition in psutil.disk_partitions() if "removable" in partition.opts]
 
 
 def get_flash_drive():
     """Находит подключенную флешку (съёмный диск)."""
-    partitions = psutil.disk_partitions()
-    for partition in partitions:
-        if "removable" in partition.opts:
-            return partition.mountpoint  # Возвращаем путь к флешке
-    return None
+    flash_drives = get_flash_drives()
+    return flash_drives[0] if flash_drives else None  # Возвращаем путь к первой флешке
+
+
+def get_backup_targets():
+    """Подключенные флешки, на которые ведётся резервирование (см. multi_target.select_targets)."""
+    return select_targets(get_flash_drives())
 
 
 def main():
     # Определяем путь к файлу metadata.txt в папке программы
     base_dir = os.path.dirname(os.path.abspath(__file__))  # Путь к папке, где находится скрипт
+
+    # Замеры этапов запуска; отчёт сохраняется рядом с метаданными
+    run_report.start_run("backupFilesToFlashDrive")
+    try:
+        run_backup(base_dir)
+    finally:
+        run_report.finish_run(base_dir)
+
+
+def run_backup(base_dir, policy=None):
+    """
+    Проверка и обновление файлов на всех подключенных флешках по метаданным из папки программы.
+    Если задано правило (см. backup_plan.select_items), файлы выбираются без вопросов пользователю.
+    """
+    # Метаданные хранятся в базе SQLite; соединение закрывается по окончании резервирования
+    with MetadataStore(os.path.join(base_dir, METADATA_DB_FILENAME)) as store:
+        _run_backup(base_dir, store, policy)
+
+
+def _run_backup(base_dir, store, policy):
     metadata_file = os.path.join(base_dir, "metadata.txt")
 
-    if not os.path.exists(metadata_file):
-        print("Файл metadata.txt отсутствует!")
-        # TODO: предложить создать ? получится для любой флешки ? нет. Наличие метафайла - признак резервного хранилища
+    with run_report.phase("metadata_load"):
+        # metadata.txt импортируется в базу при первом запуске
+        store.import_metadata_txt(metadata_file)
+
+        if not store.count():
+            print("Файл metadata.txt отсутствует!")
+            return
+
+        # Чтение метаданных
+        metadata = store.entries()
+
+        # Кэш хэшей локальных файлов хранится рядом с метаданными
+        local_cache = HashCache(os.path.join(base_dir, HASH_CACHE_FILENAME))
+
+    # Поиск флешек: все зарегистрированные получают копии за одно чтение источников
+    with run_report.phase("drive_detection"):
+        flash_drive_paths = get_backup_targets()
+    if not flash_drive_paths:
+        print("Флешка не найдена!")
         return
 
-    # Чтение метаданных
-    metadata = read_metadata(metadata_file)
-
-    # Поиск флешки
-    flash_drive_path = get_flash_drive()
-    # if not flash_drive_path:
-    #     print("Флешка не найдена!")
-    #     return
-
-    # Проверка файлов на флешке
-    print("\nПроверка файлов:")
-    check_files_on_flash_drive(metadata, flash_drive_path)
-
-    # Запрос выбора файлов для обновления
-    choices = input(
-        "\nВведите номера файлов для замены через запятую, '*' для всех, '-' для пропуска: "
-    ).strip().split(",")
-    # TODO: + добавить новый файл на резервирование(+) + удалить файл из списка (-) + поменять (-) на (0)
-    # TODO: зациклить до (0), (-) или списка цифр
-    if "-" in choices:
+    if SNAPSHOT_MODE:
+        # Новый снимок вместо перезаписи копий: на флешку попадает только изменившееся содержимое
+        with run_report.phase("copy"):
+            for flash_drive_path in flash_drive_paths:
+                create_snapshot(metadata, flash_drive_path, HASH_ALGORITHM, local_cache)
+                apply_retention(flash_drive_path, SNAPSHOT_KEEP_DAILY, SNAPSHOT_KEEP_WEEKLY)
+        with run_report.phase("metadata_save"):
+            local_cache.save()
+        return
+
+    # Проверка файлов на каждой флешке и планы копирования; при работающем журнале изменений — только изменившихся
+    checked = check_targets(metadata, flash_drive_paths, base_dir, store)
+
+    if policy:
+        # Запуск без консоли: выбор по правилу вместо вопроса пользователю
+        selections = [select_items(plan, policy) for _, plan, _, _ in checked]
+    else:
+        # Запрос выбора файлов для обновления (номера записей одинаковы для всех флешек)
+        text = input("\nВведите номера файлов для замены через запятую, '*' для всех, '-' для пропуска: ").strip()
+        selections = [parse_choices(plan, text) for _, plan, _, _ in checked]
+    # Копируется только то, что поместится на каждую флешку
+    selections = fit_selections(checked, selections)
+    if not any(selections):
+        commit_targets(base_dir, checked, selections)
         print("Операция отменена.")
         return
 
-    # Обновление файлов на флешке
-    update_files(metadata, flash_drive_path, choices, metadata_file)
+    target_choices = {flash_drive_path: plan_choices(items, metadata)
+                      for (flash_drive_path, _, _, _), items in zip(checked, selections) if items}
+    failed = set()
+    apply_target_choices(store, metadata, target_choices, local_cache, failed)
+    # Позиция журнала флешки сдвигается, только если на неё перенесены все изменения
+    commit_targets(base_dir, checked, selections, failed)
+
+
+def check_targets(metadata, flash_drive_paths, base_dir, store=None, tier=TIER_QUICK):
+    """
+    Проверка каждой флешки по её позиции в журнале изменений.
+
+    :return: Список кортежей (флешка, план, потребитель журнала, метка журнала).
+    """
+    checked = []
+    for flash_drive_path in flash_drive_paths:
+        print(f"\nПроверка файлов{f' на {flash_drive_path}' if len(flash_drive_paths) > 1 else ''}:")
+        consumer = consumer_name(CHANGE_CONSUMER, flash_drive_path)
+        changes, token = read_changes(base_dir, consumer)
+        plan = make_plan(metadata, flash_drive_path, changes, store, tier)
+        checked.append((flash_drive_path, plan, consumer, token))
+    return checked
+
+
+def fit_selections(checked, selections):
+    """Выбор для каждой флешки, урезанный до того, что поместится в её свободное место (см. preflight.py)."""
+    return [fit_plan_items(items, flash_drive_path) for (flash_drive_path, _, _, _), items in zip(checked, selections)]
+
+
+def commit_targets(base_dir, checked, selections, failed=()):
+    """
+    Сдвигает позицию журнала у флешек, на которые перенесены все изменения из их плана.
+    failed — флешки, копирование на которые завершилось с ошибками: их позиция не сдвигается.
+    """
+    for (flash_drive_path, plan, consumer, token), items in zip(checked, selections):
+        if not consumer:
+            continue
+        if flash_drive_path in failed:
+            print(f"Не все файлы скопированы на {flash_drive_path}: при следующем подключении они будут проверены снова.")
+        elif covers_pending(plan, items):
+            commit_changes(base_dir, consumer, token)
+
+
+def make_plan(metadata, flash_drive_path, changes=None, store=None, tier=TIER_QUICK):
+    """
+    Проверка флешки (кэш хэшей и манифест хранятся на самой флешке) и план добавления/обновления записей.
+    changes — изменения из журнала (change_recorder.read_changes); None — полная проверка.
+    Результаты проверки записываются в сведения о копиях этой флешки (multi_target.py)
+    и, если передано хранилище метаданных, сохраняются в нём. Проверка не регистрирует флешку:
+    у флешки без идентификатора (change_recorder.stick_id) результаты не сохраняются.
+    """
+    flash_cache = HashCache(os.path.join(flash_drive_path, HASH_CACHE_FILENAME), root=flash_drive_path)
+    if changes is not None:
+        print(f"По журналу изменений проверяются только изменившиеся записи (путей: {len(changes)}).")
+        run_report.count("journal_dirty_paths", len(changes))
+    target_id = stick_id(flash_drive_path, create=False)
+    entries = target_entries(metadata, target_id)
+    packs = PackStore(flash_drive_path) if PACK_SMALL_FILES else None
+    manifest = DriveManifest(flash_drive_path)
+    with run_report.phase("hash"):
+        statuses = check_files_on_flash_drive(entries, flash_drive_path, flash_cache, changes=changes, tier=tier,
+                                              packs=packs, manifest=manifest)
+        flash_cache.save()
+        manifest.save()
+    changed = store_target_entries(metadata, [(target_id, entries)]) if target_id else []
+    if store is not None:
+        with run_report.phase("metadata_save"):
+            store.update_entries(changed)
+    plan = build_plan(entries, statuses, flash_drive_path, packs)
+    print_plan_totals(plan)
+    return plan
+
+
+def apply_choices(store, metadata, flash_drive_path, choices, local_cache):
+    """Обновление выбранных записей на флешке и сохранение изменённых записей одной транзакцией."""
+    return apply_target_choices(store, metadata, {flash_drive_path: choices}, local_cache)
+
+
+def apply_target_choices(store, metadata, target_choices, local_cache, failed=None):
+    """
+    Обновление выбранных записей сразу на нескольких флешках ({флешка: выбор}): источники читаются один раз.
+    Сведения о копиях каждой флешки сохраняются отдельно (multi_target.py), все записи — одной транзакцией.
+    Флешки, на которые не удалось скопировать хотя бы один файл, добавляются в множество failed (если передано).
+    """
+    target_ids = [stick_id(flash_drive_path) for flash_drive_path in target_choices]
+    targets = [(flash_drive_path, target_entries(metadata, target_id), choices)
+               for target_id, (flash_drive_path, choices) in zip(target_ids, target_choices.items())]
+    with run_report.phase("copy"):
+        update_targets(targets, local_cache, compress=COMPRESS_COPIES, pack=PACK_SMALL_FILES,
+                       failed=failed)
+    with run_report.phase("metadata_save"):
+        store.update_entries(store_target_entries(
+            metadata, [(target_id, entries) for target_id, (_, entries, _) in zip(target_ids, targets)]
+        ))
+        local_cache.save()
+    return metadata
 
 
 if __name__ == "__main__":
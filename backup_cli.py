@@ -0,0 +1,225 @@
+"""
+Консольный запуск резервирования без графического интерфейса.
+
+Импортирует только ядро проверки и копирования: Tkinter, pywin32 и psutil загружаются
+лишь при первом обращении к ним (psutil — только если флешка не указана явно).
+Подходит для запуска из Планировщика задач, cron и на машинах без графической среды.
+
+Примеры:
+    python backup_cli.py check --drive E:\\
+    python backup_cli.py plan --output plan.json
+    python backup_cli.py apply --plan plan.json --policy critical
+    python backup_cli.py backup --policy max-mb:500
+    python backup_cli.py backup --drive E:\\ --drive F:\\
+    python backup_cli.py watch
+    python backup_cli.py record
+    python backup_cli.py status --drive E:\\
+    python backup_cli.py restore --drive E:\\ --name report.docx
+    python backup_cli.py restore --snapshot latest --to D:\\restored
+"""
+import os
+import sys
+import argparse
+from backupFilesToFlashDrive import get_flash_drive, get_backup_targets, make_plan
+from metadata_store import read_metadata
+from backup_plan import save_plan, load_plan, POLICY_ALL
+from mount_watcher import BackupWatcher
+from drive_manifest import drive_state
+from restore import metadata_items, snapshot_items, restore_items
+from verify import TIER_QUICK, TIER_FULL
+from hash_cache import HashCache, HASH_CACHE_FILENAME
+import run_report
+
+DEFAULT_BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Папка программы с метаданными
+
+
+def _resolve_drive(args):
+    """Флешка из аргументов или первая найденная съёмная (тогда импортируется psutil)."""
+    flash_drive_path = args.drive or get_flash_drive()
+    if not flash_drive_path:
+        print("Флешка не найдена!")
+    return flash_drive_path
+
+
+def _tier(args):
+    """Уровень проверки копий: быстрый по умолчанию, полный по --full-verify."""
+    return TIER_FULL if getattr(args, "full_verify", False) else TIER_QUICK
+
+
+def command_plan(args):
+    """Проверка флешки и план копирования без копирования (check — то же без сохранения плана)."""
+    flash_drive_path = _resolve_drive(args)
+    if not flash_drive_path:
+        return 1
+    with BackupWatcher(args.base_dir) as watcher:
+        plan = make_plan(watcher.metadata, flash_drive_path, store=watcher.store, tier=_tier(args))
+    if getattr(args, "output", None):
+        save_plan(plan, args.output)
+        print(f"План сохранён: {args.output}")
+    return 0
+
+
+def command_apply(args):
+    """Копирование по сохранённому плану без повторной проверки флешки."""
+    plan = load_plan(args.plan)
+    flash_drive_path = args.drive or plan["flash_drive"]
+    with BackupWatcher(args.base_dir, args.policy) as watcher:
+        watcher.backup_to(flash_drive_path, engine="backup_cli", plan=plan)
+    return 0
+
+
+def command_backup(args):
+    """
+    Проверка и копирование неактуальных файлов по правилу без вопросов пользователю
+    сразу на все указанные флешки (по умолчанию — на все подключенные зарегистрированные).
+    """
+    flash_drive_paths = args.drive or get_backup_targets()
+    if not flash_drive_paths:
+        print("Флешка не найдена!")
+        return 1
+    with BackupWatcher(args.base_dir, args.policy, _tier(args)) as watcher:
+        watcher.backup_to_targets(flash_drive_paths, engine="backup_cli")
+    return 0
+
+
+def command_watch(args):
+    """Постоянная работа: резервирование при каждом подключении флешки."""
+    try:
+        with BackupWatcher(args.base_dir, args.policy, _tier(args)) as watcher:
+            watcher.run()
+    except KeyboardInterrupt:
+        print("Наблюдение остановлено.")
+    return 0
+
+
+def command_record(args):
+    """Запись изменений источников в журнал до прерывания (только Linux, inotify)."""
+    if not sys.platform.startswith("linux"):
+        print("Журнал изменений доступен только в Linux; резервирование выполняет полную проверку.")
+        return 1
+    from change_recorder import ChangeRecorder
+    with BackupWatcher(args.base_dir) as watcher:
+        paths = [entry["From"] for entry in watcher.metadata if entry.get("From")]
+    try:
+        # Записи auto_backup тоже отслеживаются, если настроен BackupManager
+        from backup_manager import BackupManager
+        paths += [entry["From"] for entry in BackupManager().read_backup_info() if entry.get("From")]
+    except OSError:
+        pass
+    try:
+        ChangeRecorder(args.base_dir, paths + args.path).run()
+    except KeyboardInterrupt:
+        print("Запись изменений остановлена.")
+    return 0
+
+
+def command_status(args):
+    """Состояние копий на флешке по её манифесту: без метаданных этого компьютера и без чтения копий."""
+    flash_drive_path = _resolve_drive(args)
+    if not flash_drive_path:
+        return 1
+    states = drive_state(flash_drive_path)
+    if not states:
+        print("Манифест флешки пуст или отсутствует.")
+        return 1
+    for key, state in states.items():
+        if state != "актуален" or args.verbose:
+            print(f"{key} — {state}")
+    changed = sum(1 for state in states.values() if state != "актуален")
+    print(f"Копий в манифесте: {len(states)}, изменённых или отсутствующих: {changed}.")
+    return 0 if changed == 0 else 2
+
+
+def command_restore(args):
+    """
+    Восстановление с флешки на место источников (или в папку --to): выбранные записи, снимок или всё.
+    Метаданные берутся из папки программы или из файла --metadata (например, metadata.txt с флешки).
+    """
+    flash_drive_path = _resolve_drive(args)
+    if not flash_drive_path:
+        return 1
+    run_report.start_run("restore")
+    try:
+        if args.snapshot:
+            snapshot_path = None if args.snapshot == "latest" else args.snapshot
+            items = snapshot_items(flash_drive_path, snapshot_path, args.name, args.to)
+        elif args.metadata:
+            items = metadata_items(read_metadata(args.metadata), flash_drive_path, args.name, args.to)
+        else:
+            with BackupWatcher(args.base_dir) as watcher:
+                items = metadata_items(watcher.metadata, flash_drive_path, args.name, args.to)
+        if not items:
+            print("Нечего восстанавливать.")
+            return 1
+        _, failed = restore_items(items, flash_drive_path, HashCache(os.path.join(args.base_dir, HASH_CACHE_FILENAME)),
+                                  args.force)
+    finally:
+        run_report.finish_run(args.base_dir)
+    return 0 if failed == 0 else 2
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Резервирование файлов на флешку без графического интерфейса")
+    parser.add_argument("--base-dir", default=DEFAULT_BASE_DIR, help="Папка программы с metadata.txt")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    policy_help = "Правило выбора: all, critical или max-mb:N"
+    full_verify_help = "Полная проверка всех копий вместо быстрой по участкам файла"
+
+    check = commands.add_parser("check", help="Проверить актуальность файлов на флешке")
+    check.add_argument("--drive", help="Путь к флешке (по умолчанию — первая съёмная)")
+    check.add_argument("--full-verify", action="store_true", help=full_verify_help)
+    check.set_defaults(handler=command_plan)
+
+    plan = commands.add_parser("plan", help="Составить план копирования и сохранить его в JSON")
+    plan.add_argument("--drive", help="Путь к флешке (по умолчанию — первая съёмная)")
+    plan.add_argument("--output", required=True, help="Файл плана")
+    plan.add_argument("--full-verify", action="store_true", help=full_verify_help)
+    plan.set_defaults(handler=command_plan)
+
+    apply = commands.add_parser("apply", help="Скопировать файлы по сохранённому плану")
+    apply.add_argument("--plan", required=True, help="Файл плана")
+    apply.add_argument("--drive", help="Путь к флешке (по умолчанию — из плана)")
+    apply.add_argument("--policy", default=POLICY_ALL, help=policy_help)
+    apply.set_defaults(handler=command_apply)
+
+    backup = commands.add_parser("backup", help="Проверить флешку и скопировать неактуальные файлы")
+    backup.add_argument("--drive", action="append",
+                        help="Путь к флешке, можно несколько раз (по умолчанию — все зарегистрированные съёмные)")
+    backup.add_argument("--policy", default=POLICY_ALL, help=policy_help)
+    backup.add_argument("--full-verify", action="store_true", help=full_verify_help)
+    backup.set_defaults(handler=command_backup)
+
+    watch = commands.add_parser("watch", help="Ждать подключения флешек и резервировать автоматически")
+    watch.add_argument("--policy", default=POLICY_ALL, help=policy_help)
+    watch.add_argument("--full-verify", action="store_true", help=full_verify_help)
+    watch.set_defaults(handler=command_watch)
+
+    record = commands.add_parser("record", help="Вести журнал изменений источников (inotify, Linux)")
+    record.add_argument("--path", action="append", default=[], help="Дополнительный путь для наблюдения")
+    record.set_defaults(handler=command_record)
+
+    status = commands.add_parser("status", help="Показать состояние копий по манифесту флешки")
+    status.add_argument("--drive", help="Путь к флешке (по умолчанию — первая съёмная)")
+    status.add_argument("--verbose", action="store_true", help="Показать и актуальные копии")
+    status.set_defaults(handler=command_status)
+
+    restore = commands.add_parser("restore", help="Восстановить файлы с флешки")
+    restore.add_argument("--drive", help="Путь к флешке (по умолчанию — первая съёмная)")
+    restore.add_argument("--name", action="append", help="Имя записи, можно несколько раз (по умолчанию — все)")
+    restore.add_argument("--snapshot", help="Восстановить из снимка: latest или путь к описанию снимка")
+    restore.add_argument("--to", help="Папка для восстановления вместо мест источников")
+    restore.add_argument("--metadata", help="Файл metadata.txt (например, с флешки) вместо метаданных программы")
+    restore.add_argument("--force", action="store_true",
+                         help="Перезаписывать и локальные файлы, изменённые после создания копии")
+    restore.set_defaults(handler=command_restore)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
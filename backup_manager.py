@@ -1,12 +1,21 @@
 import os
-import hashlib
+import json
+from hash_cache import HashCache, HASH_CACHE_FILENAME, cached_file_hash
+from hashers import DEFAULT_ALGORITHM, format_digest
+from metadata_store import MetadataStore, METADATA_DB_FILENAME
+
+
+# Число записей в журнале, после которого он сворачивается в основной файл
+JOURNAL_COMPACT_THRESHOLD = 1000
+# Переменная окружения с путём к папке программы (backup_info.txt, журнал, кэш хэшей)
+BACKUP_DIR_ENV = "AUTOMATIC_BACKUP_TO_FLASH_DRIVE"
 
 
 class BackupManager:
     def __init__(self):
         """Инициализация менеджера резервирования."""
         # Имя переменной окружения
-        env_var_name = "AUTOMATIC_BACKUP_TO_FLASH_DRIVE"
+        env_var_name = BACKUP_DIR_ENV
 
         # Получение пути из переменной окружения
         backup_dir = os.getenv(env_var_name)
@@ -21,6 +30,20 @@ class BackupManager:
         # Полный путь к файлу резервирования
         self.backup_file = os.path.join(backup_dir, "backup_info.txt")
 
+        # Журнал изменений: добавление, удаление и обновление записей дописываются в конец,
+        # основной файл переписывается только при сворачивании журнала
+        self.journal_file = os.path.join(backup_dir, "backup_info.journal")
+
+        # Записи в памяти по именам в порядке добавления (загружаются при первом обращении)
+        self._entries = None
+        self._journal_records = 0
+
+        # База метаданных программы: при первой загрузке в неё однократно импортируется backup_info.txt
+        self.metadata_db = os.path.join(backup_dir, METADATA_DB_FILENAME)
+
+        # Кэш хэшей исходных файлов (пересчёт только при изменении stat)
+        self.hash_cache = HashCache(os.path.join(backup_dir, HASH_CACHE_FILENAME))
+
     def check_backup_info_exists(self):
         """Проверка наличия файла резервирования."""
         return os.path.exists(self.backup_file)
@@ -29,43 +52,146 @@ class BackupManager:
         """Создание начального файла резервирования."""
         with open(self.backup_file, 'w', encoding='utf-8') as file:
             file.write("")
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self._entries = None
         print(f"Файл {self.backup_file} создан.")
 
+    def _load(self):
+        """Загрузка основного файла и применение журнала (один раз за время работы)."""
+        if self._entries is not None:
+            return
+        entries = []
+        if self.check_backup_info_exists():
+            with open(self.backup_file, 'r', encoding='utf-8') as file:
+                raw_entries = file.read().strip().split("\n\n")
+            entries = [self._parse_entry(entry) for entry in raw_entries if entry.strip()]
+            with MetadataStore(self.metadata_db) as store:
+                store.import_backup_info(self.backup_file)
+        self._entries = {entry['Name']: entry for entry in entries}
+        self._journal_records = 0
+
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'rb+') as journal:
+                data = journal.read()
+                complete = data.rfind(b"\n") + 1
+                if complete < len(data):
+                    # Недописанная последняя строка (сбой посреди записи) обрезается,
+                    # иначе следующая запись журнала была бы дописана в ту же строку и тоже потеряна
+                    print(f"Предупреждение: недописанная запись журнала удалена: "
+                          f"'{data[complete:].decode('utf-8', 'replace').strip()}'")
+                    journal.truncate(complete)
+            for line in data[:complete].decode('utf-8', 'replace').splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    print(f"Предупреждение: повреждённая запись журнала пропущена: '{line.strip()}'")
+                    continue
+                self._apply(record)
+                self._journal_records += 1
+
+    def _apply(self, record):
+        """
+        Применение одной записи журнала к записям в памяти.
+        Операции идемпотентны: если сбой случился после записи основного файла, но до удаления журнала,
+        повторное применение журнала к уже свёрнутым записям не создаёт дубликатов.
+        """
+        op = record["op"]
+        if op == "add":
+            self._entries[record["entry"]['Name']] = record["entry"]
+        elif op == "remove":
+            self._entries.pop(record["name"], None)
+        elif op == "update":
+            entry = record["entry"]
+            if entry['Name'] in self._entries:
+                self._entries[entry['Name']] = entry
+
+    def _append_journal(self, records):
+        """Дописывание записей в журнал (O(1) на запись) с периодическим сворачиванием."""
+        with open(self.journal_file, 'a', encoding='utf-8') as journal:
+            for record in records:
+                journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._journal_records += len(records)
+        if self._journal_records >= JOURNAL_COMPACT_THRESHOLD:
+            self.compact()
+
+    def compact(self):
+        """Сворачивание журнала: запись текущего состояния в основной файл и удаление журнала."""
+        self._load()
+        self.write_backup_info(list(self._entries.values()))
+
     def read_backup_info(self):
-        """Чтение содержимого файла резервирования."""
-        if not self.check_backup_info_exists():
-            return []
-        with open(self.backup_file, 'r', encoding='utf-8') as file:
-            entries = file.read().strip().split("\n\n")
-        return [self._parse_entry(entry) for entry in entries if entry.strip()]
+        """Чтение содержимого файла резервирования (с учётом журнала)."""
+        self._load()
+        return list(self._entries.values())
 
     def write_backup_info(self, entries):
         """Запись данных в файл резервирования."""
-        with open(self.backup_file, 'w', encoding='utf-8') as file:
+        temp_file = self.backup_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as file:
             file.write("\n\n".join(self._format_entry(entry) for entry in entries))
+        os.replace(temp_file, self.backup_file)
+        # Всё содержимое журнала теперь в основном файле
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self._entries = {entry['Name']: self._normalize(entry) for entry in entries}
+        self._journal_records = 0
+
+    def add_new_entries(self, entries):
+        """Добавление нескольких записей одной дозаписью в журнал. Возвращает число добавленных."""
+        self._load()
+        records = []
+        for entry in entries:
+            if entry['Name'] in self._entries:
+                print(f"Запись с именем {entry['Name']} уже существует.")
+                continue
+            # Добавляем поле `To`, если оно отсутствует
+            if 'To' not in entry or not entry['To']:
+                entry['To'] = "/"  # По умолчанию, корень флешки
+            record = {"op": "add", "entry": self._normalize(entry)}
+            self._apply(record)
+            records.append(record)
+        if records:
+            self._append_journal(records)
+        return len(records)
 
     def add_new_entry(self, entry):
         """Добавление новой записи в резервирование."""
-        entries = self.read_backup_info()
-        if any(e['Name'] == entry['Name'] for e in entries):
-            print(f"Запись с именем {entry['Name']} уже существует.")
+        if not self.add_new_entries([entry]):
             return False
-        # Добавляем поле `To`, если оно отсутствует
-        if 'To' not in entry or not entry['To']:
-            entry['To'] = "/"  # По умолчанию, корень флешки
-        entries.append(entry)
-        self.write_backup_info(entries)
         print(f"Файл {entry['Name']} добавлен в резервирование.")
         return True
 
+    def remove_entry(self, name):
+        """Удаление записи из резервирования по имени."""
+        self._load()
+        if name not in self._entries:
+            print(f"Запись с именем {name} не найдена.")
+            return False
+        record = {"op": "remove", "name": name}
+        self._apply(record)
+        self._append_journal([record])
+        return True
+
+    def update_entry(self, entry):
+        """Обновление полей существующей записи (поиск по имени)."""
+        self._load()
+        if entry['Name'] not in self._entries:
+            print(f"Запись с именем {entry['Name']} не найдена.")
+            return False
+        record = {"op": "update", "entry": self._normalize(entry)}
+        self._apply(record)
+        self._append_journal([record])
+        return True
+
     def calculate_file_hash(self, file_path):
-        """Вычисление хэша SHA256 для файла."""
-        hash_sha256 = hashlib.sha256()
+        """
+        Вычисление хэша файла с префиксом алгоритма (старые хэши SHA256 без префикса проверяются через hashers).
+        Кэш хэшей не записывается на диск после каждого хэша: его сохраняет вызывающий код в конце работы.
+        """
         try:
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_sha256.update(chunk)
-            return hash_sha256.hexdigest()
+            file_hash = cached_file_hash(file_path, DEFAULT_ALGORITHM, self.hash_cache)
+            return format_digest(DEFAULT_ALGORITHM, file_hash)
         except FileNotFoundError:
             print(f"Файл {file_path} не найден.")
             return None
@@ -75,6 +201,11 @@ class BackupManager:
         folder = entry['To'].rstrip('/')
         return os.path.join(folder, entry['Name'])
 
+    @staticmethod
+    def _normalize(entry):
+        """Приведение значений к строкам — так же, как после записи в файл и повторного чтения."""
+        return {key: str(value) for key, value in entry.items()}
+
     def _parse_entry(self, raw_entry):
         """Парсинг одной записи."""
         lines = raw_entry.split("\n")
@@ -0,0 +1,178 @@
+"""
+План резервирования: что добавить на флешку, что обновить и что пропустить.
+
+План строится по статусам проверки флешки, сохраняется в JSON и применяется без вопросов
+пользователю по выбранному правилу. Интерактивный выбор номеров — ещё один способ применить тот же план.
+"""
+import os
+import json
+import stat
+from datetime import datetime
+from dir_walker import iter_stale_files, stat_or_none
+from compression import stored_path
+from packs import iter_stale_packed, is_pack_reference, pack_member
+
+ACTION_ADD = "add"  # Копии на флешке нет
+ACTION_UPDATE = "update"  # Копия устарела
+ACTION_SKIP = "skip"  # Копия актуальна
+
+POLICY_ALL = "all"  # Все неактуальные записи
+POLICY_CRITICAL = "critical"  # Только записи с тегом critical
+POLICY_MAX_MB = "max-mb:"  # Все неактуальные записи, если их общий объём не больше N МБ (max-mb:N)
+CRITICAL_TAG = "critical"
+DEFAULT_PRIORITY = 1  # Приоритет записи без поля Priority
+CRITICAL_PRIORITY = 10  # Приоритет записей с тегом critical (если поле Priority не больше)
+
+
+def entry_tags(entry):
+    """Теги записи метаданных (поле Tags через запятую)."""
+    return [tag.strip().lower() for tag in (entry.get("Tags") or "").split(",") if tag.strip()]
+
+
+def entry_priority(entry):
+    """Приоритет записи при нехватке места на флешке (поле Priority, у записей с тегом critical — не ниже 10)."""
+    try:
+        priority = float(entry.get("Priority") or DEFAULT_PRIORITY)
+    except ValueError:
+        priority = DEFAULT_PRIORITY
+    if CRITICAL_TAG in entry_tags(entry):
+        priority = max(priority, CRITICAL_PRIORITY)
+    return priority
+
+
+def _pending_sizes(source_path, target_path, action, flash_drive_path=None, packs=None):
+    """
+    Объём копирования записи (для папки — только изменившиеся файлы).
+    Если переданы пакеты флешки (packs.PackStore), мелкие файлы папки сверяются с индексом пакетов.
+
+    :return: Кортеж (байт будет записано, байт в заменяемых копиях, время изменения источника или None).
+    """
+    if action == ACTION_SKIP:
+        return 0, 0, None
+    source_stat = stat_or_none(source_path or "")
+    if source_stat is None:
+        return 0, 0, None
+    if stat.S_ISDIR(source_stat.st_mode):
+        size, replaced, modified = 0, 0, None
+        if packs is None:
+            stale_files = iter_stale_files(source_path, target_path)
+        else:
+            stale_files = iter_stale_packed(source_path, target_path, flash_drive_path, packs)
+        for _, _, source, target in stale_files:
+            size += source.st_size
+            replaced += target.st_size if target else 0
+            modified = max(modified or 0, source.st_mtime)
+        return size, replaced, modified
+    target_stat = stat_or_none(target_path)
+    return source_stat.st_size, (target_stat.st_size if target_stat else 0), source_stat.st_mtime
+
+
+def build_plan(metadata, statuses, flash_drive_path, packs=None):
+    """
+    План по записям метаданных и статусам check_files_on_flash_drive (в том же порядке).
+    packs — пакеты флешки, если мелкие файлы хранятся в пакетах (см. packs.py).
+
+    :return: Словарь, который можно сохранить в JSON.
+    """
+    items = []
+    totals = {ACTION_ADD: 0, ACTION_UPDATE: 0, ACTION_SKIP: 0}
+    for index, (entry, status) in enumerate(zip(metadata, statuses), 1):
+        if status == "отсутствует":
+            action = ACTION_ADD
+        elif status == "актуален":
+            action = ACTION_SKIP
+        else:
+            action = ACTION_UPDATE
+        if is_pack_reference(entry.get("To")):
+            # Прежняя версия в пакете не освобождает места до пересборки пакета
+            relative_path = pack_member(entry["To"])
+        else:
+            relative_path = entry.get("To") if entry.get("To") not in (None, "null") else entry["Name"]
+        target_path = stored_path(os.path.join(flash_drive_path, relative_path), entry.get("Codec"))
+        size, replaced, modified = _pending_sizes(entry.get("From"), target_path, action, flash_drive_path, packs)
+        totals[action] += size
+        items.append({
+            "index": index,
+            "name": entry["Name"],
+            "from": entry.get("From"),
+            "action": action,
+            "status": status,
+            "bytes": size,
+            "replaced": replaced,
+            "modified": modified,
+            "tags": entry_tags(entry),
+            "priority": entry_priority(entry),
+        })
+    return {
+        "created": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "flash_drive": flash_drive_path,
+        "items": items,
+        "totals": totals,
+    }
+
+
+def print_plan_totals(plan):
+    """Итоги плана (статусы записей уже выведены при проверке флешки)."""
+    totals = plan["totals"]
+    print(f"Добавить: {totals[ACTION_ADD]} байт, обновить: {totals[ACTION_UPDATE]} байт.")
+
+
+def select_items(plan, policy):
+    """Записи плана для копирования по правилу all, critical или max-mb:N."""
+    pending = [item for item in plan["items"] if item["action"] != ACTION_SKIP]
+    if policy == POLICY_ALL:
+        return pending
+    if policy == POLICY_CRITICAL:
+        return [item for item in pending if CRITICAL_TAG in item["tags"]]
+    if policy.startswith(POLICY_MAX_MB):
+        limit = float(policy[len(POLICY_MAX_MB):]) * 1024 * 1024
+        total = sum(item["bytes"] for item in pending)
+        if total > limit:
+            print(f"Объём копирования {total} байт превышает лимит {int(limit)} байт, копирование отложено.")
+            return []
+        return pending
+    raise ValueError(f"Неизвестное правило: {policy}")
+
+
+def covers_pending(plan, items):
+    """Выбраны ли все записи плана, которые нужно добавить или обновить."""
+    selected = {item["index"] for item in items}
+    return all(item["index"] in selected for item in plan["items"] if item["action"] != ACTION_SKIP)
+
+
+def parse_choices(plan, text):
+    """Записи плана по вводу пользователя: номера через запятую, '*' — все неактуальные, '-' — ничего."""
+    choices = [choice.strip() for choice in text.split(",")]
+    if "-" in choices:
+        return []
+    if "*" in choices:
+        return select_items(plan, POLICY_ALL)
+    return [item for item in plan["items"] if str(item["index"]) in choices]
+
+
+def plan_choices(items, metadata):
+    """
+    Номера записей метаданных для update_files. Записи сопоставляются по имени и пути источника,
+    поэтому план, сохранённый раньше, применяется правильно, даже если порядок записей изменился.
+    """
+    positions = {(entry["Name"], entry.get("From")): index for index, entry in enumerate(metadata, 1)}
+    choices = []
+    for item in items:
+        index = positions.get((item["name"], item["from"]))
+        if index is None:
+            print(f"Запись {item['name']} из плана не найдена в метаданных.")
+            continue
+        choices.append(str(index))
+    return choices
+
+
+def save_plan(plan, plan_path):
+    temp_path = plan_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(plan, file, ensure_ascii=False, indent=2)
+    os.replace(temp_path, plan_path)
+
+
+def load_plan(plan_path):
+    with open(plan_path, "r", encoding="utf-8") as file:
+        return json.load(file)
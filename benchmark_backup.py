@@ -0,0 +1,175 @@
+"""
+Замеры производительности основных этапов резервирования.
+
+Создаёт во временной папке набор файлов заданного количества и распределения размеров,
+а вместо флешки использует другую временную папку. Результаты выводятся в JSON,
+который можно сравнить с результатами другого коммита (--compare).
+
+Пример:
+    python benchmark_backup.py --files 2000 --min-size 1024 --max-size 4194304 --output bench.json
+    python benchmark_backup.py --compare bench.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+from unittest.mock import patch
+
+
+def generate_files(source_dir, count, min_size, max_size, seed):
+    """Создаёт count файлов с размерами, равномерно распределёнными в логарифмической шкале."""
+    rng = random.Random(seed)
+    paths = []
+    for index in range(count):
+        size = int(min_size * (max_size / min_size) ** rng.random()) if max_size > min_size else min_size
+        subdir = os.path.join(source_dir, f"dir{index % 16:02d}")
+        os.makedirs(subdir, exist_ok=True)
+        path = os.path.join(subdir, f"file{index:06d}.bin")
+        with open(path, "wb") as file:
+            # Наполовину сжимаемые данные, похожие на реальные документы
+            file.write(os.urandom(size // 2) + bytes(size - size // 2))
+        paths.append(path)
+    return paths
+
+
+def write_metadata(metadata_file, paths, source_dir):
+    """Файл metadata.txt с записями для сгенерированных файлов (в формате createMetadataFile)."""
+    with open(metadata_file, "w") as meta_file:
+        for path in paths:
+            meta_file.write(f"Name: {os.path.basename(path)}\n")
+            meta_file.write(f"From: {path}\n")
+            meta_file.write("Modified: null\n")
+            meta_file.write(f"To: {os.path.relpath(path, source_dir)}\n")
+            meta_file.write("Backup: null\n")
+            meta_file.write(f"Size: {os.path.getsize(path)} bytes\n")
+            meta_file.write("Hash: null\n")
+            meta_file.write("-" * 40 + "\n")
+
+
+def timed(results, name, function, repeat):
+    """Выполняет функцию repeat раз (вывод подавляется) и сохраняет лучшее время."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    results[name] = round(best, 6)
+    print(f"{name}: {best:.4f} с", file=sys.stderr)
+
+
+def run_benchmarks(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_dir = os.path.join(work_dir, "source")
+        flash_dir = os.path.join(work_dir, "flash")  # Поддельная «съёмная» флешка
+        program_dir = os.path.join(work_dir, "program")
+        for directory in (source_dir, flash_dir, program_dir):
+            os.makedirs(directory)
+        paths = generate_files(source_dir, args.files, args.min_size, args.max_size, args.seed)
+
+        with patch.dict(os.environ, {"AUTOMATIC_BACKUP_TO_FLASH_DRIVE": program_dir}):
+            import backupFilesToFlashDrive as engine
+            from hash_cache import HashCache, HASH_CACHE_FILENAME
+
+            metadata_file = os.path.join(program_dir, "metadata.txt")
+            write_metadata(metadata_file, paths, source_dir)
+            timed(results, "read_metadata", lambda: engine.read_metadata(metadata_file), args.repeat)
+            metadata = engine.read_metadata(metadata_file)
+
+            with patch.object(engine, "get_flash_drive", return_value=flash_dir):
+                # update_files заполняет хэши записей, по которым затем идёт проверка
+                timed(results, "update_files_all", lambda: engine.update_files(
+                    metadata, engine.get_flash_drive(), ["*"]), 1)
+                timed(results, "check_files_on_flash_drive",
+                      lambda: engine.check_files_on_flash_drive(metadata, engine.get_flash_drive()), args.repeat)
+
+                # Повторная проверка с заполненным кэшем хэшей флешки
+                flash_cache = HashCache(os.path.join(flash_dir, HASH_CACHE_FILENAME), root=flash_dir)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    engine.check_files_on_flash_drive(metadata, flash_dir, flash_cache)
+                timed(results, "check_files_on_flash_drive_cached",
+                      lambda: engine.check_files_on_flash_drive(metadata, flash_dir, flash_cache), args.repeat)
+
+            from backup_manager import BackupManager
+            manager = BackupManager()
+            entries = [{"Name": os.path.basename(path), "From": path, "To": "/", "Size": 0} for path in paths]
+
+            def add_entries():
+                manager.create_initial_backup_info()
+                for entry in entries:
+                    manager.add_new_entry(dict(entry))
+
+            timed(results, "BackupManager.add_new_entry", add_entries, 1)
+            timed(results, "BackupManager.read_backup_info",
+                  lambda: BackupManager().read_backup_info(), args.repeat)
+
+            try:
+                import auto_backup
+            except ImportError as e:
+                print(f"auto_backup пропущен: {e}", file=sys.stderr)
+            else:
+                timed(results, "auto_backup.refresh_changes",
+                      lambda: auto_backup.refresh_changes(BackupManager(), flash_dir), args.repeat)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)), text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file):
+    """Печатает отношение текущего времени к базовому по каждому замеру."""
+    with open(baseline_file, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    print(f"Сравнение с {baseline.get('revision')}:", file=sys.stderr)
+    for name, seconds in results.items():
+        base = baseline["results"].get(name)
+        if base:
+            print(f"  {name}: {seconds / base:.2f}x ({base:.4f} с -> {seconds:.4f} с)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности резервирования")
+    parser.add_argument("--files", type=int, default=500, help="Число файлов")
+    parser.add_argument("--min-size", type=int, default=1024, help="Минимальный размер файла, байт")
+    parser.add_argument("--max-size", type=int, default=1024 * 1024, help="Максимальный размер файла, байт")
+    parser.add_argument("--seed", type=int, default=1, help="Начальное значение генератора")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого замера")
+    parser.add_argument("--output", help="Файл для результатов в JSON (по умолчанию stdout)")
+    parser.add_argument("--compare", help="JSON с результатами другого коммита для сравнения")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"files": args.files, "min_size": args.min_size, "max_size": args.max_size, "seed": args.seed},
+        "results": run_benchmarks(args),
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        compare(report["results"], args.compare)
+
+
+if __name__ == "__main__":
+    main()
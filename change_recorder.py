@@ -0,0 +1,351 @@
+"""
+Журнал изменений источников между запусками резервирования.
+
+Фоновый процесс (python backup_cli.py record) следит за файлами и папками из метаданных через inotify (Linux)
+и дописывает в журнал пути изменившихся файлов. При следующем подключении флешки проверяются
+только записи, затронутые изменениями, а не все файлы.
+
+Формат журнала (по строке на событие, путь — в JSON):
+    START {"generation": ..., "pid": ..., "base": ...}  — запуск наблюдения, журнал начинается заново
+    WATCH "путь"                           — путь из метаданных, за которым ведётся наблюдение
+    DIRTY "путь"                           — файл или папка изменились
+    OVERFLOW                               — очередь событий ядра переполнилась, изменения потеряны
+    STOP                                   — наблюдение остановлено
+
+Для каждого потребителя (движок + флешка) хранится позиция в журнале, до которой изменения уже перенесены
+на флешку. Если наблюдение не велось всё время с этой позиции, нужна полная проверка.
+
+Позиции логические: base в заголовке START — позиция первой строки после строк WATCH (в журнале без base
+она совпадает со смещением в файле). Наблюдатель сворачивает журнал, удаляя строки, которые уже прочитали
+все потребители текущего поколения, и увеличивает base: журнал не растёт бесконечно,
+а сохранённые позиции остаются действительными.
+"""
+import os
+import sys
+import json
+import uuid
+import errno
+import signal
+import struct
+import ctypes
+import ctypes.util
+
+CHANGE_LOG_FILENAME = "change_journal.log"  # Журнал изменений в папке программы
+CHECKPOINT_FILENAME = "change_journal.offsets.json"  # Позиции потребителей в журнале
+STICK_ID_FILENAME = ".backup_id"  # Идентификатор флешки в её корне
+JOURNAL_COMPACT_SIZE = 1024 * 1024  # Сворачивать журнал, когда строки изменений занимают больше (байт)
+
+# Константы inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+READ_BUFFER_SIZE = 64 * 1024
+
+
+def stick_id(flash_drive_path, create=True):
+    """
+    Постоянный идентификатор флешки: создаётся в её корне при первом обращении.
+    create=False — только чтение (проверка и восстановление ничего не пишут на флешку): None, если идентификатора нет.
+    """
+    id_path = os.path.join(flash_drive_path, STICK_ID_FILENAME)
+    try:
+        with open(id_path, "r") as file:
+            value = file.read().strip()
+            if value:
+                return value
+    except FileNotFoundError:
+        pass
+    if not create:
+        return None
+    value = uuid.uuid4().hex
+    with open(id_path, "w") as file:
+        file.write(value)
+    return value
+
+
+def consumer_name(engine, flash_drive_path):
+    """Имя потребителя журнала: у каждой флешки и каждого движка своя позиция."""
+    return f"{engine}:{stick_id(flash_drive_path)}"
+
+
+class DirtySet:
+    """Изменившиеся пути и пути, за которыми велось наблюдение."""
+
+    def __init__(self, dirty, watched):
+        self.dirty = dirty
+        self.watched = watched
+        # Папки, внутри которых есть изменения: запись-папка затронута изменением любого вложенного файла
+        self.dirty_dirs = set()
+        for path in dirty:
+            parent = os.path.dirname(path)
+            while parent and parent not in self.dirty_dirs:
+                self.dirty_dirs.add(parent)
+                next_parent = os.path.dirname(parent)
+                if next_parent == parent:
+                    break
+                parent = next_parent
+
+    def affects(self, path):
+        """Нужно ли проверять запись с этим путём (за путями без наблюдения изменения не записывались)."""
+        path = os.path.abspath(path)
+        return path not in self.watched or path in self.dirty or path in self.dirty_dirs
+
+    def changed(self, path):
+        """Путь под наблюдением и точно изменился (в отличие от affects, который верен и для путей без наблюдения)."""
+        path = os.path.abspath(path)
+        return path in self.watched and (path in self.dirty or path in self.dirty_dirs)
+
+    def __len__(self):
+        return len(self.dirty)
+
+
+def _parse_line(line):
+    kind, _, value = line.decode("utf-8").rstrip("\n").partition(" ")
+    return kind, json.loads(value) if value else None
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _load_checkpoints(base_dir):
+    try:
+        with open(os.path.join(base_dir, CHECKPOINT_FILENAME), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def read_changes(base_dir, consumer):
+    """
+    Изменения с последней позиции потребителя.
+
+    :return: Кортеж (DirtySet или None, метка). None означает, что нужна полная проверка.
+             Метка передаётся в commit_changes после успешного копирования (None — журнал не ведётся).
+    """
+    if not sys.platform.startswith("linux"):
+        return None, None
+    log_path = os.path.join(base_dir, CHANGE_LOG_FILENAME)
+    try:
+        with open(log_path, "rb") as file:
+            kind, header = _parse_line(file.readline())
+            if kind != "START" or not _process_alive(header["pid"]):
+                return None, None
+            watched = set()
+            line = file.readline()
+            while line.startswith(b"WATCH "):
+                watched.add(_parse_line(line)[1])
+                line = file.readline()
+
+            header_end = file.tell() - len(line)
+            # Логическая позиция первой строки после заголовка (журнал без base не сворачивался)
+            base = header.get("base", header_end)
+            end = base + os.fstat(file.fileno()).st_size - header_end
+            checkpoint = _load_checkpoints(base_dir).get(consumer)
+            full_scan = (not checkpoint or checkpoint["generation"] != header["generation"]
+                         or not base <= checkpoint["offset"] <= end)
+            # Без действующей позиции журнал дочитывается, только чтобы получить метку после полной проверки
+            offset = base if full_scan else checkpoint["offset"]
+            file.seek(header_end + offset - base)
+
+            dirty = set()
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # Строка ещё дописывается — её подхватит следующий запуск
+                offset += len(line)
+                if full_scan:
+                    continue
+                kind, value = _parse_line(line)
+                if kind == "DIRTY":
+                    dirty.add(value)
+                elif kind in ("OVERFLOW", "STOP", "START"):
+                    full_scan = True
+            token = {"generation": header["generation"], "offset": offset}
+            return (None if full_scan else DirtySet(dirty, watched)), token
+    except FileNotFoundError:
+        return None, None
+    except (ValueError, KeyError) as e:
+        print(f"Журнал изменений повреждён, будет выполнена полная проверка: {e}")
+        return None, None
+
+
+def commit_changes(base_dir, consumer, token):
+    """Запоминает, что изменения до метки перенесены на флешку."""
+    if token is None:
+        return
+    checkpoints = _load_checkpoints(base_dir)
+    checkpoints[consumer] = token
+    checkpoint_path = os.path.join(base_dir, CHECKPOINT_FILENAME)
+    temp_path = checkpoint_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(checkpoints, file)
+    os.replace(temp_path, checkpoint_path)
+
+
+class ChangeRecorder:
+    """Наблюдение за путями через inotify с записью изменений в журнал."""
+
+    def __init__(self, base_dir, paths):
+        self.base_dir = base_dir
+        self.log_path = os.path.join(base_dir, CHANGE_LOG_FILENAME)
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.watches = {}  # wd -> путь папки
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = None
+        self.log = None
+        self.generation = None
+        self.watched = []  # Пути строк WATCH
+        self.base = 0  # Логическая позиция первой строки после заголовка
+        self.header_end = 0  # Размер заголовка (START и WATCH) в файле
+
+    @staticmethod
+    def _line(kind, value=None):
+        line = kind if value is None else f"{kind} {json.dumps(value, ensure_ascii=False)}"
+        return (line + "\n").encode("utf-8")
+
+    def _write(self, kind, value=None):
+        self.log.write(self._line(kind, value))
+
+    def _header(self):
+        return self._line("START", {"generation": self.generation, "pid": os.getpid(), "base": self.base}) \
+            + b"".join(self._line("WATCH", path) for path in self.watched)
+
+    def _sync(self):
+        """Журнал сбрасывается на диск после каждой пачки событий, чтобы пережить выключение питания."""
+        self.log.flush()
+        os.fsync(self.log.fileno())
+
+    def _add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                print("Достигнут предел inotify (fs.inotify.max_user_watches).")
+            raise OSError(error, os.strerror(error), directory)
+        self.watches[wd] = directory
+
+    def _add_tree(self, root):
+        """Наблюдение за папкой и всеми вложенными папками."""
+        self._add_watch(root)
+        for directory, subdirs, _ in os.walk(root):
+            for name in subdirs:
+                self._add_watch(os.path.join(directory, name))
+
+    def start(self):
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        watched_dirs = set()
+        for path in self.paths:
+            try:
+                if os.path.isdir(path):
+                    self._add_tree(path)
+                elif os.path.dirname(path) not in watched_dirs:
+                    # За отдельным файлом следим через его папку: так ловятся и замены файла целиком
+                    self._add_watch(os.path.dirname(path))
+                    watched_dirs.add(os.path.dirname(path))
+            except OSError as e:
+                print(f"Не удалось наблюдать за {path}: {e}")
+                continue
+            self.watched.append(path)
+        # Журнал начинается заново: позиции потребителей прежнего поколения недействительны
+        self.generation = uuid.uuid4().hex
+        self.base = 0
+        header = self._header()
+        self.header_end = len(header)
+        self.log = open(self.log_path, "wb")
+        self.log.write(header)
+        self._sync()
+
+    def _compact(self):
+        """
+        Удаляет из журнала строки, которые уже прочитали все потребители текущего поколения.
+        Журнал пишет только этот процесс, поэтому он переписывается между пачками событий:
+        через временный файл и os.replace, так что читатели видят либо прежний, либо новый журнал.
+        """
+        offsets = [checkpoint["offset"] for checkpoint in _load_checkpoints(self.base_dir).values()
+                   if checkpoint.get("generation") == self.generation]
+        keep_from = min(offsets) if offsets else self.base
+        if keep_from <= self.base:
+            return
+        start = self.header_end + keep_from - self.base
+        self.base = keep_from
+        header = self._header()
+        temp_path = self.log_path + ".tmp"
+        with open(self.log_path, "rb") as source, open(temp_path, "wb") as target:
+            source.seek(start)
+            target.write(header)
+            for block in iter(lambda: source.read(READ_BUFFER_SIZE), b""):
+                target.write(block)
+            target.flush()
+            os.fsync(target.fileno())
+        self.log.close()
+        os.replace(temp_path, self.log_path)
+        self.log = open(self.log_path, "ab")
+        self.header_end = len(header)
+
+    def _handle_events(self, data):
+        dirty = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+            if mask & IN_Q_OVERFLOW:
+                self._write("OVERFLOW")
+                continue
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._add_tree(path)
+                except OSError as e:
+                    print(f"Не удалось наблюдать за {path}: {e}")
+                    self._write("OVERFLOW")  # Изменения в новой папке могут быть потеряны
+            dirty.append(path)
+        for path in dict.fromkeys(dirty):
+            self._write("DIRTY", path)
+        self._sync()
+        if self.log.tell() - self.header_end >= JOURNAL_COMPACT_SIZE:
+            self._compact()
+
+    def run(self):
+        """Запись изменений до прерывания (Ctrl+C или SIGTERM)."""
+        # SIGTERM завершает наблюдение так же, как Ctrl+C, чтобы в журнал попала запись STOP
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        self.start()
+        print(f"Наблюдение за изменениями: путей {len(self.paths)}, папок {len(self.watches)}.")
+        try:
+            while True:
+                self._handle_events(os.read(self.fd, READ_BUFFER_SIZE))
+        finally:
+            self._write("STOP")
+            self._sync()
+            self.log.close()
+            os.close(self.fd)
@@ -0,0 +1,117 @@
+import os
+import time
+import gzip
+import zlib
+import shutil
+import run_report
+from file_copy import iter_file_blocks, finish_part, PART_SUFFIX
+from hashers import new_hasher, DEFAULT_ALGORITHM
+
+CODEC_GZIP = "gzip"
+CODEC_SUFFIXES = {CODEC_GZIP: ".gz"}  # Суффикс сжатой копии на флешке
+
+COMPRESSION_LEVEL = 3  # Быстрый уровень: сжатие не должно стать медленнее записи на флешку
+SAMPLE_SIZE = 256 * 1024  # Объём начала файла для оценки степени сжатия
+MIN_SAMPLE_SIZE = 4 * 1024  # Файлы меньше этого размера не сжимаются
+MAX_RATIO = 0.8  # Сжимать, только если оценка размера не больше 80% исходного
+
+# Форматы, которые уже сжаты (в том числе zip-контейнеры Office)
+COMPRESSED_EXTENSIONS = {
+    ".docx", ".xlsx", ".xlsm", ".pptx", ".odt", ".ods",
+    ".zip", ".7z", ".rar", ".gz", ".bz2", ".xz",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp",
+    ".mp3", ".mp4", ".avi", ".mkv", ".mov",
+}
+
+
+def estimate_ratio(source_file):
+    """Оценка степени сжатия по первым блокам файла (None, если файл слишком мал)."""
+    with open(source_file, "rb") as f:
+        sample = f.read(SAMPLE_SIZE)
+    if len(sample) < MIN_SAMPLE_SIZE:
+        return None
+    return len(zlib.compress(sample, COMPRESSION_LEVEL)) / len(sample)
+
+
+def choose_codec(source_file):
+    """
+    Решает, сжимать ли файл при копировании.
+
+    :return: Кортеж (кодек или None, оценка степени сжатия или None).
+    """
+    if os.path.splitext(source_file)[1].lower() in COMPRESSED_EXTENSIONS:
+        return None, None
+    ratio = estimate_ratio(source_file)
+    if ratio is None or ratio > MAX_RATIO:
+        return None, ratio
+    return CODEC_GZIP, ratio
+
+
+def stored_path(target_file, codec):
+    """Путь, под которым копия лежит на флешке (с суффиксом кодека, если файл сжат)."""
+    return target_file + CODEC_SUFFIXES[codec] if codec else target_file
+
+
+def open_stored(path, codec):
+    """Открывает копию для чтения; сжатые копии распаковываются потоково."""
+    if codec == CODEC_GZIP:
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def decompress_blocks(blocks, codec):
+    """Потоково распаковывает блоки сжатой копии (например, полученные от планировщика копирования)."""
+    if codec != CODEC_GZIP:
+        raise ValueError(f"Неизвестный кодек: {codec}")
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # Формат gzip
+    for block in blocks:
+        data = decompressor.decompress(block)
+        if data:
+            yield data
+    data = decompressor.flush()
+    if data:
+        yield data
+    if not decompressor.eof:
+        raise EOFError("Сжатая копия обрезана")
+
+
+def compress_copy(source_file, target_file, algorithm=DEFAULT_ALGORITHM, blocks=None, level=COMPRESSION_LEVEL):
+    """
+    Копирует файл на флешку в сжатом виде (формат gzip, распаковывается потоково).
+    Хэш считается по исходному содержимому за тот же проход.
+
+    :return: Кортеж (хэш или None, исходный размер, размер сжатой копии).
+    """
+    hasher = new_hasher(algorithm) if algorithm else None
+    if blocks is None:
+        blocks = iter_file_blocks(source_file)
+
+    start = time.perf_counter()
+    copied = 0
+    # Сжатая копия пишется во временный файл и атомарно заменяет прежнюю (см. file_copy.copy_file_with_hash)
+    part_path = target_file + PART_SUFFIX
+    try:
+        with open(part_path, "wb") as raw:
+            with gzip.GzipFile(filename=os.path.basename(source_file), mode="wb", fileobj=raw, compresslevel=level,
+                               mtime=0) as dst:
+                for block in blocks:
+                    if hasher:
+                        hasher.update(block)
+                    dst.write(block)
+                    copied += len(block)
+            raw.flush()
+            os.fsync(raw.fileno())
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+
+    shutil.copystat(source_file, part_path)
+    finish_part(part_path, target_file)
+    stored_size = os.path.getsize(target_file)
+    if run_report.enabled():
+        run_report.record_file(source_file, "copy", time.perf_counter() - start, copied, stored_size,
+                               run_report.device_label(source_file), run_report.device_label(target_file))
+    return (hasher.hexdigest() if hasher else None), copied, stored_size
@@ -0,0 +1,180 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from file_copy import iter_file_blocks, copy_file_with_hash
+
+DEFAULT_READ_WORKERS = 4  # Одновременных чтений с дисков-источников
+DEFAULT_WRITERS_PER_DEVICE = 1  # Одновременных записей на одно устройство (флешкам лучше 1–2)
+QUEUE_DEPTH = 8  # Блоков в очереди между чтением и записью одного файла
+
+_END = object()  # Признак конца потока блоков
+
+
+class _ReadError:
+    """Ошибка чтения, передаваемая через очередь блоков в поток записи."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def device_of(path):
+    """Устройство, на котором будет создан файл (по ближайшей существующей папке)."""
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+class CopyScheduler:
+    """
+    Планировщик копирования с параллельным чтением и очередями записи по устройствам.
+
+    Чтение источников идёт в общем пуле из read_workers потоков. Блоки каждого файла
+    через ограниченную очередь передаются потоку записи из пула устройства назначения,
+    где одновременно работает не более writers_per_device потоков. Так чтение следующих
+    файлов перекрывается с записью на флешку, а сама флешка не получает лишних писателей.
+
+    Один источник можно скопировать сразу в несколько мест (например, на все подключенные флешки):
+    файл читается один раз, а каждый блок передаётся писателям всех назначений (см. run_fanout).
+
+    copy_function(source, target, blocks) выполняет запись и получает поток блоков источника.
+    """
+
+    def __init__(self, copy_function=None, read_workers=DEFAULT_READ_WORKERS,
+                 writers_per_device=DEFAULT_WRITERS_PER_DEVICE):
+        self.copy_function = copy_function or (
+            lambda source, target, blocks: copy_file_with_hash(source, target, None, blocks)
+        )
+        self.read_workers = read_workers
+        self.writers_per_device = writers_per_device
+        self._write_pools = {}
+        self._lock = threading.Lock()
+        self._submit_lock = threading.Lock()
+
+    def _write_pool(self, device, slot=0):
+        """
+        Пул записи для устройства назначения (создаётся при первом обращении).
+        slot различает назначения одного источника на одном устройстве: у каждого свой пул,
+        иначе второй писатель ждал бы первого, а первый — блоков, которые чтение не может отдать второму.
+        """
+        with self._lock:
+            if (device, slot) not in self._write_pools:
+                self._write_pools[(device, slot)] = ThreadPoolExecutor(max_workers=self.writers_per_device)
+            return self._write_pools[(device, slot)]
+
+    @staticmethod
+    def _put(blocks, item, finished):
+        """Помещает блок в очередь, пока поток записи не завершился."""
+        while not finished.is_set():
+            try:
+                blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _write_job(self, source, target, blocks, finished):
+        def next_item():
+            item = blocks.get()
+            if isinstance(item, _ReadError):
+                raise item.error
+            return item
+
+        def iter_blocks(first):
+            item = first
+            while item is not _END:
+                yield item
+                item = next_item()
+
+        try:
+            # Ошибка открытия источника обнаруживается до создания файла назначения
+            first = next_item()
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            return self.copy_function(source, target, iter_blocks(first))
+        finally:
+            # Поток чтения больше не должен ждать места в очереди
+            finished.set()
+
+    def _read_job(self, source, targets):
+        """
+        Читает источник один раз и передаёт каждый блок в очереди записи всех назначений.
+        Потоки записи ставятся в пулы устройств только после начала чтения,
+        поэтому занятый писатель всегда получает данные и не может заблокировать пулы.
+        Писатели одного источника ставятся во все пулы разом: порядок заданий во всех пулах одинаков,
+        и чтение не ждёт писателя, стоящего в очереди за писателем другого чтения.
+        """
+        streams = []
+        with self._submit_lock:
+            slots = {}
+            for target in targets:
+                device = device_of(target)
+                slot = slots[device] = slots.get(device, -1) + 1
+                blocks = queue.Queue(maxsize=QUEUE_DEPTH)
+                finished = threading.Event()
+                writer = self._write_pool(device, slot).submit(self._write_job, source, target, blocks, finished)
+                streams.append((blocks, finished, writer))
+        error = None
+        try:
+            for block in iter_file_blocks(source):
+                # Блок получают все писатели; чтение прекращается, когда завершились все
+                delivered = [self._put(blocks, block, finished) for blocks, finished, _ in streams]
+                if not any(delivered):
+                    break
+        except BaseException as e:
+            error = e
+        finally:
+            # Писатели всегда получают конец потока или ошибку, иначе они ждали бы блоков бесконечно
+            item = _END if error is None else _ReadError(error)
+            for blocks, finished, _ in streams:
+                self._put(blocks, item, finished)
+        if error is not None and not isinstance(error, Exception):
+            raise error
+        return [writer for _, _, writer in streams]
+
+    def run(self, jobs):
+        """
+        Копирует файлы заданий (ключ, источник, назначение).
+
+        Выдаёт кортежи (ключ, результат copy_function, ошибка или None) в порядке заданий,
+        пока остальные файлы продолжают копироваться.
+        """
+        for key, results in self.run_fanout((key, source, [target]) for key, source, target in jobs):
+            _, result, error = results[0]
+            yield key, result, error
+
+    def run_fanout(self, jobs):
+        """
+        Копирует каждый источник заданий (ключ, источник, [назначения]) во все назначения за одно чтение.
+
+        Выдаёт кортежи (ключ, [(назначение, результат copy_function, ошибка или None), ...]) в порядке заданий.
+        Ошибка записи в одно назначение не прерывает запись в остальные.
+        """
+        read_pool = ThreadPoolExecutor(max_workers=self.read_workers)
+        try:
+            jobs = [(key, source, list(targets)) for key, source, targets in jobs]
+            readers = [(key, targets, read_pool.submit(self._read_job, source, targets)) for key, source, targets in jobs]
+            for key, targets, reader in readers:
+                results = []
+                try:
+                    writers = reader.result()
+                except Exception as e:
+                    yield key, [(target, None, e) for target in targets]
+                    continue
+                for target, writer in zip(targets, writers):
+                    try:
+                        results.append((target, writer.result(), None))
+                    except Exception as e:
+                        results.append((target, None, e))
+                yield key, results
+        finally:
+            read_pool.shutdown(wait=True)
+            with self._lock:
+                for pool in self._write_pools.values():
+                    pool.shutdown(wait=True)
+                self._write_pools = {}
@@ -1,26 +1,31 @@
 import os
 import hashlib
 import datetime
-from tkinter import filedialog, Tk
+from hash_cache import cached_file_hash
 
-# Инициализация Tkinter (без создания окна)
-Tk().withdraw()
+_tk_root = None  # Скрытое окно Tkinter создаётся только при первом открытии диалога
 
-def calculate_file_hash(file_path):
-    """Рассчитывает MD5-хеш файла."""
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+
+def _filedialog():
+    """Ленивая инициализация Tkinter (без создания окна) — импорт модуля не требует графической среды."""
+    global _tk_root
+    from tkinter import filedialog, Tk
+    if _tk_root is None:
+        _tk_root = Tk()
+        _tk_root.withdraw()
+    return filedialog
+
+def calculate_file_hash(file_path, cache=None):
+    """Рассчитывает MD5-хеш файла (с кэшем, если он передан)."""
+    return cached_file_hash(file_path, "md5", cache)
 
 def choose_folder(prompt="Choose a folder"):
     """Открывает диалог выбора папки."""
-    return filedialog.askdirectory(title=prompt)
+    return _filedialog().askdirectory(title=prompt)
 
 def choose_file(prompt="Choose a file"):
     """Открывает диалог выбора файла."""
-    return filedialog.askopenfilename(title=prompt)
+    return _filedialog().askopenfilename(title=prompt)
 
 # def get_default_metadata_path():
 #     """Возвращает путь для файла метаданных по умолчанию."""
@@ -118,4 +123,5 @@ def add_source_file():
     print(f"Запись для файла {file_name} добавлена в файл метаданных.")
 
 
-add_source_file()
+if __name__ == "__main__":
+    add_source_file()
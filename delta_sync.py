@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import zlib
+import shutil
+import hashlib
+import run_report
+from file_copy import iter_file_blocks, copy_file_with_hash, rechunk, finish_part, remove_checkpoint, PART_SUFFIX
+from hashers import new_hasher, DEFAULT_ALGORITHM
+
+DELTA_BLOCK_SIZE = 64 * 1024  # Размер блока сигнатуры
+DELTA_MIN_SIZE = 8 * 1024 * 1024  # Файлы меньше этого размера копируются целиком
+SIGNATURE_DIR = ".signatures"  # Папка сигнатур в корне флешки
+
+
+def weak_checksum(block):
+    """Слабая контрольная сумма блока (Adler-32, как в rsync)."""
+    return zlib.adler32(block)
+
+
+def strong_checksum(block):
+    """Сильная контрольная сумма блока, проверяется только при совпадении слабой."""
+    return hashlib.blake2b(block, digest_size=16).hexdigest()
+
+
+def signature_path(target_file, flash_drive_path):
+    """Путь к файлу сигнатуры копии на флешке."""
+    relative_path = os.path.relpath(target_file, flash_drive_path)
+    return os.path.join(flash_drive_path, SIGNATURE_DIR, relative_path + ".sig")
+
+
+def compute_signature(file_path, block_size=DELTA_BLOCK_SIZE):
+    """Вычисляет поблочную сигнатуру файла (чтение флешки дешевле записи на неё)."""
+    blocks = [[weak_checksum(block), strong_checksum(block)]
+              for block in iter_file_blocks(file_path, block_size)]
+    stat_result = os.stat(file_path)
+    return {
+        "block_size": block_size,
+        "size": stat_result.st_size,
+        "mtime_ns": stat_result.st_mtime_ns,
+        "blocks": blocks,
+    }
+
+
+def load_signature(sig_path, target_file, block_size=DELTA_BLOCK_SIZE):
+    """
+    Загружает сохранённую сигнатуру копии.
+    Если сигнатуры нет или копия изменилась после её записи, сигнатура пересчитывается.
+    """
+    if not os.path.exists(target_file):
+        return None
+    try:
+        with open(sig_path, "r", encoding="utf-8") as file:
+            signature = json.load(file)
+        stat_result = os.stat(target_file)
+        if (signature["block_size"] == block_size
+                and signature["size"] == stat_result.st_size
+                and signature["mtime_ns"] == stat_result.st_mtime_ns):
+            return signature
+    except (OSError, ValueError, KeyError):
+        pass
+    return compute_signature(target_file, block_size)
+
+
+def save_signature(sig_path, signature):
+    """Сохраняет сигнатуру копии рядом с остальными сигнатурами на флешке."""
+    os.makedirs(os.path.dirname(sig_path), exist_ok=True)
+    temp_path = sig_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(signature, file)
+    os.replace(temp_path, sig_path)
+
+
+def delta_copy(source_file, target_file, flash_drive_path, algorithm=DEFAULT_ALGORITHM, block_size=DELTA_BLOCK_SIZE,
+               blocks=None):
+    """
+    Обновляет копию на флешке, перезаписывая на месте только изменившиеся блоки.
+
+    Для каждого блока исходного файла сравнивается слабая сумма с сигнатурой копии,
+    при совпадении — сильная. Совпавшие блоки не записываются.
+
+    Блоки записываются в дубликат копии (target_file + .part), который заменяет копию только после fsync:
+    пока идёт обновление, под именем копии остаётся прежняя целая версия. Следующий запуск после прерывания
+    продолжает с временного файла — уже записанные блоки совпадут и записываться не будут.
+
+    :param blocks: Готовый поток блоков исходного файла любого размера (по умолчанию файл читается здесь).
+    :return: Кортеж (хэш исходного файла или None, размер файла, записано байт).
+    """
+    start = time.perf_counter()
+    sig_path = signature_path(target_file, flash_drive_path)
+    part_path = target_file + PART_SUFFIX
+    if os.path.exists(part_path):
+        # Прерванное обновление: сигнатура сверяется с размером и временем изменения, поэтому пересчитывается
+        old_signature = load_signature(sig_path, part_path, block_size)
+    else:
+        old_signature = load_signature(sig_path, target_file, block_size)
+        if old_signature:
+            shutil.copyfile(target_file, part_path)
+        else:
+            open(part_path, "wb").close()
+    old_blocks = old_signature["blocks"] if old_signature else []
+
+    hasher = new_hasher(algorithm) if algorithm else None
+    new_blocks = []
+    total = 0
+    written = 0
+
+    if blocks is None:
+        blocks = iter_file_blocks(source_file, block_size)
+
+    with open(part_path, "r+b") as dst:
+        for index, block in enumerate(rechunk(blocks, block_size)):
+            if hasher:
+                hasher.update(block)
+            weak, strong = weak_checksum(block), None
+            old = old_blocks[index] if index < len(old_blocks) else None
+            if old and old[0] == weak:
+                strong = strong_checksum(block)
+            if strong is None or old[1] != strong:
+                # Блок изменился — перезаписываем только его
+                dst.seek(index * block_size)
+                dst.write(block)
+                written += len(block)
+                if strong is None:
+                    strong = strong_checksum(block)
+            new_blocks.append([weak, strong])
+            total += len(block)
+        dst.truncate(total)
+        dst.flush()
+        os.fsync(dst.fileno())
+
+    shutil.copystat(source_file, part_path)
+    finish_part(part_path, target_file)
+    remove_checkpoint(part_path)  # Точка прерванного полного копирования больше не нужна
+    stat_result = os.stat(target_file)
+    save_signature(sig_path, {
+        "block_size": block_size,
+        "size": stat_result.st_size,
+        "mtime_ns": stat_result.st_mtime_ns,
+        "blocks": new_blocks,
+    })
+    if run_report.enabled():
+        run_report.record_file(source_file, "copy", time.perf_counter() - start, total, written,
+                               run_report.device_label(source_file), run_report.device_label(target_file))
+    return (hasher.hexdigest() if hasher else None), total, written
+
+
+def sync_file(source_file, target_file, flash_drive_path, algorithm=DEFAULT_ALGORITHM, blocks=None):
+    """
+    Копирует файл на флешку: большие файлы, уже имеющие копию, — дельта-передачей, остальные — целиком.
+    Первое копирование большого файла идёт через copy_file_with_hash и после прерывания продолжается с точки останова.
+
+    :param blocks: Готовый поток блоков исходного файла (например, от планировщика копирования).
+    :return: Кортеж (хэш или None, размер файла).
+    """
+    if os.path.getsize(source_file) < DELTA_MIN_SIZE or not os.path.exists(target_file):
+        return copy_file_with_hash(source_file, target_file, algorithm, blocks)
+
+    file_hash, total, written = delta_copy(source_file, target_file, flash_drive_path, algorithm,
+                                           blocks=blocks)
+    print(f"Дельта-копирование {os.path.basename(source_file)}: записано {written} из {total} байт.")
+    return file_hash, total
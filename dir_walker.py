@@ -0,0 +1,77 @@
+import os
+
+
+def _scan_target_dir(target_dir):
+    """Словарь {имя: DirEntry} файлов папки на флешке (пустой, если папки ещё нет)."""
+    try:
+        with os.scandir(target_dir) as it:
+            return {entry.name: entry for entry in it if entry.is_file(follow_symlinks=False)}
+    except (FileNotFoundError, NotADirectoryError):
+        return {}
+
+
+def walk_tree(source_root, target_root):
+    """
+    Лениво обходит папку-источник и соответствующую папку на флешке.
+
+    Для каждого файла выдаёт кортеж (путь источника, путь на флешке, stat источника, stat копии или None).
+    stat берётся из DirEntry, полученных через os.scandir, поэтому отдельные вызовы
+    os.path.exists/getmtime не нужны. Папка на флешке читается один раз на каждую папку источника.
+    """
+    stack = [(source_root, target_root)]
+    while stack:
+        source_dir, target_dir = stack.pop()
+        target_entries = None  # Папка на флешке читается, только если в источнике есть файлы
+        try:
+            with os.scandir(source_dir) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, os.path.join(target_dir, entry.name)))
+                    elif entry.is_file(follow_symlinks=False):
+                        if target_entries is None:
+                            target_entries = _scan_target_dir(target_dir)
+                        target_entry = target_entries.get(entry.name)
+                        yield (
+                            entry.path,
+                            os.path.join(target_dir, entry.name),
+                            entry.stat(follow_symlinks=False),
+                            target_entry.stat(follow_symlinks=False) if target_entry else None,
+                        )
+        except PermissionError as e:
+            print(f"Предупреждение: нет доступа к папке {source_dir}: {e}")
+
+
+def stat_or_none(path):
+    """Один вызов stat вместо пары exists + getmtime."""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def is_stale(source_stat, target_stat):
+    """Нужно ли копировать файл: копии нет или источник изменён позже копии."""
+    return target_stat is None or source_stat.st_mtime > target_stat.st_mtime
+
+
+def iter_stale_files(source_root, target_root):
+    """Потоково выдаёт только файлы папки, которые нужно скопировать: (источник, копия, stat источника, stat копии)."""
+    for source_path, target_path, source_stat, target_stat in walk_tree(source_root, target_root):
+        if is_stale(source_stat, target_stat):
+            yield source_path, target_path, source_stat, target_stat
+
+
+def iter_files(root):
+    """Лениво выдаёт (путь, stat) всех файлов папки через os.scandir."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry.path, entry.stat(follow_symlinks=False)
+        except PermissionError as e:
+            print(f"Предупреждение: нет доступа к папке {directory}: {e}")
@@ -0,0 +1,196 @@
+"""
+Манифест флешки: размер, время изменения и хэш каждой копии, хранящиеся на самой флешке.
+
+Кэш хэшей на флешке (hash_cache) хранит только хэши, а метаданные (metadata.txt, backup_info.txt)
+есть только на компьютере, с которого делались копии.
+Манифест описывает копии сам: пока размер и время изменения копии совпадают с манифестом, её хэш известен
+без чтения файла, поэтому проверка флешки на любой машине обходится одним чтением манифеста и вызовами stat.
+
+Формат (все числа little-endian):
+    заголовок   — сигнатура BKMF, версия, число записей;
+    записи      — фиксированного размера, отсортированы по пути (байты UTF-8):
+                  смещение и длина пути, длина хэша, размер, mtime_ns, смещение хэша;
+    строки      — пути (относительно корня флешки, через "/") и хэши с префиксом алгоритма.
+Файл отображается в память (mmap), запись ищется двоичным поиском без разбора всего файла.
+Манифест перезаписывается целиком после каждой партии копирования через временный файл и os.replace.
+"""
+import os
+import mmap
+import struct
+from file_copy import fsync_directory
+
+MANIFEST_FILENAME = "manifest.bin"
+MANIFEST_MAGIC = b"BKMF"
+MANIFEST_VERSION = 1
+HEADER = struct.Struct("<4sHHI")  # Сигнатура, версия, резерв, число записей
+RECORD = struct.Struct("<IHHQqI")  # Смещение пути, длина пути, длина хэша, размер, mtime_ns, смещение хэша
+
+
+def manifest_path(flash_drive_path):
+    return os.path.join(flash_drive_path, MANIFEST_FILENAME)
+
+
+def manifest_key(flash_drive_path, file_path):
+    """Путь копии в манифесте: относительно корня флешки, через "/"."""
+    return os.path.relpath(file_path, flash_drive_path).replace(os.sep, "/")
+
+
+def write_manifest(flash_drive_path, records):
+    """
+    Атомарно записывает манифест.
+
+    :param records: Словарь {путь в манифесте: (размер, mtime_ns, хэш с префиксом)}.
+    """
+    keys = sorted(records, key=lambda key: key.encode("utf-8"))
+    blob = bytearray()
+    packed = bytearray()
+    for key in keys:
+        size, mtime_ns, file_hash = records[key]
+        path_bytes = key.encode("utf-8")
+        hash_bytes = file_hash.encode("ascii")
+        path_offset = len(blob)
+        blob += path_bytes
+        hash_offset = len(blob)
+        blob += hash_bytes
+        packed += RECORD.pack(path_offset, len(path_bytes), len(hash_bytes), size, mtime_ns, hash_offset)
+    target = manifest_path(flash_drive_path)
+    temp_path = target + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(HEADER.pack(MANIFEST_MAGIC, MANIFEST_VERSION, 0, len(keys)))
+        file.write(packed)
+        file.write(blob)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, target)
+    fsync_directory(flash_drive_path)
+
+
+class DriveManifest:
+    """
+    Манифест одной флешки: поиск по отображённому в память файлу и изменения, которые записываются save().
+    Пока объект открыт, файл манифеста отображён в память; save() и close() освобождают его.
+    """
+
+    def __init__(self, flash_drive_path):
+        self.flash_drive_path = flash_drive_path
+        self.changes = {}  # Путь -> (размер, mtime_ns, хэш) или None для удалённой копии
+        self._file = None
+        self._mapped = None
+        self._count = 0
+        try:
+            self._file = open(manifest_path(flash_drive_path), "rb")
+            if os.fstat(self._file.fileno()).st_size >= HEADER.size:
+                self._mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, version, _, count = HEADER.unpack_from(self._mapped)
+                if magic != MANIFEST_MAGIC or version != MANIFEST_VERSION \
+                        or len(self._mapped) < HEADER.size + count * RECORD.size:
+                    raise ValueError("неизвестный формат")
+                self._count = count
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Манифест флешки {flash_drive_path} повреждён и будет пересоздан: {e}")
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._count = 0
+
+    def __len__(self):
+        return sum(1 for _ in self.records())
+
+    def _record(self, position):
+        path_offset, path_length, hash_length, size, mtime_ns, hash_offset = RECORD.unpack_from(
+            self._mapped, HEADER.size + position * RECORD.size)
+        blob = HEADER.size + self._count * RECORD.size
+        return (bytes(self._mapped[blob + path_offset:blob + path_offset + path_length]), size, mtime_ns,
+                self._mapped[blob + hash_offset:blob + hash_offset + hash_length].decode("ascii"))
+
+    def _find(self, key):
+        """Двоичный поиск записи в файле манифеста."""
+        key_bytes = key.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            path_bytes, size, mtime_ns, file_hash = self._record(middle)
+            if path_bytes < key_bytes:
+                low = middle + 1
+            elif path_bytes > key_bytes:
+                high = middle
+            else:
+                return size, mtime_ns, file_hash
+        return None
+
+    def lookup(self, key):
+        """Запись манифеста (размер, mtime_ns, хэш) или None."""
+        if key in self.changes:
+            return self.changes[key]
+        return self._find(key)
+
+    def known_hash(self, key, stat_result):
+        """Хэш копии из манифеста, если её размер и время изменения не изменились с момента записи; иначе None."""
+        record = self.lookup(key)
+        if record is None or record[0] != stat_result.st_size or record[1] != stat_result.st_mtime_ns:
+            return None
+        return record[2]
+
+    def record(self, key, stat_result, file_hash):
+        """Запоминает хэш копии вместе с её размером и временем изменения."""
+        self.changes[key] = (stat_result.st_size, stat_result.st_mtime_ns, file_hash)
+
+    def remove(self, key):
+        self.changes[key] = None
+
+    def records(self):
+        """Все записи (путь, размер, mtime_ns, хэш) одним последовательным проходом, с учётом изменений."""
+        for position in range(self._count):
+            path_bytes, size, mtime_ns, file_hash = self._record(position)
+            key = path_bytes.decode("utf-8")
+            if key not in self.changes:
+                yield key, size, mtime_ns, file_hash
+        for key, record in sorted(self.changes.items()):
+            if record is not None:
+                yield (key,) + record
+
+    def save(self):
+        """Записывает изменения: манифест перезаписывается целиком и атомарно. Отображение файла закрывается."""
+        if not self.changes:
+            self.close()
+            return
+        records = {key: (size, mtime_ns, file_hash) for key, size, mtime_ns, file_hash in self.records()}
+        self.close()
+        try:
+            write_manifest(self.flash_drive_path, records)
+            self.changes = {}
+        except OSError as e:
+            print(f"Ошибка при записи манифеста флешки {self.flash_drive_path}: {e}")
+
+
+def drive_state(flash_drive_path):
+    """
+    Состояние флешки по манифесту без метаданных компьютера и без чтения копий.
+
+    :return: Словарь {путь в манифесте: "актуален", "изменён" или "отсутствует"}.
+    """
+    states = {}
+    with DriveManifest(flash_drive_path) as manifest:
+        for key, size, mtime_ns, _ in manifest.records():
+            try:
+                stat_result = os.stat(os.path.join(flash_drive_path, *key.split("/")))
+            except OSError:
+                states[key] = "отсутствует"
+                continue
+            changed = stat_result.st_size != size or stat_result.st_mtime_ns != mtime_ns
+            states[key] = "изменён" if changed else "актуален"
+    return states
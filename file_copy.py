@@ -0,0 +1,238 @@
+import os
+import json
+import mmap
+import time
+import shutil
+import run_report
+from hashers import new_hasher, DEFAULT_ALGORITHM, MMAP_THRESHOLD
+
+COPY_BLOCK_SIZE = 1024 * 1024  # Размер блока копирования (1 МБ)
+COMPARE_BLOCK_SIZE = 1024 * 1024  # Размер сравниваемого участка (целое число страниц памяти)
+PART_SUFFIX = ".part"  # Временный файл копии до атомарной замены
+CHECKPOINT_SUFFIX = ".json"  # Контрольная точка рядом с временным файлом (копия.part.json)
+CHECKPOINT_ALGORITHM = DEFAULT_ALGORITHM  # Хэш начала источника в контрольной точке
+RESUME_MIN_SIZE = 64 * 1024 * 1024  # Файлы от этого размера можно докопировать после прерывания
+CHECKPOINT_INTERVAL = 64 * 1024 * 1024  # Контрольная точка — через каждые столько записанных байт
+
+
+def iter_file_blocks(file_path, block_size=COPY_BLOCK_SIZE):
+    """Читает файл последовательно блоками фиксированного размера."""
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            yield block
+
+
+def _compare_views(first, second, block_size):
+    """Сравнение участками: останавливается на первом отличающемся участке."""
+    for offset in range(0, len(first), block_size):
+        if first[offset:offset + block_size] != second[offset:offset + block_size]:
+            return False
+    return True
+
+
+def files_equal(first_path, second_path, block_size=COMPARE_BLOCK_SIZE):
+    """
+    Побайтовое сравнение двух файлов (например, источника и копии на флешке).
+    Разный размер определяется по stat без чтения. Большие файлы сравниваются через mmap срезами memoryview
+    без создания объектов bytes; сравнение прекращается на первом отличии.
+    """
+    with open(first_path, "rb") as first, open(second_path, "rb") as second:
+        size = os.fstat(first.fileno()).st_size
+        if size != os.fstat(second.fileno()).st_size:
+            return False
+        if size >= MMAP_THRESHOLD:
+            try:
+                with mmap.mmap(first.fileno(), 0, access=mmap.ACCESS_READ) as first_map, \
+                        mmap.mmap(second.fileno(), 0, access=mmap.ACCESS_READ) as second_map:
+                    first_view, second_view = memoryview(first_map), memoryview(second_map)
+                    try:
+                        return _compare_views(first_view, second_view, block_size)
+                    finally:
+                        first_view.release()
+                        second_view.release()
+            except (OSError, ValueError):
+                pass  # Файл нельзя отобразить в память — обычное чтение
+        for first_block, second_block in zip(iter(lambda: first.read(block_size), b""),
+                                             iter(lambda: second.read(block_size), b"")):
+            if first_block != second_block:
+                return False
+        return True
+
+
+def rechunk(blocks, block_size):
+    """Перенарезает поток блоков произвольного размера на блоки block_size (последний может быть короче)."""
+    buffer = bytearray()
+    for block in blocks:
+        buffer += block
+        while len(buffer) >= block_size:
+            yield bytes(buffer[:block_size])
+            del buffer[:block_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def fsync_directory(directory):
+    """Сбрасывает на диск запись папки (новое имя файла после os.replace); в Windows не требуется."""
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def finish_part(part_path, target_file):
+    """Атомарно заменяет копию полностью записанным временным файлом."""
+    os.replace(part_path, target_file)
+    fsync_directory(os.path.dirname(target_file))
+
+
+def load_checkpoint(part_path, source_stat):
+    """
+    Контрольная точка прерванного копирования, если с неё можно продолжить:
+    источник не изменился (размер и время изменения), а временный файл содержит записанное начало.
+    """
+    try:
+        with open(part_path + CHECKPOINT_SUFFIX, "r", encoding="utf-8") as file:
+            checkpoint = json.load(file)
+        if (checkpoint["size"] == source_stat.st_size and checkpoint["mtime_ns"] == source_stat.st_mtime_ns
+                and checkpoint["algorithm"] == CHECKPOINT_ALGORITHM
+                and 0 < checkpoint["offset"] <= os.path.getsize(part_path)):
+            return checkpoint
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def save_checkpoint(part_path, dst, source_stat, offset, partial_hash):
+    """Сбрасывает записанное на диск и запоминает, до какого места копия надёжно записана."""
+    dst.flush()
+    os.fsync(dst.fileno())
+    checkpoint_path = part_path + CHECKPOINT_SUFFIX
+    with open(checkpoint_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump({
+            "size": source_stat.st_size,
+            "mtime_ns": source_stat.st_mtime_ns,
+            "offset": offset,
+            "algorithm": CHECKPOINT_ALGORITHM,
+            "partial": partial_hash,
+        }, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+
+def remove_checkpoint(part_path):
+    try:
+        os.remove(part_path + CHECKPOINT_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+
+def _split_at(blocks, offset):
+    """Поток блоков, в котором один из блоков заканчивается ровно на offset."""
+    position = 0
+    for block in blocks:
+        if position < offset < position + len(block):
+            view = memoryview(block)
+            yield view[:offset - position]
+            yield view[offset - position:]
+        else:
+            yield block
+        position += len(block)
+
+
+def _rewrite_prefix(source_file, dst, length):
+    """Записывает начало источника заново (если оно изменилось после контрольной точки)."""
+    dst.seek(0)
+    with open(source_file, "rb") as src:
+        while length > 0:
+            block = src.read(min(COPY_BLOCK_SIZE, length))
+            if not block:
+                break
+            dst.write(block)
+            length -= len(block)
+
+
+def copy_file_with_hash(source_file, target_file, algorithm=DEFAULT_ALGORITHM, blocks=None, preserve_stat=True):
+    """
+    Копирует файл за один проход, одновременно вычисляя его хэш.
+
+    Каждый блок читается один раз и сразу передаётся и в хэш, и в файл назначения,
+    поэтому расход памяти ограничен размером блока независимо от размера файла.
+
+    Запись идёт во временный файл target_file + .part, который после fsync атомарно заменяет копию:
+    если флешку извлекут посреди копирования, прежняя копия (или её отсутствие) останется как была.
+    Большие файлы (от RESUME_MIN_SIZE) каждые CHECKPOINT_INTERVAL байт сохраняют контрольную точку:
+    надёжно записанное смещение и хэш начала источника. Следующее копирование того же файла
+    не записывает это начало заново: оно только перечитывается из источника для хэша и сверяется с точкой.
+
+    :param algorithm: Алгоритм из реестра hashers или None, если хэш не нужен.
+    :param blocks: Готовый источник блоков исходного файла (по умолчанию файл читается здесь).
+    :param preserve_stat: Перенести время изменения и атрибуты, как это делает shutil.copy2.
+    :return: Кортеж (хэш или None, число скопированных байт).
+    """
+    hasher = new_hasher(algorithm) if algorithm else None
+    if blocks is None:
+        blocks = iter_file_blocks(source_file)
+    part_path = target_file + PART_SUFFIX
+    source_stat = os.stat(source_file)
+    resumable = source_stat.st_size >= RESUME_MIN_SIZE
+    checkpoint = load_checkpoint(part_path, source_stat) if resumable else None
+    resume_offset = checkpoint["offset"] if checkpoint else 0
+    # Хэш начала источника для контрольных точек (совпадает с основным, если алгоритм тот же)
+    prefix_hasher = None
+    if resumable:
+        prefix_hasher = hasher if algorithm == CHECKPOINT_ALGORITHM else new_hasher(CHECKPOINT_ALGORITHM)
+
+    start = time.perf_counter()
+    copied = 0
+    written = 0
+    try:
+        with open(part_path, "r+b" if resume_offset else "wb") as dst:
+            dst.truncate(resume_offset)
+            dst.seek(resume_offset)
+            next_checkpoint = resume_offset + CHECKPOINT_INTERVAL
+            for block in _split_at(blocks, resume_offset):
+                if hasher:
+                    hasher.update(block)
+                if prefix_hasher is not None and prefix_hasher is not hasher:
+                    prefix_hasher.update(block)
+                copied += len(block)
+                if copied <= resume_offset:
+                    if copied == resume_offset and prefix_hasher.hexdigest() != checkpoint["partial"]:
+                        print(f"Начало {os.path.basename(source_file)} изменилось, оно будет записано заново.")
+                        _rewrite_prefix(source_file, dst, resume_offset)
+                        written += resume_offset
+                    continue
+                dst.write(block)
+                written += len(block)
+                if resumable and copied >= next_checkpoint:
+                    save_checkpoint(part_path, dst, source_stat, copied, prefix_hasher.hexdigest())
+                    next_checkpoint = copied + CHECKPOINT_INTERVAL
+            dst.flush()
+            os.fsync(dst.fileno())
+    except BaseException:
+        # Без контрольной точки продолжить нельзя — незаконченный файл не нужен
+        if not resumable:
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+        raise
+
+    if preserve_stat:
+        shutil.copystat(source_file, part_path)
+    finish_part(part_path, target_file)
+    if resumable:
+        remove_checkpoint(part_path)
+    if resume_offset:
+        print(f"Копирование {os.path.basename(source_file)} продолжено с {resume_offset} байт.")
+    if run_report.enabled():
+        run_report.record_file(source_file, "copy", time.perf_counter() - start, copied, written,
+                               run_report.device_label(source_file), run_report.device_label(target_file))
+    return (hasher.hexdigest() if hasher else None), copied
@@ -1,4 +1,4 @@
-import win32com.client
+# pywin32 (win32com) импортируется внутри функций, чтобы импорт модуля не инициализировал COM
 
 def list_scheduled_tasks():
     """
@@ -29,6 +29,7 @@ def list_scheduled_tasks():
     """
 
     # 🌟 Подключаемся к Планировщику задач
+    import win32com.client
     scheduler = win32com.client.Dispatch('Schedule.Service')
     scheduler.Connect()
 
@@ -76,6 +77,7 @@ def list_all_scheduled_tasks():
     """
 
     # 🌟 Подключаемся к Планировщику задач
+    import win32com.client
     scheduler = win32com.client.Dispatch('Schedule.Service')
     scheduler.Connect()
 
@@ -125,6 +127,7 @@ def duplicate_task(old_name, new_name):
     """
 
     # 🌟 Подключаемся к Планировщику задач
+    import win32com.client
     scheduler = win32com.client.Dispatch('Schedule.Service')
     scheduler.Connect()
     tasks_folder = scheduler.GetFolder('\\')  # 📂 Получаем доступ к корневой папке задач
@@ -186,6 +189,7 @@ def duplicate_task(old_name, new_name):
 
 def create_USB_backup_task():
     # Подключение к Планировщику задач
+    import win32com.client
     scheduler = win32com.client.Dispatch('Schedule.Service')
     scheduler.Connect()
     
@@ -224,7 +228,8 @@ def create_USB_backup_task():
     # Настройка действия
     action = this_task.Actions.Create(0)  # Тип действия: Запуск программы
     action.Path = r"C:\Users\User\AppData\Local\Programs\Python\Python38-32\python.exe"
-    action.Arguments = r"C:\Users\User\Desktop\Python\Projects\Automatic-backup-to-flash-drive\main.py"
+    # Запуск без вопросов пользователю: файлы из списка main.py копируются сразу после подключения
+    action.Arguments = r"C:\Users\User\Desktop\Python\Projects\Automatic-backup-to-flash-drive\main.py --policy all"
 
     # Устанавливаем настройки
     settings = this_task.Settings
@@ -250,8 +255,6 @@ def create_USB_backup_task():
 # Запуск процедуры
 # create_USB_backup_task()
 
-list_scheduled_tasks()
-import win32com.client
 
 def list_scheduled_tasks():
     """
@@ -282,6 +285,7 @@ def list_scheduled_tasks():
     """
 
     # 🌟 Подключаемся к Планировщику задач
+    import win32com.client
     scheduler = win32com.client.Dispatch('Schedule.Service')
     scheduler.Connect()
 
@@ -329,6 +333,7 @@ def list_all_scheduled_tasks():
     """
 
     # 🌟 Подключаемся к Планировщику задач
+    import win32com.client
     scheduler = win32com.client.Dispatch('Schedule.Service')
     scheduler.Connect()
 
@@ -378,6 +383,7 @@ def duplicate_task(old_name, new_name):
     """
 
     # 🌟 Подключаемся к Планировщику задач
+    import win32com.client
     scheduler = win32com.client.Dispatch('Schedule.Service')
     scheduler.Connect()
     tasks_folder = scheduler.GetFolder('\\')  # 📂 Получаем доступ к корневой папке задач
@@ -460,6 +466,7 @@ def create_USB_backup_task():
     """
 
     # 🌟 Подключаемся к Планировщику задач
+    import win32com.client
     scheduler = win32com.client.Dispatch('Schedule.Service')
     scheduler.Connect()
 
@@ -498,7 +505,9 @@ def create_USB_backup_task():
     # ⚙ Настройка действия
     action = this_task.Actions.Create(0)  # 🛠 Тип действия: запуск программы
     action.Path = r"C:\Users\User\AppData\Local\Programs\Python\Python38-32\python.exe"  # 🐍 Путь к Python
-    action.Arguments = r"C:\Users\User\Desktop\Python\Projects\Automatic-backup-to-flash-drive\main.py"  # 📜 Скрипт
+    action.Arguments = (  # 📜 Скрипт: запуск без вопросов пользователю
+        r"C:\Users\User\Desktop\Python\Projects\Automatic-backup-to-flash-drive\main.py --policy all"
+    )
 
     # 🔧 Устанавливаем параметры задачи
     settings = this_task.Settings
@@ -526,4 +535,5 @@ def create_USB_backup_task():
 # Запуск процедуры
 # create_USB_backup_task()
 
-list_scheduled_tasks()
+if __name__ == "__main__":
+    list_scheduled_tasks()
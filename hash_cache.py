@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import threading
+import run_report
+from compression import open_stored
+from hashers import hash_stream, hash_file
+
+HASH_CACHE_FILENAME = "hash_cache.json"
+
+
+def file_signature(stat_result, portable=False):
+    """
+    Кортеж (устройство, inode, размер, mtime_ns), по которому проверяется актуальность хэша.
+    portable — только (размер, mtime_ns): устройство и inode флешки меняются от подключения к подключению.
+    """
+    if portable:
+        return [stat_result.st_size, stat_result.st_mtime_ns]
+    return [stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns]
+
+
+class HashCache:
+    """
+    Постоянный кэш хэшей файлов.
+
+    Хэш хранится вместе с кортежем (устройство, inode, размер, mtime_ns) файла.
+    Пока кортеж не изменился, повторное чтение файла не требуется: достаточно вызова stat.
+    Любое изменение кортежа делает запись недействительной.
+
+    Кэш на флешке создаётся с root (корень флешки): ключом служит путь относительно корня,
+    а кортеж — (размер, mtime_ns), поэтому кэш остаётся действительным при другой букве диска,
+    точке монтирования или номере устройства.
+    """
+
+    def __init__(self, cache_path, root=None):
+        self.cache_path = cache_path
+        self.root = root
+        self.entries = {}
+        self.changed = False
+        # Кэш используется из нескольких потоков движка хэширования
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Чтение кэша с диска. Повреждённый или отсутствующий файл означает пустой кэш."""
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            print(f"Предупреждение: кэш хэшей {self.cache_path} повреждён и будет пересоздан.")
+            self.entries = {}
+            return
+        if self.root is not None:
+            # Записи прежнего формата (абсолютный путь с точкой монтирования) больше не совпадут
+            stale = [key for key in self.entries if os.path.isabs(key.split(":", 1)[-1])]
+            for key in stale:
+                del self.entries[key]
+            self.changed = bool(stale)
+
+    def save(self):
+        """Запись кэша на диск (только если были изменения)."""
+        if not self.changed:
+            return
+        temp_path = self.cache_path + ".tmp"
+        try:
+            with self.lock, open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self.entries, file)
+            os.replace(temp_path, self.cache_path)
+            self.changed = False
+        except OSError as e:
+            print(f"Ошибка при сохранении кэша хэшей {self.cache_path}: {e}")
+
+    def _key(self, file_path, algorithm):
+        if self.root is not None:
+            return f"{algorithm}:{os.path.relpath(file_path, self.root).replace(os.sep, '/')}"
+        return f"{algorithm}:{os.path.normcase(os.path.abspath(file_path))}"
+
+    def _signature(self, stat_result):
+        return file_signature(stat_result, portable=self.root is not None)
+
+    def get(self, file_path, algorithm, stat_result=None):
+        """Возвращает сохранённый хэш, если файл не изменился, иначе None."""
+        if stat_result is None:
+            try:
+                stat_result = os.stat(file_path)
+            except OSError:
+                return None
+        key = self._key(file_path, algorithm)
+        with self.lock:
+            record = self.entries.get(key)
+            if record and record["stat"] == self._signature(stat_result):
+                return record["hash"]
+            if record:
+                # Файл изменился — запись больше не действительна
+                del self.entries[key]
+                self.changed = True
+        return None
+
+    def put(self, file_path, algorithm, file_hash, stat_result=None):
+        """Сохраняет хэш файла вместе с его текущим кортежем stat."""
+        if stat_result is None:
+            stat_result = os.stat(file_path)
+        with self.lock:
+            self.entries[self._key(file_path, algorithm)] = {
+                "stat": self._signature(stat_result),
+                "hash": file_hash,
+            }
+            self.changed = True
+
+    def get_or_compute(self, file_path, algorithm, compute):
+        """
+        Возвращает хэш файла из кэша или вычисляет его функцией compute(file_path).
+
+        stat снимается до чтения файла: если файл изменится во время хэширования,
+        при следующем запуске кортеж не совпадёт и хэш будет пересчитан.
+        """
+        stat_result = os.stat(file_path)
+        file_hash = self.get(file_path, algorithm, stat_result)
+        if file_hash is not None:
+            run_report.count("hash_cache_hits")
+        else:
+            file_hash = compute(file_path)
+            if file_hash is not None:
+                self.put(file_path, algorithm, file_hash, stat_result)
+        return file_hash
+
+
+def cached_file_hash(file_path, algorithm, cache=None, codec=None):
+    """
+    Хэш файла (без префикса алгоритма) алгоритмом из реестра hashers с использованием кэша (если он передан).
+    Для сжатой копии (codec) хэш считается по распакованному содержимому.
+    """
+    def compute(path):
+        start = time.perf_counter()
+        if codec:
+            with open_stored(path, codec) as f:
+                hexdigest = hash_stream(f, algorithm)
+                hashed = f.tell()
+        else:
+            hexdigest, hashed = hash_file(path, algorithm)
+        if run_report.enabled():
+            run_report.record_file(path, "hash", time.perf_counter() - start, bytes_read=hashed,
+                                   read_device=run_report.device_label(path))
+        return hexdigest
+
+    if cache is None:
+        return compute(file_path)
+    return cache.get_or_compute(file_path, f"{algorithm}+{codec}" if codec else algorithm, compute)
@@ -0,0 +1,82 @@
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from hash_cache import cached_file_hash
+
+# Число потоков хэширования на одно устройство по умолчанию.
+# Для флешек обычно достаточно 2, для SSD имеет смысл больше.
+DEFAULT_WORKERS_PER_DEVICE = 4
+
+
+def _device_of(path):
+    """Идентификатор устройства, на котором лежит файл (None, если файла нет)."""
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+
+def _resolve_workers(workers_per_device):
+    """
+    Преобразует настройку числа потоков в словарь {st_dev: число потоков}.
+
+    Настройка задаётся либо одним числом для всех устройств, либо словарём,
+    где ключ — любой путь на устройстве (например, корень флешки), а значение — число потоков.
+    Ключ None в словаре задаёт значение по умолчанию.
+    """
+    if isinstance(workers_per_device, int):
+        return {}, workers_per_device
+    default = workers_per_device.get(None, DEFAULT_WORKERS_PER_DEVICE)
+    by_device = {}
+    for path, workers in workers_per_device.items():
+        if path is None:
+            continue
+        device = _device_of(path)
+        if device is not None:
+            by_device[device] = workers
+    return by_device, default
+
+
+def hash_files(paths, algorithm, cache=None, workers_per_device=DEFAULT_WORKERS_PER_DEVICE, codecs=None):
+    """
+    Параллельно вычисляет хэши списка файлов.
+
+    Для каждого устройства создаётся свой ограниченный пул потоков, поэтому медленная
+    флешка не отнимает потоки у локального диска. hashlib отпускает GIL при обработке
+    больших блоков, так что потоки действительно работают одновременно.
+
+    :param codecs: Кодеки сжатых копий в том же порядке, что и paths (None — файлы не сжаты).
+    :return: Список хэшей в том же порядке, что и paths (None для отсутствующих файлов).
+    """
+    results = [None] * len(paths)
+    by_device, default_workers = _resolve_workers(workers_per_device)
+
+    # Группируем файлы по устройствам, сохраняя их исходные позиции
+    groups = {}
+    for index, path in enumerate(paths):
+        device = _device_of(path)
+        if device is not None:
+            groups.setdefault(device, []).append(index)
+
+    executors = []
+    futures = {}
+    try:
+        for device, indices in groups.items():
+            workers = max(1, min(by_device.get(device, default_workers), len(indices)))
+            executor = ThreadPoolExecutor(max_workers=workers)
+            executors.append(executor)
+            for index in indices:
+                codec = codecs[index] if codecs else None
+                futures[index] = executor.submit(cached_file_hash, paths[index], algorithm, cache, codec)
+
+        # Собираем результаты в исходном порядке
+        for index, future in futures.items():
+            try:
+                results[index] = future.result()
+            except (OSError, EOFError, zlib.error) as e:
+                print(f"Ошибка при вычислении хэша {paths[index]}: {e}")
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=True)
+
+    return results
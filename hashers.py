@@ -0,0 +1,119 @@
+"""
+Единый реестр алгоритмов хэширования.
+
+Хэши в метаданных хранятся с указанием алгоритма: "blake2b:3f5a...". Старые значения без префикса
+(MD5 из createMetadataFile и SHA-256 из BackupManager) распознаются по длине и проверяются тем же алгоритмом,
+поэтому переход на новый алгоритм не требует пересчёта метаданных: запись обновляется при следующем копировании.
+"""
+import os
+import mmap
+import hashlib
+
+try:
+    import xxhash  # Необязательная зависимость: очень быстрый некриптографический хэш
+except ImportError:
+    xxhash = None
+
+DEFAULT_ALGORITHM = "blake2b"  # Быстрее SHA-256 и MD5 на 64-битных процессорах
+FAST_ALGORITHM = "xxh3_128" if xxhash else DEFAULT_ALGORITHM  # Только для обнаружения изменений
+READ_BUFFER_SIZE = 1024 * 1024  # Размер буфера чтения, если hashlib.file_digest недоступен
+MMAP_THRESHOLD = 64 * 1024 * 1024  # Файлы от этого размера хэшируются через mmap
+MMAP_CHUNK_SIZE = 8 * 1024 * 1024  # Размер среза отображения, передаваемого в хэш за один вызов
+LEGACY_ALGORITHMS = {32: "md5", 64: "sha256"}  # Хэши без префикса: длина шестнадцатеричной строки -> алгоритм
+
+
+def is_available(algorithm):
+    """Можно ли посчитать хэш этим алгоритмом на этой машине."""
+    if algorithm is None:
+        return False
+    if algorithm.startswith("xxh"):
+        return xxhash is not None and hasattr(xxhash, algorithm)
+    return algorithm in hashlib.algorithms_available
+
+
+def new_hasher(algorithm):
+    """Объект хэширования (update/hexdigest) по имени алгоритма hashlib или xxhash."""
+    if algorithm.startswith("xxh"):
+        if xxhash is None:
+            raise ValueError(f"Алгоритм {algorithm} требует пакета xxhash")
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+
+def format_digest(algorithm, hexdigest):
+    """Хэш с префиксом алгоритма для хранения в метаданных."""
+    return f"{algorithm}:{hexdigest}"
+
+
+def parse_digest(value):
+    """
+    Разбирает сохранённый хэш.
+
+    :return: Кортеж (алгоритм или None, шестнадцатеричная строка).
+    """
+    value = (value or "").strip()
+    algorithm, separator, hexdigest = value.partition(":")
+    if separator:
+        return algorithm, hexdigest
+    return LEGACY_ALGORITHMS.get(len(value)), value
+
+
+def digest_matches(stored, algorithm, hexdigest):
+    """Совпадает ли сохранённый хэш (с префиксом или старого формата) с посчитанным."""
+    stored_algorithm, stored_hex = parse_digest(stored)
+    return stored_algorithm == algorithm and stored_hex == hexdigest
+
+
+def hash_stream(f, algorithm):
+    """
+    Хэш открытого в двоичном режиме файла.
+    hashlib.file_digest (Python 3.11+) читает в один буфер без создания объектов bytes на каждый блок.
+    """
+    if hasattr(hashlib, "file_digest"):
+        return hashlib.file_digest(f, lambda: new_hasher(algorithm)).hexdigest()
+    hasher = new_hasher(algorithm)
+    buffer = bytearray(READ_BUFFER_SIZE)
+    view = memoryview(buffer)
+    while True:
+        size = f.readinto(buffer)
+        if not size:
+            break
+        hasher.update(view[:size])
+    return hasher.hexdigest()
+
+
+def hash_mapped(f, algorithm):
+    """
+    Хэш большого файла через mmap: срезы memoryview передаются в хэш без копирования в объекты bytes,
+    а hashlib отпускает GIL на время обработки каждого среза.
+    """
+    hasher = new_hasher(algorithm)
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            for offset in range(0, len(mapped), MMAP_CHUNK_SIZE):
+                hasher.update(view[offset:offset + MMAP_CHUNK_SIZE])
+        finally:
+            view.release()  # Иначе отображение нельзя закрыть
+    return hasher.hexdigest()
+
+
+def hash_file(file_path, algorithm):
+    """
+    Хэш файла (без префикса): большие файлы — через mmap, остальные — через hash_stream.
+
+    :return: Кортеж (хэш, размер файла).
+    """
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            try:
+                return hash_mapped(f, algorithm), size
+            except (OSError, ValueError):
+                pass  # Файл нельзя отобразить в память (например, на сетевом диске) — обычное чтение
+        return hash_stream(f, algorithm), f.tell()
+
+
+def file_digest(file_path, algorithm=DEFAULT_ALGORITHM):
+    """Хэш файла с префиксом алгоритма."""
+    return format_digest(algorithm, hash_file(file_path, algorithm)[0])
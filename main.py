@@ -1,7 +1,15 @@
 import os
-import shutil
-import psutil
+import stat
+import argparse
 from datetime import datetime
+from delta_sync import sync_file
+from dir_walker import iter_stale_files, stat_or_none, is_stale
+from copy_scheduler import CopyScheduler
+from preflight import fit_files
+from multi_target import select_targets
+from change_recorder import stick_id
+from backup_plan import build_plan, select_items, parse_choices
+import run_report
 
 # Путь к файлу с адресами и именами файлов
 file_list_path = r"C:\Users\User\Desktop\Work\file_list.txt"  # Сырой путь
@@ -21,13 +29,23 @@ def read_file_list(file_list_path):
     return file_list
 
 
+# Поиск всех подключенных флешек (точки монтирования; на Windows совпадают с именами устройств)
+def get_flash_drives():
+    import psutil
+    return [partition.mountpoint for partition in psutil.disk_partitions() if 'removable' in partition.opts]
+
+
+# Флешки для резервирования: зарегистрированные (с идентификатором в корне), иначе первая подключенная,
+# чтобы карта памяти фотоаппарата или чужая флешка не получали копии.
+# Первая флешка регистрируется при первом копировании на неё (см. update_files)
+def get_backup_targets():
+    return select_targets(get_flash_drives())
+
+
 # Поиск подключенной флешки
 def get_flash_drive():
-    partitions = psutil.disk_partitions()
-    for partition in partitions:
-        if 'removable' in partition.opts:
-            return partition.device
-    return None
+    flash_drives = get_flash_drives()
+    return flash_drives[0] if flash_drives else None
 
 
 # Сравнение файлов по дате изменения
@@ -35,27 +53,57 @@ def is_newer(source_file, target_file):
     return os.path.getmtime(source_file) > os.path.getmtime(target_file)
 
 
-# Основная логика обновления файлов
-def update_files(file_list, flash_drive):
-    update_candidates = []  # Файлы для обновления
+# Основная логика обновления файлов.
+# flash_drive — флешка или список флешек: файл, устаревший на нескольких флешках, читается один раз.
+# Выбор файлов разбирается по плану резервирования (backup_plan): по номерам, введённым пользователем,
+# или без вопросов по правилу policy (all, critical или max-mb:N)
+def update_files(file_list, flash_drive, policy=None):
+    flash_drives = [flash_drive] if isinstance(flash_drive, str) else list(flash_drive)
+    entries = []            # Записи плана: по одной на каждый найденный источник
+    statuses = {drive: [] for drive in flash_drives}  # Статусы записей на каждой флешке
+    update_candidates = []  # Для каждой записи: файл-источник -> пути на флешках, где копия устарела
     skipped_files = []      # Пропущенные файлы (актуальные)
-
-    for source_file in file_list:
-        if not os.path.exists(source_file):
-            print(f"Файл не найден: {source_file}")
-            continue
-
-        # Генерируем путь на флешке (только имя файла)
-        target_file = os.path.join(flash_drive, os.path.basename(source_file))
-
-        # Проверяем наличие файла на флешке
-        if os.path.exists(target_file):
-            if is_newer(source_file, target_file):
-                update_candidates.append((source_file, target_file))
-            else:
-                skipped_files.append((source_file, target_file))
-        else:
-            update_candidates.append((source_file, target_file))
+    drive_of = {}           # Путь на флешке -> флешка
+
+    with run_report.phase("stat_scan"):
+        for source_file in file_list:
+            source_stat = stat_or_none(source_file)
+            if source_stat is None:
+                print(f"Файл не найден: {source_file}")
+                continue
+
+            name = os.path.basename(source_file)
+            stale_targets = {}  # Источник -> пути на флешках, где копия устарела
+            for drive in flash_drives:
+                # Генерируем путь на флешке (только имя файла или папки)
+                target_file = os.path.join(drive, name)
+
+                if stat.S_ISDIR(source_stat.st_mode):
+                    # Папка раскрывается лениво; актуальные файлы папки в список не попадают
+                    status = "актуален"
+                    for source, target, _, _ in iter_stale_files(source_file, target_file):
+                        stale_targets.setdefault(source, []).append(target)
+                        drive_of[target] = drive
+                        status = "неактуален"
+                    statuses[drive].append(status)
+                    continue
+
+                # Проверяем наличие файла на флешке
+                target_stat = stat_or_none(target_file)
+                if target_stat is None:
+                    statuses[drive].append("отсутствует")
+                elif is_stale(source_stat, target_stat):
+                    statuses[drive].append("неактуален")
+                else:
+                    statuses[drive].append("актуален")
+                    skipped_files.append((source_file, target_file))
+                    continue
+                stale_targets.setdefault(source_file, []).append(target_file)
+                drive_of[target_file] = drive
+            entries.append({"Name": name, "From": source_file, "To": name})
+            update_candidates.append(stale_targets)
+
+    run_report.count("files_skipped", len(skipped_files))
 
     # Вывод пропущенных файлов
     if skipped_files:
@@ -64,61 +112,103 @@ def update_files(file_list, flash_drive):
             print(f"- {source} -> {target}")
 
     # Если нет файлов для обновления
-    if not update_candidates:
+    if not any(update_candidates):
         print("Все файлы на флешке актуальны.")
         return
 
-    # Вывод списка файлов для обновления
-    print("Список файлов для обновления:")
-    for idx, (source, target) in enumerate(update_candidates, start=1):
-        print(f"{idx}. {source} -> {target}")
+    # План для каждой флешки; номера записей одинаковы для всех флешек
+    plans = [build_plan(entries, statuses[drive], drive) for drive in flash_drives]
 
-    # Предложение пользователю выбрать файлы для копирования
-    print("Введите номера файлов для обновления через запятую (или '*' для копирования всех, или '-' для пропуска): ")
-    choice = input().strip()
-
-    # Обработка выбора
-    if not choice or choice in {'-', '0'}:  # Если ввод пустой, '-' или '0'
-        print("Копирование файлов отменено.")
-        return
+    # Вывод списка файлов для обновления (файлы папки выводятся под номером папки)
+    print("Список файлов для обновления:")
+    for idx, stale_targets in enumerate(update_candidates, start=1):
+        for source, targets in stale_targets.items():
+            print(f"{idx}. {source} -> {', '.join(targets)}")
 
-    if choice == '*':  # Проверяем ввод '*'
-        selected_indices = range(1, len(update_candidates) + 1)  # Выбираем все файлы
+    if policy:
+        # Запуск без консоли: выбор по правилу вместо вопроса пользователю
+        selections = [select_items(plan, policy) for plan in plans]
     else:
-        try:
-            selected_indices = [int(num.strip()) for num in choice.split(',') if num.strip().isdigit()]
-        except ValueError:
-            print("Ошибка: ввод некорректен. Ожидались номера файлов через запятую.")
-            return
+        # Предложение пользователю выбрать файлы для копирования
+        print("Введите номера файлов для обновления через запятую (или '*' для копирования всех, или '-' для пропуска): ")
+        choice = input().strip()
 
-    # Копирование выбранных файлов
-    for idx in selected_indices:
-        if 1 <= idx <= len(update_candidates):
-            source, target = update_candidates[idx - 1]
-            os.makedirs(os.path.dirname(target), exist_ok=True)
-            shutil.copy2(source, target)
-            print(f"Файл скопирован: {source} -> {target}")
-        else:
-            print(f"Предупреждение: номер {idx} не существует в списке.")
-
-
-# Главная функция
-def main():
+        # Обработка выбора
+        if not choice or choice in {'-', '0'}:  # Если ввод пустой, '-' или '0'
+            print("Копирование файлов отменено.")
+            return
+        selections = [parse_choices(plan, choice) for plan in plans]
+
+    # Копирование выбранных файлов: на каждую флешку — её устаревшие копии выбранных записей
+    selected_targets = {}
+    for drive, items in zip(flash_drives, selections):
+        for item in items:
+            for source, targets in update_candidates[item["index"] - 1].items():
+                selected_targets.setdefault(source, []).extend(
+                    target for target in targets if drive_of[target] == drive)
+    jobs = [(source, source, targets) for source, targets in selected_targets.items() if targets]
+
+    # На каждую флешку копируется только то, что на неё поместится
+    fitting = set()
+    for drive in flash_drives:
+        fitting.update(fit_files([(source, target) for source, _, targets in jobs
+                                  for target in targets if drive_of[target] == drive], drive))
+    jobs = [(source, source, [target for target in targets if (source, target) in fitting])
+            for source, _, targets in jobs]
+    jobs = [job for job in jobs if job[2]]
+
+    # Флешка, получающая копии, регистрируется: при следующих запусках она выбирается вместе с остальными
+    for drive in {drive_of[target] for _, _, targets in jobs for target in targets}:
+        stick_id(drive)
+
+    # Параллельное чтение источников и очереди записи на каждую флешку; каждый источник читается один раз.
+    # Потоковое копирование блоками (большие файлы — дельтой), хэш здесь не нужен
+    scheduler = CopyScheduler(
+        lambda source, target, blocks: sync_file(source, target, drive_of[target], None, blocks)
+    )
+    with run_report.phase("copy"):
+        for source, results in scheduler.run_fanout(jobs):
+            for target, _, error in results:
+                if error:
+                    print(f"Ошибка при копировании {source} -> {target}: {error}")
+                    run_report.count("files_failed")
+                else:
+                    print(f"Файл скопирован: {source} -> {target}")
+                    run_report.count("files_copied")
+
+
+# Главная функция: --policy задаёт выбор файлов без вопросов (запуск из планировщика заданий)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Копирование файлов из списка на флешки")
+    parser.add_argument("--policy", help="Правило выбора: all, critical или max-mb:N (по умолчанию — вопрос)")
+    args = parser.parse_args(argv)
+
+    # Замеры этапов запуска; отчёт сохраняется в папке программы, как у остальных движков
+    run_report.start_run("main")
+    try:
+        run_backup(args.policy)
+    finally:
+        run_report.finish_run(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_backup(policy=None):
     print(f"[{datetime.now()}] Проверка подключения флешки...")
-    flash_drive = get_flash_drive()
+    with run_report.phase("drive_detection"):
+        flash_drives = get_backup_targets()
 
-    if not flash_drive:
+    if not flash_drives:
         print("Флешка не подключена.")
         return
 
-    print(f"Флешка обнаружена: {flash_drive}")
-    file_list = read_file_list(file_list_path)
+    print(f"Флешка обнаружена: {', '.join(flash_drives)}")
+    with run_report.phase("metadata_load"):
+        file_list = read_file_list(file_list_path)
 
     if not file_list:
         print("Список файлов пуст или не найден.")
         return
 
-    update_files(file_list, flash_drive)
+    update_files(file_list, flash_drives, policy)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,192 @@
+import os
+import json
+import sqlite3
+
+METADATA_DB_FILENAME = "metadata.db"
+
+# Списки записей в базе: metadata.txt и backup_info.txt
+METADATA_LIST = "metadata"
+BACKUP_INFO_LIST = "backup_info"
+METADATA_SEPARATOR = "----------------------------------------"  # Разделитель записей в metadata.txt
+
+# Соответствие полей записи и столбцов таблицы
+FIELDS = {
+    "Name": "name",
+    "From": "from_path",
+    "Modified": "modified",
+    "To": "to_path",
+    "Backup": "backup",
+    "Size": "size",
+    "Hash": "hash",
+}
+
+
+def read_metadata(metadata_path):
+    """Чтение метаданных из файла metadata.txt."""
+    metadata = []
+    with open(metadata_path, "r") as file:
+        entry = {}
+        for line in file:
+            line = line.strip()
+            if line == METADATA_SEPARATOR:
+                if entry:
+                    metadata.append(entry)
+                entry = {}
+            elif ": " in line:  # Ключ-значение
+                key, value = line.split(": ", 1)
+                entry[key] = value
+            else:
+                print(f"Предупреждение: строка пропущена из-за некорректного формата: '{line}'")
+        if entry:  # Добавляем последнюю запись
+            metadata.append(entry)
+    return metadata
+
+
+class MetadataStore:
+    """
+    Хранилище метаданных в одной индексированной базе SQLite.
+
+    Записи возвращаются в виде тех же словарей, что и при чтении metadata.txt
+    (ключи Name, From, Modified, To, Backup, Size, Hash). Дополнительные поля
+    записи сохраняются в столбце extra в формате JSON.
+    Соединение с базой закрывается close() или при выходе из блока with.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " list TEXT NOT NULL,"
+                " position INTEGER NOT NULL,"
+                " name TEXT NOT NULL,"
+                " from_path TEXT,"
+                " modified TEXT,"
+                " to_path TEXT,"
+                " backup TEXT,"
+                " size TEXT,"
+                " hash TEXT,"
+                " extra TEXT)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_entries_from ON entries(list, from_path)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_entries_name ON entries(list, name)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def _to_row(entry):
+        """Разбивает запись на значения столбцов и дополнительные поля."""
+        values = [None if entry.get(key) is None else str(entry.get(key)) for key in FIELDS]
+        extra = {key: value for key, value in entry.items() if key not in FIELDS}
+        return values, (json.dumps(extra, ensure_ascii=False) if extra else None)
+
+    @staticmethod
+    def _to_entry(row):
+        """Собирает запись из строки таблицы (столбцы в порядке FIELDS, затем extra)."""
+        entry = {key: value for key, value in zip(FIELDS, row) if value is not None}
+        if row[len(FIELDS)]:
+            entry.update(json.loads(row[len(FIELDS)]))
+        return entry
+
+    def _select(self, where, params):
+        columns = ", ".join(FIELDS.values())
+        cursor = self.connection.execute(
+            f"SELECT {columns}, extra FROM entries WHERE {where} ORDER BY position", params
+        )
+        return [self._to_entry(row) for row in cursor]
+
+    def count(self, list_name=METADATA_LIST):
+        """Число записей в списке."""
+        return self.connection.execute("SELECT COUNT(*) FROM entries WHERE list = ?", (list_name,)).fetchone()[0]
+
+    def entries(self, list_name=METADATA_LIST):
+        """Все записи списка в исходном порядке."""
+        return self._select("list = ?", (list_name,))
+
+    def find_by_path(self, from_path, list_name=METADATA_LIST):
+        """Поиск записи по исходному пути (по индексу)."""
+        found = self._select("list = ? AND from_path = ?", (list_name, from_path))
+        return found[0] if found else None
+
+    def find_by_name(self, name, list_name=METADATA_LIST):
+        """Поиск записи по имени файла (по индексу)."""
+        found = self._select("list = ? AND name = ?", (list_name, name))
+        return found[0] if found else None
+
+    def add_entries(self, entries, list_name=METADATA_LIST):
+        """Добавляет записи в конец списка одной транзакцией."""
+        columns = ", ".join(FIELDS.values())
+        placeholders = ", ".join("?" for _ in FIELDS)
+        with self.connection:
+            position = self.connection.execute(
+                "SELECT COALESCE(MAX(position), 0) FROM entries WHERE list = ?", (list_name,)
+            ).fetchone()[0]
+            rows = []
+            for entry in entries:
+                position += 1
+                values, extra = self._to_row(entry)
+                rows.append([list_name, position] + values + [extra])
+            self.connection.executemany(
+                f"INSERT INTO entries (list, position, {columns}, extra) VALUES (?, ?, {placeholders}, ?)", rows
+            )
+
+    def add_entry(self, entry, list_name=METADATA_LIST):
+        """Добавляет одну запись в конец списка."""
+        self.add_entries([entry], list_name)
+
+    def remove_entry(self, name, list_name=METADATA_LIST):
+        """Удаляет запись по имени. Возвращает True, если запись была найдена."""
+        with self.connection:
+            cursor = self.connection.execute("DELETE FROM entries WHERE list = ? AND name = ?", (list_name, name))
+        return cursor.rowcount > 0
+
+    def update_entries(self, entries, list_name=METADATA_LIST):
+        """
+        Сохраняет изменённые записи одной транзакцией (например, Backup/Hash/Size после копирования).
+        Запись находится по паре (Name, From).
+        """
+        assignments = ", ".join(f"{column} = ?" for column in FIELDS.values())
+        rows = []
+        for entry in entries:
+            values, extra = self._to_row(entry)
+            rows.append(values + [extra, list_name, entry.get("Name"), entry.get("From")])
+        with self.connection:
+            self.connection.executemany(
+                f"UPDATE entries SET {assignments}, extra = ? WHERE list = ? AND name = ? AND from_path IS ?", rows
+            )
+
+    def import_metadata_txt(self, metadata_path):
+        """Однократный импорт существующего metadata.txt (если список в базе пуст)."""
+        if self.count(METADATA_LIST) or not os.path.exists(metadata_path):
+            return 0
+        entries = read_metadata(metadata_path)
+        self.add_entries(entries, METADATA_LIST)
+        print(f"Импортировано записей из {metadata_path}: {len(entries)}")
+        return len(entries)
+
+    def import_backup_info(self, backup_info_path):
+        """Однократный импорт существующего backup_info.txt (если список в базе пуст)."""
+        if self.count(BACKUP_INFO_LIST) or not os.path.exists(backup_info_path):
+            return 0
+        with open(backup_info_path, "r", encoding="utf-8") as file:
+            raw_entries = file.read().strip().split("\n\n")
+        entries = []
+        for raw_entry in raw_entries:
+            if raw_entry.strip():
+                lines = raw_entry.split("\n")
+                entries.append({line.split(": ", 1)[0]: line.split(": ", 1)[1] for line in lines})
+        self.add_entries(entries, BACKUP_INFO_LIST)
+        print(f"Импортировано записей из {backup_info_path}: {len(entries)}")
+        return len(entries)
@@ -0,0 +1,190 @@
+"""
+Постоянно работающий наблюдатель за подключением флешек.
+
+Вместо запуска нового процесса на каждое подключение устройства (см. handleScheduler.create_USB_backup_task)
+программа работает постоянно: метаданные и кэш хэшей остаются в памяти, а резервирование
+начинается сразу после появления съёмного диска.
+
+В Linux изменения отслеживаются через poll() по /proc/self/mountinfo, в остальных системах —
+периодическим опросом списка разделов.
+
+Запуск: python mount_watcher.py
+"""
+import os
+import sys
+import time
+import select
+import run_report
+from hash_cache import HashCache, HASH_CACHE_FILENAME
+from metadata_store import MetadataStore, METADATA_DB_FILENAME
+from backupFilesToFlashDrive import check_targets, commit_targets, apply_target_choices, fit_selections
+from backup_plan import select_items, plan_choices, POLICY_ALL
+from multi_target import select_targets
+from verify import TIER_QUICK
+
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+SYS_BLOCK_PATH = "/sys/class/block"
+POLL_INTERVAL = 1.0  # Период опроса разделов, если poll() по mountinfo недоступен (секунды)
+SETTLE_TIME = 2.0  # Ожидание после подключения, чтобы флешки, вставленные вместе, попали в один запуск (секунды)
+
+
+def _unescape_mount_path(path):
+    """В mountinfo пробелы и спецсимволы записаны восьмеричными кодами (\\040)."""
+    return path.encode().decode("unicode_escape").encode("latin-1").decode("utf-8", "replace")
+
+
+def read_mounts(mountinfo_path=MOUNTINFO_PATH):
+    """Словарь {точка монтирования: устройство} по /proc/self/mountinfo."""
+    mounts = {}
+    with open(mountinfo_path, "r") as file:
+        for line in file:
+            fields = line.split()
+            if "-" not in fields:
+                continue
+            separator = fields.index("-")
+            mount_point = _unescape_mount_path(fields[4])
+            mounts[mount_point] = fields[separator + 2]
+    return mounts
+
+
+def is_removable_device(device, sys_block_path=SYS_BLOCK_PATH):
+    """Проверяет по /sys/class/block, что устройство (или диск, на котором раздел) съёмное."""
+    name = os.path.basename(device)
+    block_path = os.path.join(sys_block_path, name)
+    if not os.path.exists(block_path):
+        return False
+    real_path = os.path.realpath(block_path)
+    # У раздела файл removable находится у родительского диска
+    for candidate in (real_path, os.path.dirname(real_path)):
+        removable_file = os.path.join(candidate, "removable")
+        if os.path.exists(removable_file):
+            with open(removable_file, "r") as file:
+                return file.read().strip() == "1"
+    return False
+
+
+def _removable_mounts_psutil():
+    """Точки монтирования съёмных дисков через psutil (Windows и другие системы)."""
+    import psutil
+    return {partition.mountpoint for partition in psutil.disk_partitions() if "removable" in partition.opts.lower()}
+
+
+def iter_new_removable_mounts():
+    """
+    Бесконечно выдаёт списки точек монтирования съёмных дисков по мере их подключения.
+    Диски, подключенные в пределах SETTLE_TIME друг от друга, выдаются одним списком.
+    """
+    if os.path.exists(MOUNTINFO_PATH):
+        with open(MOUNTINFO_PATH, "r") as mountinfo:
+            poller = select.poll()
+            # Ядро сообщает об изменении таблицы монтирования событием POLLPRI/POLLERR
+            poller.register(mountinfo, select.POLLPRI | select.POLLERR)
+            known = set(read_mounts())
+            while True:
+                poller.poll()
+                time.sleep(SETTLE_TIME)
+                mounts = read_mounts()
+                new_mounts = [mount_point for mount_point in sorted(set(mounts) - known)
+                              if is_removable_device(mounts[mount_point])]
+                if new_mounts:
+                    yield new_mounts
+                known = set(mounts)
+    else:
+        known = _removable_mounts_psutil()
+        while True:
+            time.sleep(POLL_INTERVAL)
+            mounts = _removable_mounts_psutil()
+            if mounts - known:
+                time.sleep(SETTLE_TIME)
+                mounts = _removable_mounts_psutil()
+                if mounts - known:
+                    yield sorted(mounts - known)
+            known = mounts
+
+
+class BackupWatcher:
+    """Держит метаданные и кэш хэшей в памяти и запускает резервирование при подключении флешки."""
+
+    def __init__(self, base_dir, policy=POLICY_ALL, tier=TIER_QUICK):
+        self.base_dir = base_dir
+        self.policy = policy  # Правило выбора записей плана (см. backup_plan.select_items)
+        self.tier = tier  # Уровень проверки копий (см. verify.py)
+        self.metadata_file = os.path.join(base_dir, "metadata.txt")
+        self.store = MetadataStore(os.path.join(base_dir, METADATA_DB_FILENAME))
+        self.store.import_metadata_txt(self.metadata_file)
+        self.local_cache = HashCache(os.path.join(base_dir, HASH_CACHE_FILENAME))
+        self.metadata = self.store.entries()
+
+    def backup_to(self, flash_drive_path, engine="mount_watcher", plan=None):
+        """
+        Копирование на флешку без вопросов пользователю: записи выбираются из плана по правилу.
+        Если план не передан, он строится по проверке флешки.
+        """
+        self.backup_to_targets([flash_drive_path], engine, plan)
+
+    def backup_to_targets(self, flash_drive_paths, engine="mount_watcher", plan=None):
+        """
+        Копирование сразу на несколько флешек: каждая проверяется отдельно и получает свой план,
+        а файлы, которые нужны нескольким флешкам, читаются один раз (см. apply_target_choices).
+        Сохранённый план применяется ко всем флешкам без проверки.
+        """
+        run_report.start_run(engine)
+        try:
+            if plan is None:
+                # Проверяются только записи, изменившиеся с прошлого копирования на каждую флешку (если журнал ведётся)
+                checked = check_targets(self.metadata, flash_drive_paths, self.base_dir, self.store, self.tier)
+            else:
+                checked = [(flash_drive_path, plan, None, None) for flash_drive_path in flash_drive_paths]
+            selections = [select_items(target_plan, self.policy) for _, target_plan, _, _ in checked]
+            # Копируется только то, что поместится на каждую флешку
+            selections = fit_selections(checked, selections)
+            target_choices = {}
+            failed = set()
+            for (flash_drive_path, _, _, _), items in zip(checked, selections):
+                choices = plan_choices(items, self.metadata)
+                if choices:
+                    target_choices[flash_drive_path] = choices
+            if target_choices:
+                self.metadata = apply_target_choices(self.store, self.metadata, target_choices,
+                                                     self.local_cache, failed)
+            else:
+                print("Нет файлов для копирования.")
+            commit_targets(self.base_dir, checked, selections, failed)
+        finally:
+            run_report.finish_run(self.base_dir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Закрывает базу метаданных."""
+        self.store.close()
+
+    def run(self):
+        print("Ожидание подключения флешки...")
+        for mount_points in iter_new_removable_mounts():
+            print(f"Флешка подключена: {', '.join(mount_points)}")
+            targets = select_targets(mount_points)
+            try:
+                self.backup_to_targets(targets)
+            except Exception as e:
+                # Флешку могли извлечь во время копирования, а её файлы — оказаться повреждёнными:
+                # ошибка одного подключения не должна останавливать наблюдение
+                print(f"Ошибка при резервировании на {', '.join(targets)}: {type(e).__name__}: {e}")
+
+
+def main():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    try:
+        with BackupWatcher(base_dir) as watcher:
+            watcher.run()
+    except KeyboardInterrupt:
+        print("Наблюдение остановлено.")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
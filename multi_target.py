@@ -0,0 +1,88 @@
+"""
+Сведения о копиях на нескольких флешках.
+
+Общие поля записи (Name, From, To, Tags...) одинаковы для всех флешек, а поля копии — хэш, размер, сжатие,
+время копирования и проверки — у каждой флешки свои: флешки подключаются поочерёдно и содержат разные версии.
+Поля копии каждой флешки хранятся в записи в поле Targets по идентификатору флешки (change_recorder.stick_id).
+Поля верхнего уровня описывают последнюю сделанную копию, как и раньше при одной флешке.
+
+Проверка и копирование работают с «видом» записей для одной флешки (target_entries),
+после чего изменения переносятся обратно в записи (store_target_entries).
+"""
+import os
+from change_recorder import STICK_ID_FILENAME
+
+TARGETS_FIELD = "Targets"
+# Поля, описывающие копию на конкретной флешке
+TARGET_FIELDS = ("Backup", "Hash", "Size", "Codec", "Ratio", "QuickPrint", "Verified", "VerifiedTier", "FullVerified")
+
+
+def is_registered(flash_drive_path):
+    """Флешка уже использовалась для резервирования (в её корне есть идентификатор)."""
+    return os.path.isfile(os.path.join(flash_drive_path, STICK_ID_FILENAME))
+
+
+def select_targets(flash_drive_paths):
+    """
+    Флешки для резервирования из подключенных: все зарегистрированные.
+    Если зарегистрированных нет, используется первая — она регистрируется при первом копировании.
+    """
+    registered = [path for path in flash_drive_paths if is_registered(path)]
+    return registered or list(flash_drive_paths[:1])
+
+
+def target_entries(metadata, target_id):
+    """
+    Записи в том виде, в котором их видит одна флешка: общие поля и поля копии на этой флешке.
+    Для флешки без собственных сведений берутся поля верхнего уровня (так записи велись для одной флешки).
+    """
+    entries = []
+    for entry in metadata:
+        view = {key: value for key, value in entry.items() if key not in TARGET_FIELDS and key != TARGETS_FIELD}
+        state = (entry.get(TARGETS_FIELD) or {}).get(target_id)
+        if state is None:
+            state = {key: entry[key] for key in TARGET_FIELDS if key in entry}
+        view.update(state)
+        entries.append(view)
+    return entries
+
+
+def store_target_entries(metadata, targets):
+    """
+    Переносит поля копий из видов флешек (target_entries) в записи.
+    targets — список (идентификатор флешки, записи этой флешки). Сведения о флешке сохраняются,
+    только если проверка или копирование их изменили. Если копия только что обновлена,
+    поля верхнего уровня тоже описывают её.
+
+    :return: Изменившиеся записи (для MetadataStore.update_entries).
+    """
+    changed = []
+    for position, entry in enumerate(metadata):
+        stored = dict(entry.get(TARGETS_FIELD) or {})
+        # Так поля копии выглядели для флешки без собственных сведений до проверки и копирования
+        fallback = {key: entry[key] for key in TARGET_FIELDS if key in entry}
+        latest = None
+        modified = False
+        for target_id, entries in targets:
+            view = entries[position]
+            initial = stored.get(target_id, fallback)
+            state = {key: view[key] for key in TARGET_FIELDS if key in view}
+            shared = {key: value for key, value in view.items() if key not in TARGET_FIELDS}
+            if state == initial and all(entry.get(key) == value for key, value in shared.items()):
+                continue
+            entry.update(shared)
+            stored[target_id] = state
+            modified = True
+            if state.get("Backup") != initial.get("Backup"):
+                latest = state
+        if not modified:
+            continue
+        if latest is not None:
+            for key in TARGET_FIELDS:
+                if key in latest:
+                    entry[key] = latest[key]
+                else:
+                    entry.pop(key, None)
+        entry[TARGETS_FIELD] = stored
+        changed.append(entry)
+    return changed
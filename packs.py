@@ -0,0 +1,270 @@
+"""
+Хранение мелких файлов в пакетах.
+
+На FAT32/exFAT каждый отдельный файл — это запись каталога и обновления FAT; для тысяч мелких файлов
+они обходятся дороже самих данных. Файлы меньше PACK_THRESHOLD дописываются подряд в большие файлы-пакеты
+в папке .packs на флешке, а индекс хранит для каждого файла пакет, смещение, длину, хэш и время изменения
+источника. Запись пакета — последовательная, файл извлекается чтением одного участка.
+
+Файл в пакете называется по пути, который его копия имела бы на флешке (относительно корня флешки).
+Поле To записи метаданных ссылается на файл в пакете как "pack:путь".
+
+Новая версия файла дописывается в конец пакета, прежняя становится мусором. Когда мусора в пакете
+становится больше REPACK_RATIO, живые файлы переносятся в текущий пакет, а старый удаляется.
+Данные сбрасываются на диск до записи индекса, а индекс заменяется атомарно: прерванная запись
+оставляет в пакете лишь неиспользуемый хвост.
+"""
+import os
+import json
+import threading
+from file_copy import iter_file_blocks, fsync_directory
+from dir_walker import walk_tree, is_stale
+from hashers import new_hasher, format_digest, parse_digest, DEFAULT_ALGORITHM
+
+PACK_DIR = ".packs"  # Папка пакетов в корне флешки
+PACK_INDEX_FILENAME = "index.json"
+PACK_PREFIX = "pack:"  # Поле To, указывающее на файл в пакете
+PACK_THRESHOLD = 256 * 1024  # Файлы меньше этого размера хранятся в пакетах
+PACK_MAX_SIZE = 256 * 1024 * 1024  # Размер, после которого начинается новый пакет (FAT32 — до 4 ГБ на файл)
+REPACK_RATIO = 0.5  # Доля мусора в пакете, после которой он пересобирается
+
+# Поля записи индекса: [пакет, смещение, длина, хэш с префиксом алгоритма, время изменения источника в нс]
+_PACK, _OFFSET, _LENGTH, _HASH, _MTIME_NS = range(5)
+
+
+def is_pack_reference(to_path):
+    """Поле To указывает на файл в пакете."""
+    return bool(to_path) and to_path.startswith(PACK_PREFIX)
+
+
+def pack_reference(member):
+    return PACK_PREFIX + member
+
+
+def pack_member(to_path):
+    """Имя файла в пакете по полю To."""
+    return to_path[len(PACK_PREFIX):]
+
+
+def member_name(flash_drive_path, target_path):
+    """Имя файла в пакете по пути, который имела бы его копия на флешке."""
+    return os.path.relpath(target_path, flash_drive_path).replace(os.sep, "/")
+
+
+def should_pack(size):
+    return size < PACK_THRESHOLD
+
+
+def iter_stale_packed(source_root, target_root, flash_drive_path, store):
+    """
+    Как dir_walker.iter_stale_files, но мелкие файлы сверяются с индексом пакетов store:
+    для них выдаётся путь, который имела бы их копия, и stat копии None.
+    """
+    for source_path, target_path, source_stat, target_stat in walk_tree(source_root, target_root):
+        if should_pack(source_stat.st_size):
+            if store.is_stale(member_name(flash_drive_path, target_path), source_stat):
+                yield source_path, target_path, source_stat, None
+        elif is_stale(source_stat, target_stat):
+            yield source_path, target_path, source_stat, target_stat
+
+
+class PackStore:
+    """Пакеты и индекс на одной флешке. Запись в пакеты — под блокировкой, по одному файлу."""
+
+    def __init__(self, flash_drive_path):
+        self.pack_dir = os.path.join(flash_drive_path, PACK_DIR)
+        self.index_path = os.path.join(self.pack_dir, PACK_INDEX_FILENAME)
+        self.index = {}
+        self._lock = threading.Lock()
+        self._current = None  # Открытый на дозапись пакет: (имя, файл)
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                self.index = json.load(file)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            print(f"Индекс пакетов повреждён, файлы из пакетов будут скопированы заново: {e}")
+
+    def _pack_path(self, pack_name):
+        return os.path.join(self.pack_dir, pack_name)
+
+    def _pack_names(self):
+        try:
+            return sorted(name for name in os.listdir(self.pack_dir) if name.endswith(".pack"))
+        except FileNotFoundError:
+            return []
+
+    def _open_current(self):
+        """Пакет для дозаписи: последний, если он ещё не заполнен, иначе новый."""
+        if self._current is not None:
+            name, file = self._current
+            if file.tell() < PACK_MAX_SIZE:
+                return self._current
+            self._close_current()
+        names = self._pack_names()
+        if names and os.path.getsize(self._pack_path(names[-1])) < PACK_MAX_SIZE:
+            name = names[-1]
+        else:
+            number = int(names[-1][5:-5]) + 1 if names else 1
+            name = f"pack-{number:06d}.pack"
+        os.makedirs(self.pack_dir, exist_ok=True)
+        file = open(self._pack_path(name), "ab")
+        file.seek(0, os.SEEK_END)
+        self._current = (name, file)
+        return self._current
+
+    def _close_current(self):
+        if self._current is not None:
+            _, file = self._current
+            file.flush()
+            os.fsync(file.fileno())
+            file.close()
+            self._current = None
+
+    def record(self, member):
+        return self.index.get(member)
+
+    def member_hash(self, member):
+        """Хэш файла в пакете с префиксом алгоритма (None, если файла нет)."""
+        record = self.index.get(member)
+        return record[_HASH] if record else None
+
+    def __contains__(self, member):
+        return member in self.index
+
+    def is_stale(self, member, source_stat):
+        """Нужно ли копировать файл: его нет в пакетах или источник изменён позже копии."""
+        record = self.index.get(member)
+        return (record is None or record[_LENGTH] != source_stat.st_size
+                or source_stat.st_mtime_ns > record[_MTIME_NS])
+
+    def add(self, member, source_file, algorithm=DEFAULT_ALGORITHM, blocks=None):
+        """
+        Дописывает файл в текущий пакет (прежняя версия становится мусором).
+
+        :return: Кортеж (хэш без префикса, длина).
+        """
+        source_stat = os.stat(source_file)
+        hasher = new_hasher(algorithm or DEFAULT_ALGORITHM)
+        if blocks is None:
+            blocks = iter_file_blocks(source_file)
+        data = bytearray()
+        for block in blocks:
+            hasher.update(block)
+            data += block
+        with self._lock:
+            name, file = self._open_current()
+            offset = file.tell()
+            file.write(data)
+            self.index[member] = [name, offset, len(data), format_digest(algorithm or DEFAULT_ALGORITHM,
+                                                                         hasher.hexdigest()), source_stat.st_mtime_ns]
+        return hasher.hexdigest(), len(data)
+
+    def discard(self, member):
+        """Убирает файл из индекса (его данные станут мусором)."""
+        with self._lock:
+            return self.index.pop(member, None) is not None
+
+    def read(self, member):
+        """Содержимое файла из пакета (чтение одного участка)."""
+        record = self.index[member]
+        with open(self._pack_path(record[_PACK]), "rb") as file:
+            file.seek(record[_OFFSET])
+            data = file.read(record[_LENGTH])
+        if len(data) != record[_LENGTH]:
+            raise OSError(f"Пакет {record[_PACK]} обрезан: нет данных файла {member}")
+        return data
+
+    def verify(self, member, stored_hash=None):
+        """Совпадает ли содержимое файла в пакете с хэшем из индекса (и с сохранённым в метаданных, если передан)."""
+        record = self.index.get(member)
+        if record is None:
+            return False
+        algorithm, expected = parse_digest(stored_hash or record[_HASH])
+        if algorithm is None or parse_digest(record[_HASH]) != (algorithm, expected):
+            return False
+        try:
+            hasher = new_hasher(algorithm)
+            hasher.update(self.read(member))
+        except (OSError, ValueError):
+            return False
+        return hasher.hexdigest() == expected
+
+    def extract(self, member, target_path, stored_hash=None):
+        """
+        Извлекает файл из пакета (через временный файл с атомарной заменой).
+        Содержимое сверяется с хэшем из индекса (и с сохранённым в метаданных, если передан) до записи.
+
+        :return: Кортеж (хэш с префиксом алгоритма, длина).
+        """
+        data = self.read(member)
+        record = self.index[member]
+        algorithm, expected = parse_digest(stored_hash or record[_HASH])
+        hasher = new_hasher(algorithm)
+        hasher.update(data)
+        if parse_digest(record[_HASH]) != (algorithm, expected) or hasher.hexdigest() != expected:
+            raise ValueError(f"Файл {member} в пакете {record[_PACK]} повреждён: хэш не совпадает")
+        os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+        temp_path = target_path + ".part"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        mtime = self.index[member][_MTIME_NS]
+        os.utime(temp_path, ns=(mtime, mtime))
+        os.replace(temp_path, target_path)
+        return record[_HASH], len(data)
+
+    def save(self):
+        """Сбрасывает пакеты на диск и атомарно записывает индекс."""
+        with self._lock:
+            self._close_current()
+            if not self.index and not os.path.isdir(self.pack_dir):
+                return
+            os.makedirs(self.pack_dir, exist_ok=True)
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self.index, file, ensure_ascii=False, separators=(",", ":"))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.index_path)
+            fsync_directory(self.pack_dir)
+
+    def garbage(self):
+        """Доля мусора в каждом пакете: {пакет: (байт всего, байт живых файлов)}."""
+        live = {}
+        for record in self.index.values():
+            live[record[_PACK]] = live.get(record[_PACK], 0) + record[_LENGTH]
+        return {name: (os.path.getsize(self._pack_path(name)), live.get(name, 0)) for name in self._pack_names()}
+
+    def repack(self, ratio=REPACK_RATIO):
+        """
+        Пересобирает пакеты, в которых мусора больше ratio: живые файлы дописываются в текущий пакет,
+        индекс сохраняется, и только потом старые пакеты удаляются.
+
+        :return: Число удалённых пакетов.
+        """
+        self.save()
+        stale = [name for name, (total, live) in self.garbage().items() if total and (total - live) / total > ratio]
+        if not stale:
+            return 0
+        stale_set = set(stale)
+        # Текущий пакет не должен оказаться среди пересобираемых
+        with self._lock:
+            names = self._pack_names()
+            number = int(names[-1][5:-5]) + 1 if names else 1
+            name = f"pack-{number:06d}.pack"
+            self._current = (name, open(self._pack_path(name), "ab"))
+        for member, record in list(self.index.items()):
+            if record[_PACK] in stale_set:
+                data = self.read(member)
+                with self._lock:
+                    name, file = self._open_current()
+                    offset = file.tell()
+                    file.write(data)
+                    self.index[member] = [name, offset, record[_LENGTH], record[_HASH], record[_MTIME_NS]]
+        self.save()
+        for name in stale:
+            os.remove(self._pack_path(name))
+        print(f"Пересобрано пакетов: {len(stale)}.")
+        return len(stale)
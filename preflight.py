@@ -0,0 +1,138 @@
+"""
+Проверка свободного места на флешке перед копированием.
+
+Объём копирования сравнивается со свободным местом (shutil.disk_usage) до начала записи: заменяемые копии
+освобождают своё место, размеры округляются до кластера файловой системы. Если всё не помещается,
+выбирается самый ценный набор записей, который поместится (задача о рюкзаке): ценность записи — её приоритет
+(поле Priority, тег critical), умноженный на вес свежести — недавно изменённые файлы важнее. Размер учитывается
+самой задачей: из двух записей одинаковой ценности выбирается меньшая. Остальные записи откладываются
+до следующего подключения вместо ошибки записи посреди запуска.
+"""
+import os
+import math
+import time
+import shutil
+from backup_plan import DEFAULT_PRIORITY
+from dir_walker import stat_or_none
+
+SPACE_RESERVE = 1024 * 1024  # Оставлять свободным на флешке (служебные файлы, кэш хэшей, метаданные)
+DEFAULT_CLUSTER_SIZE = 4096  # Размер кластера, если его нельзя узнать (os.statvfs недоступен)
+KNAPSACK_STEPS = 1000  # Точность выбора: свободное место делится на столько частей
+RECENCY_HALF_LIFE_DAYS = 30  # Через столько дней после изменения вес свежести файла уменьшается вдвое
+
+
+def cluster_size(flash_drive_path):
+    """Размер кластера файловой системы флешки."""
+    try:
+        return os.statvfs(flash_drive_path).f_frsize or DEFAULT_CLUSTER_SIZE
+    except (AttributeError, OSError):
+        return DEFAULT_CLUSTER_SIZE
+
+
+def allocated(size, cluster):
+    """Место, которое файл занимает на диске (целое число кластеров)."""
+    return math.ceil(size / cluster) * cluster
+
+
+def free_space(flash_drive_path):
+    """Свободное место на флешке, доступное для копирования."""
+    return max(0, shutil.disk_usage(flash_drive_path).free - SPACE_RESERVE)
+
+
+def recency_weight(modified, now=None):
+    """Вес свежести: 1 для только что изменённого файла, вдвое меньше через каждые RECENCY_HALF_LIFE_DAYS дней."""
+    if modified is None:
+        return 1.0
+    age_days = max(0.0, ((now or time.time()) - modified) / 86400)
+    return 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+
+
+def space_needed(candidate, cluster):
+    """Сколько свободного места займёт копирование (отрицательное — место освободится)."""
+    return allocated(candidate["bytes"], cluster) - allocated(candidate.get("replaced", 0), cluster)
+
+
+def select_fitting(candidates, capacity, cluster=DEFAULT_CLUSTER_SIZE, now=None):
+    """
+    Самый ценный набор кандидатов, который помещается в capacity байт.
+
+    Кандидат — словарь с ключами bytes, replaced, priority и modified (как элементы плана backup_plan).
+    Записи, после копирования которых места становится больше, выбираются всегда и добавляют место остальным.
+    Размеры округляются вверх до шага capacity / KNAPSACK_STEPS, поэтому выбранный набор гарантированно помещается.
+    """
+    needed = [space_needed(candidate, cluster) for candidate in candidates]
+    chosen = {position for position, size in enumerate(needed) if size <= 0}
+    capacity -= sum(needed[position] for position in chosen)
+    rest = [position for position in range(len(candidates)) if position not in chosen]
+    if sum(needed[position] for position in rest) <= capacity:
+        return list(candidates)
+    if capacity <= 0:
+        return [candidates[position] for position in sorted(chosen)]
+
+    step = max(1, math.ceil(capacity / KNAPSACK_STEPS))
+    slots = capacity // step
+    best = [0.0] * (slots + 1)  # Лучшая ценность при занятых slots шагах
+    taken = []  # Для каждого кандидата: при каком числе шагов он входит в лучший набор
+    for position in rest:
+        weight = math.ceil(needed[position] / step)
+        value = (candidates[position].get("priority") or DEFAULT_PRIORITY) * recency_weight(
+            candidates[position].get("modified"), now)
+        row = bytearray(slots + 1)
+        for used in range(slots, weight - 1, -1):
+            if best[used - weight] + value > best[used]:
+                best[used] = best[used - weight] + value
+                row[used] = 1
+        taken.append(row)
+
+    used = slots
+    for position, row in zip(reversed(rest), reversed(taken)):
+        if row[used]:
+            chosen.add(position)
+            used -= math.ceil(needed[position] / step)
+    return [candidates[position] for position in sorted(chosen)]
+
+
+def fit_plan_items(items, flash_drive_path):
+    """
+    Записи плана, которые поместятся на флешку. Об отложенных записях сообщается.
+    Выбранный набор может не покрывать план — тогда позиция журнала изменений не сдвигается.
+    """
+    if not items:
+        return items
+    try:
+        capacity = free_space(flash_drive_path)
+    except OSError as e:
+        print(f"Не удалось узнать свободное место на {flash_drive_path}: {e}")
+        return items
+    cluster = cluster_size(flash_drive_path)
+    # Заменяемая копия удаляется только после записи новой (атомарная замена, см. file_copy.copy_file_with_hash),
+    # поэтому место под самую большую заменяемую копию резервируется на время её обновления
+    capacity = max(0, capacity - max(allocated(item.get("replaced", 0), cluster) for item in items))
+    fitting = select_fitting(items, capacity, cluster)
+    if len(fitting) < len(items):
+        kept = {id(item) for item in fitting}
+        skipped = [item for item in items if id(item) not in kept]
+        print(f"Не хватает места на {flash_drive_path} (свободно {capacity} байт): "
+              f"отложено записей {len(skipped)} ({sum(item['bytes'] for item in skipped)} байт).")
+        for item in skipped:
+            print(f"- {item['name']}")
+    return fitting
+
+
+def fit_files(pairs, flash_drive_path):
+    """
+    Пары (источник, путь на флешке), которые поместятся на флешку; для движков без плана.
+    Все файлы равноценны, свежие изменения важнее.
+    """
+    candidates = []
+    for source, target in pairs:
+        source_stat = stat_or_none(source)  # Об отсутствующем источнике сообщит копирование
+        target_stat = stat_or_none(target)
+        candidates.append({
+            "name": source,
+            "bytes": source_stat.st_size if source_stat else 0,
+            "replaced": target_stat.st_size if target_stat else 0,
+            "modified": source_stat.st_mtime if source_stat else None,
+            "pair": (source, target),
+        })
+    return [candidate["pair"] for candidate in fit_plan_items(candidates, flash_drive_path)]
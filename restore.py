@@ -0,0 +1,293 @@
+"""
+Восстановление файлов с флешки на место источников.
+
+Записи для восстановления берутся из метаданных (поля From, To, Hash, Codec; копии на этой флешке — см. multi_target)
+или из снимка (snapshot.py). Каждая запись восстановления — словарь:
+    name    — имя записи (для сообщений и выбора);
+    source  — копия на флешке (для файла в пакете — None);
+    member  — имя файла в пакете (packs.py) или None;
+    target  — куда восстановить;
+    codec   — кодек сжатой копии или None;
+    hash    — ожидаемый хэш содержимого с префиксом алгоритма или None;
+    backup  — время создания копии (поле Backup записи или время снимка) или None.
+
+Локальные файлы, хэш которых уже совпадает с ожидаемым, не перезаписываются (хэши считаются параллельно
+по устройствам). Остальные копии читаются с флешки и записываются на локальные диски через CopyScheduler:
+чтение следующих файлов идёт одновременно с записью предыдущих. Хэш содержимого считается на лету,
+и файл заменяется только после совпадения хэша — повреждённая копия не затирает локальный файл.
+Копии без известного хэша восстанавливаются без проверки, о них сообщается отдельно.
+
+Локальный файл, изменённый позже создания копии, не перезаписывается старой копией без force:
+такие файлы перечисляются, чтобы правки после последнего резервирования не потерялись молча.
+"""
+import os
+import time
+import shutil
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import run_report
+from copy_scheduler import CopyScheduler, DEFAULT_READ_WORKERS
+from file_copy import finish_part, PART_SUFFIX, CHECKPOINT_SUFFIX
+from compression import stored_path, decompress_blocks
+from hash_engine import hash_files
+from hashers import new_hasher, parse_digest, format_digest, is_available
+from dir_walker import iter_files
+from drive_manifest import DriveManifest, manifest_key
+from multi_target import target_entries
+from change_recorder import stick_id
+from packs import PackStore, is_pack_reference, pack_member
+from snapshot import object_path, load_manifest, list_snapshots
+
+RESTORE_WRITERS_PER_DEVICE = 2  # Одновременных записей на локальный диск (для SSD можно больше)
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # Формат полей Backup и created
+
+
+def _restore_target(entry_name, source, target_root, relative=None):
+    """Куда восстановить файл: на место источника или в папку target_root под именем записи."""
+    if target_root:
+        target = os.path.join(target_root, entry_name)
+    else:
+        target = source
+    return os.path.join(target, relative) if relative else target
+
+
+def metadata_items(metadata, flash_drive_path, names=None, target_root=None):
+    """
+    Записи восстановления по метаданным: файлы, сжатые копии, файлы в пакетах и все файлы записей-папок.
+    names — имена записей для восстановления (None — все).
+    """
+    items = []
+    packs = PackStore(flash_drive_path)
+    manifest = DriveManifest(flash_drive_path)
+    try:
+        for entry in target_entries(metadata, stick_id(flash_drive_path, create=False)):
+            if entry["Name"] == "metadata.txt" or (names and entry["Name"] not in names):
+                continue
+            if not entry.get("From") and not target_root:
+                print(f"Запись {entry['Name']} без пути источника пропущена: укажите папку восстановления.")
+                continue
+            if is_pack_reference(entry.get("To")):
+                items.append({"name": entry["Name"], "source": None, "member": pack_member(entry["To"]),
+                              "target": _restore_target(entry["Name"], entry.get("From"), target_root),
+                              "codec": None, "hash": entry.get("Hash"), "backup": entry.get("Backup")})
+                continue
+            relative_path = entry["To"] if entry.get("To") not in (None, "null") else entry["Name"]
+            flash_path = os.path.join(flash_drive_path, relative_path)
+            copy_path = stored_path(flash_path, entry.get("Codec"))
+            prefix = relative_path.replace(os.sep, "/").strip("/") + "/"
+            members = [member for member in packs.index if member.startswith(prefix)]
+            if os.path.isfile(copy_path):
+                items.append({"name": entry["Name"], "source": copy_path, "member": None,
+                              "target": _restore_target(entry["Name"], entry.get("From"), target_root),
+                              "codec": entry.get("Codec"), "hash": entry.get("Hash"),
+                              "backup": entry.get("Backup")})
+            elif os.path.isdir(flash_path) or members:
+                items.extend(_directory_items(entry, flash_path, flash_drive_path, members, packs, manifest,
+                                              target_root))
+            else:
+                print(f"Копии {entry['Name']} на флешке нет.")
+    finally:
+        manifest.close()
+    return items
+
+
+def _directory_items(entry, flash_dir, flash_drive_path, members, packs, manifest, target_root):
+    """Файлы записи-папки: отдельные копии (хэш — из манифеста флешки) и файлы в пакетах (хэш — из индекса)."""
+    items = []
+    for path, copy_stat in iter_files(flash_dir) if os.path.isdir(flash_dir) else []:
+        if path.endswith(PART_SUFFIX) or path.endswith(PART_SUFFIX + CHECKPOINT_SUFFIX):
+            continue  # Незаконченное копирование
+        relative = os.path.relpath(path, flash_dir)
+        items.append({"name": os.path.join(entry["Name"], relative), "source": path, "member": None,
+                      "target": _restore_target(entry["Name"], entry.get("From"), target_root, relative),
+                      "codec": None, "hash": manifest.known_hash(manifest_key(flash_drive_path, path), copy_stat),
+                      "backup": entry.get("Backup")})
+    for member in members:
+        relative = os.path.relpath(os.path.join(flash_drive_path, *member.split("/")), flash_dir)
+        items.append({"name": os.path.join(entry["Name"], relative), "source": None, "member": member,
+                      "target": _restore_target(entry["Name"], entry.get("From"), target_root, relative),
+                      "codec": None, "hash": packs.member_hash(member), "backup": entry.get("Backup")})
+    return items
+
+
+def snapshot_items(flash_drive_path, snapshot_path=None, names=None, target_root=None):
+    """
+    Записи восстановления по снимку (по умолчанию — последнему).
+    names — имена записей метаданных или файлов снимка (None — весь снимок).
+    """
+    if snapshot_path is None:
+        snapshots = list_snapshots(flash_drive_path)
+        if not snapshots:
+            print("На флешке нет снимков.")
+            return []
+        snapshot_path = snapshots[-1][1]
+    snapshot = load_manifest(snapshot_path)
+    items = []
+    for name, record in snapshot["files"].items():
+        if names and name not in names and name.split(os.sep)[0] not in names:
+            continue
+        items.append({"name": name, "source": object_path(flash_drive_path, record["Hash"]), "member": None,
+                      "target": os.path.join(target_root, name) if target_root else record["From"],
+                      "codec": None, "hash": format_digest(snapshot["algorithm"], record["Hash"]),
+                      "backup": snapshot.get("created")})
+    print(f"Снимок {os.path.basename(snapshot_path)}: файлов {len(items)}.")
+    return items
+
+
+def skip_up_to_date(items, cache=None):
+    """Записи, которые нужно восстановить: локальные файлы с совпадающим хэшем пропускаются."""
+    existing = {}
+    for position, item in enumerate(items):
+        algorithm, _ = parse_digest(item["hash"])
+        if is_available(algorithm) and os.path.isfile(item["target"]):
+            existing.setdefault(algorithm, []).append(position)
+    up_to_date = set()
+    for algorithm, positions in existing.items():
+        local_hashes = hash_files([items[position]["target"] for position in positions], algorithm, cache)
+        up_to_date.update(position for position, local_hash in zip(positions, local_hashes)
+                          if local_hash is not None and local_hash == parse_digest(items[position]["hash"])[1])
+    if up_to_date:
+        print(f"Локальные файлы совпадают с копиями и не восстанавливаются: {len(up_to_date)}.")
+        run_report.count("files_skipped", len(up_to_date))
+    return [item for position, item in enumerate(items) if position not in up_to_date]
+
+
+def _backup_time(item):
+    """Время создания копии: из записи, иначе время изменения копии на флешке (None, если неизвестно)."""
+    try:
+        return datetime.strptime(item.get("backup") or "", TIME_FORMAT).timestamp()
+    except ValueError:
+        pass
+    try:
+        return os.path.getmtime(item["source"]) if item["source"] else None
+    except OSError:
+        return None
+
+
+def skip_newer_local(items, force=False):
+    """
+    Записи без локальных файлов, изменённых после создания копии. Такие файлы перечисляются;
+    при force=True они тоже восстанавливаются (правки после резервирования теряются).
+    """
+    newer = []
+    for item in items:
+        backup_time = _backup_time(item)
+        try:
+            if backup_time is not None and os.path.getmtime(item["target"]) > backup_time:
+                newer.append(item)
+        except OSError:
+            continue  # Локального файла нет
+    if not newer:
+        return items
+    if force:
+        print(f"Локальные файлы новее копий будут перезаписаны (--force): {len(newer)}.")
+        return items
+    print(f"Локальные файлы изменены после создания копии и не восстанавливаются (перезаписать: --force): "
+          f"{len(newer)}.")
+    for item in newer:
+        print(f"- {item['target']}")
+    run_report.count("files_skipped", len(newer))
+    skipped = {id(item) for item in newer}
+    return [item for item in items if id(item) not in skipped]
+
+
+def restore_copy(source_file, target_file, blocks, codec=None, expected_hash=None):
+    """
+    Записывает копию с флешки (распаковывая сжатую) во временный файл, считая хэш содержимого за тот же проход.
+    Файл заменяется, только если хэш совпал с ожидаемым; иначе временный файл удаляется.
+
+    :return: Кортеж (хэш с префиксом алгоритма или None, размер).
+    """
+    algorithm, expected = parse_digest(expected_hash)
+    hasher = new_hasher(algorithm) if is_available(algorithm) else None
+    if codec:
+        blocks = decompress_blocks(blocks, codec)
+    start = time.perf_counter()
+    written = 0
+    part_path = target_file + PART_SUFFIX
+    try:
+        with open(part_path, "wb") as dst:
+            for block in blocks:
+                if hasher:
+                    hasher.update(block)
+                dst.write(block)
+                written += len(block)
+            dst.flush()
+            os.fsync(dst.fileno())
+        if hasher and hasher.hexdigest() != expected:
+            raise ValueError(f"Копия {source_file} повреждена: хэш не совпадает")
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+    shutil.copystat(source_file, part_path)
+    finish_part(part_path, target_file)
+    if run_report.enabled():
+        run_report.record_file(source_file, "copy", time.perf_counter() - start, written, written,
+                               run_report.device_label(source_file), run_report.device_label(target_file))
+    return (format_digest(algorithm, hasher.hexdigest()) if hasher else None), written
+
+
+def restore_items(items, flash_drive_path, cache=None, force=False, read_workers=DEFAULT_READ_WORKERS,
+                  writers_per_device=RESTORE_WRITERS_PER_DEVICE):
+    """
+    Восстанавливает записи: совпадающие локальные файлы пропускаются, остальные копируются с проверкой хэша.
+    Локальные файлы, изменённые после создания копии, перезаписываются только при force=True.
+    Файлы из пакетов читаются в порядке их расположения в пакетах.
+
+    :return: Кортеж (восстановлено, с ошибками).
+    """
+    with run_report.phase("hash"):
+        items = skip_up_to_date(items, cache)
+    items = skip_newer_local(items, force)
+    restored = 0
+    failed = 0
+    unverified = []
+
+    def report(item, error):
+        nonlocal restored, failed
+        if error:
+            print(f"Ошибка при восстановлении {item['name']}: {error}")
+            run_report.count("files_failed")
+            failed += 1
+        elif not is_available(parse_digest(item["hash"])[0]):
+            print(f"Файл {item['name']} восстановлен без проверки: хэш копии неизвестен.")
+            run_report.count("files_copied")
+            run_report.count("files_unverified")
+            unverified.append(item)
+            restored += 1
+        else:
+            print(f"Файл {item['name']} восстановлен.")
+            run_report.count("files_copied")
+            restored += 1
+
+    with run_report.phase("copy"):
+        packed = [item for item in items if item["member"] is not None]
+        if packed:
+            packs = PackStore(flash_drive_path)
+            known = [item for item in packed if item["member"] in packs]
+            for item in packed:
+                if item["member"] not in packs:
+                    report(item, "файла нет в пакетах")
+            known.sort(key=lambda item: packs.record(item["member"])[:2])
+            with ThreadPoolExecutor(max_workers=read_workers) as pool:
+                futures = [(item, pool.submit(packs.extract, item["member"], item["target"], item["hash"]))
+                           for item in known]
+                for item, future in futures:
+                    try:
+                        future.result()
+                        report(item, None)
+                    except (OSError, ValueError) as e:
+                        report(item, e)
+
+        copies = {item["target"]: item for item in items if item["member"] is None}
+        scheduler = CopyScheduler(
+            lambda source, target, blocks: restore_copy(source, target, blocks, copies[target]["codec"],
+                                                        copies[target]["hash"]),
+            read_workers, writers_per_device)
+        for item, _, error in scheduler.run((item, item["source"], target) for target, item in copies.items()):
+            report(item, error)
+    print(f"Восстановлено файлов: {restored} (без проверки хэша: {len(unverified)}), с ошибками: {failed}.")
+    return restored, failed
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import threading
+import contextlib
+from datetime import datetime
+
+REPORTS_DIR = "reports"  # Папка отчётов рядом с файлом метаданных
+SLOWEST_FILES = 20  # Сколько самых медленных файлов каждого этапа попадает в отчёт
+
+_current = None  # Отчёт текущего запуска (None — замеры выключены)
+
+
+def device_label(path):
+    """Обозначение устройства для отчёта: буква диска в Windows или номер устройства."""
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if drive:
+        return drive.upper()
+    try:
+        return f"dev{os.stat(path).st_dev}"
+    except OSError:
+        return "unknown"
+
+
+class RunReport:
+    """
+    Замеры одного запуска резервирования: время этапов, счётчики,
+    объём чтения и записи по устройствам и самые медленные файлы.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.started = datetime.now()
+        self.phases = {}
+        self.counters = {}
+        self.devices = {}
+        self.slow_files = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_file(self, path, phase, seconds, bytes_read=0, bytes_written=0, read_device=None, write_device=None):
+        """Учёт работы с одним файлом: байты по устройствам и список самых медленных файлов этапа."""
+        with self.lock:
+            busy_devices = set()
+            for device, key, amount in ((read_device, "bytes_read", bytes_read),
+                                        (write_device, "bytes_written", bytes_written)):
+                if device and amount:
+                    stats = self.devices.setdefault(device, {"bytes_read": 0, "bytes_written": 0, "seconds": 0.0})
+                    stats[key] += amount
+                    busy_devices.add(device)
+            # Время учитывается один раз на устройство, даже если чтение и запись шли на одном диске
+            for device in busy_devices:
+                self.devices[device]["seconds"] += seconds
+            self.counters["bytes_read"] = self.counters.get("bytes_read", 0) + bytes_read
+            self.counters["bytes_written"] = self.counters.get("bytes_written", 0) + bytes_written
+
+            slowest = self.slow_files.setdefault(phase, [])
+            slowest.append({"path": path, "seconds": round(seconds, 6), "bytes": max(bytes_read, bytes_written)})
+            if len(slowest) > SLOWEST_FILES:
+                slowest.sort(key=lambda item: item["seconds"], reverse=True)
+                del slowest[SLOWEST_FILES:]
+
+    def to_dict(self):
+        with self.lock:
+            devices = {}
+            for device, stats in self.devices.items():
+                megabytes = (stats["bytes_read"] + stats["bytes_written"]) / (1024 * 1024)
+                devices[device] = dict(stats, mb_per_s=round(megabytes / stats["seconds"], 2) if stats["seconds"] else None)
+            return {
+                "engine": self.engine,
+                "started": self.started.strftime('%Y-%m-%d %H:%M:%S'),
+                "total_seconds": round((datetime.now() - self.started).total_seconds(), 3),
+                "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+                "counters": dict(self.counters),
+                "devices": devices,
+                "slowest_files": {phase: sorted(files, key=lambda item: item["seconds"], reverse=True)
+                                  for phase, files in self.slow_files.items()},
+            }
+
+    def save(self, directory):
+        """Запись отчёта в JSON в папку reports внутри directory."""
+        reports_dir = os.path.join(directory, REPORTS_DIR)
+        os.makedirs(reports_dir, exist_ok=True)
+        report_path = os.path.join(reports_dir, f"run_{self.started.strftime('%Y%m%d-%H%M%S')}_{self.engine}.json")
+        with open(report_path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, indent=2)
+        return report_path
+
+
+def start_run(engine):
+    """Начинает замеры нового запуска."""
+    global _current
+    _current = RunReport(engine)
+    return _current
+
+
+def finish_run(directory):
+    """Сохраняет отчёт текущего запуска рядом с метаданными и выключает замеры."""
+    global _current
+    if _current is None:
+        return None
+    try:
+        report_path = _current.save(directory)
+        print(f"Отчёт о запуске сохранён: {report_path}")
+        return report_path
+    except OSError as e:
+        print(f"Ошибка при сохранении отчёта о запуске: {e}")
+        return None
+    finally:
+        _current = None
+
+
+def phase(name):
+    """Замер времени этапа (ничего не делает, если замеры выключены)."""
+    return _current.phase(name) if _current else contextlib.nullcontext()
+
+
+def count(name, value=1):
+    if _current:
+        _current.count(name, value)
+
+
+def record_file(path, phase_name, seconds, bytes_read=0, bytes_written=0, read_device=None, write_device=None):
+    if _current:
+        _current.record_file(path, phase_name, seconds, bytes_read, bytes_written, read_device, write_device)
+
+
+def enabled():
+    return _current is not None
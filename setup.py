@@ -44,6 +44,7 @@ def create_initial_backup_info():
         "Hash": backup_manager.calculate_file_hash(backup_file_path),
     }
     backup_manager.add_new_entry(entry)
+    backup_manager.hash_cache.save()
     print(f"Файл {backup_file_path} добавлен в резервирование.")
 
 
@@ -0,0 +1,189 @@
+import os
+import json
+import stat
+from datetime import datetime
+from file_copy import copy_file_with_hash
+from hash_cache import cached_file_hash
+from dir_walker import iter_files, stat_or_none
+from hashers import DEFAULT_ALGORITHM
+
+SNAPSHOT_DIR = ".snapshots"  # Папка снимков в корне флешки
+OBJECTS_DIR = "objects"  # Содержимое файлов, по одному объекту на хэш
+MANIFESTS_DIR = "manifests"  # Описания снимков
+MANIFEST_TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+DEFAULT_KEEP_DAILY = 7  # Сколько последних дней хранить (по одному снимку в день)
+DEFAULT_KEEP_WEEKLY = 4  # Сколько последних недель хранить (по одному снимку в неделю)
+
+
+def snapshot_root(flash_drive_path):
+    return os.path.join(flash_drive_path, SNAPSHOT_DIR)
+
+
+def object_path(flash_drive_path, file_hash):
+    """Путь к объекту с содержимым файла (раскладка по первым двум символам хэша)."""
+    return os.path.join(snapshot_root(flash_drive_path), OBJECTS_DIR, file_hash[:2], file_hash)
+
+
+def _iter_entry_files(entry):
+    """Файлы записи метаданных: сам файл или все файлы записи-папки. Выдаёт (имя в снимке, путь, stat)."""
+    source = entry.get("From") or ""
+    source_stat = stat_or_none(source)
+    if source_stat is None:
+        return
+    if stat.S_ISDIR(source_stat.st_mode):
+        for path, file_stat in iter_files(source):
+            yield os.path.join(entry["Name"], os.path.relpath(path, source)), path, file_stat
+    else:
+        yield entry["Name"], source, source_stat
+
+
+def store_object(source_file, flash_drive_path, algorithm=DEFAULT_ALGORITHM, cache=None):
+    """
+    Помещает содержимое файла в хранилище объектов.
+    Если объект с таким хэшем уже есть, файл не копируется.
+
+    :return: Кортеж (хэш, скопирован ли файл).
+    """
+    file_hash = cached_file_hash(source_file, algorithm, cache)
+    if os.path.exists(object_path(flash_drive_path, file_hash)):
+        return file_hash, False
+
+    objects_dir = os.path.join(snapshot_root(flash_drive_path), OBJECTS_DIR)
+    os.makedirs(objects_dir, exist_ok=True)
+    temp_path = os.path.join(objects_dir, f"incoming-{os.getpid()}.tmp")
+    # Хэш копии может отличаться от кэша, если файл изменился во время копирования
+    file_hash, _ = copy_file_with_hash(source_file, temp_path, algorithm)
+    final_path = object_path(flash_drive_path, file_hash)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    if os.path.exists(final_path):
+        os.remove(temp_path)
+        return file_hash, False
+    os.replace(temp_path, final_path)
+    return file_hash, True
+
+
+def _unique_manifest_path(manifests_dir, created):
+    """
+    Путь к описанию нового снимка. Имя задаётся временем с точностью до секунды;
+    второй снимок за ту же секунду получает номер (20240101-120000-1.json) и не заменяет первый.
+    """
+    stem = created.strftime(MANIFEST_TIME_FORMAT)
+    manifest_path = os.path.join(manifests_dir, stem + ".json")
+    number = 0
+    while os.path.exists(manifest_path):
+        number += 1
+        manifest_path = os.path.join(manifests_dir, f"{stem}-{number}.json")
+    return manifest_path
+
+
+def _parse_manifest_name(name):
+    """Время создания и номер снимка по имени описания; None, если имя не описание снимка."""
+    stem = name[:-len(".json")]
+    length = len(datetime(2000, 1, 1).strftime(MANIFEST_TIME_FORMAT))
+    time_part, suffix = stem[:length], stem[length:]
+    number = 0
+    try:
+        created = datetime.strptime(time_part, MANIFEST_TIME_FORMAT)
+        if suffix:
+            if not suffix.startswith("-"):
+                return None
+            number = int(suffix[1:])
+    except ValueError:
+        return None
+    return created, number
+
+
+def create_snapshot(metadata, flash_drive_path, algorithm=DEFAULT_ALGORITHM, cache=None):
+    """
+    Создаёт новый снимок: неизменённые файлы лишь упоминаются в описании снимка,
+    на флешку копируется только новое содержимое.
+
+    :return: Путь к описанию снимка.
+    """
+    created = datetime.now()
+    files = {}
+    copied = 0
+    for entry in metadata:
+        for name, source_file, source_stat in _iter_entry_files(entry):
+            try:
+                file_hash, was_copied = store_object(source_file, flash_drive_path, algorithm, cache)
+            except OSError as e:
+                print(f"Ошибка при сохранении {name} в снимок: {e}")
+                continue
+            copied += was_copied
+            files[name] = {
+                "From": source_file,
+                "Hash": file_hash,
+                "Size": source_stat.st_size,
+                "Modified": source_stat.st_mtime,
+            }
+
+    manifests_dir = os.path.join(snapshot_root(flash_drive_path), MANIFESTS_DIR)
+    os.makedirs(manifests_dir, exist_ok=True)
+    manifest_path = _unique_manifest_path(manifests_dir, created)
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump({"created": created.strftime('%Y-%m-%d %H:%M:%S'), "algorithm": algorithm, "files": files},
+                  file, ensure_ascii=False)
+    os.replace(temp_path, manifest_path)
+    print(f"Снимок {os.path.basename(manifest_path)} создан: файлов {len(files)}, скопировано новых {copied}.")
+    return manifest_path
+
+
+def list_snapshots(flash_drive_path):
+    """Список снимков [(время создания, путь к описанию)] от старых к новым."""
+    manifests_dir = os.path.join(snapshot_root(flash_drive_path), MANIFESTS_DIR)
+    if not os.path.isdir(manifests_dir):
+        return []
+    snapshots = []
+    for name in os.listdir(manifests_dir):
+        parsed = _parse_manifest_name(name) if name.endswith(".json") else None
+        if parsed is not None:
+            snapshots.append((parsed, os.path.join(manifests_dir, name)))
+    # Снимки одной секунды упорядочены по номеру
+    return [(created, path) for (created, _), path in sorted(snapshots)]
+
+
+def load_manifest(manifest_path):
+    """Чтение описания снимка."""
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def apply_retention(flash_drive_path, keep_daily=DEFAULT_KEEP_DAILY, keep_weekly=DEFAULT_KEEP_WEEKLY):
+    """
+    Удаляет устаревшие снимки: остаётся последний снимок каждого из keep_daily последних дней
+    и каждой из keep_weekly последних недель. Затем удаляются объекты, на которые больше не ссылается ни один снимок.
+    """
+    snapshots = list_snapshots(flash_drive_path)
+    keep = set()
+    days, weeks = [], []
+    for created, path in reversed(snapshots):  # От новых к старым
+        day = created.date()
+        week = created.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily:
+            days.append(day)
+            keep.add(path)
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.append(week)
+            keep.add(path)
+    if snapshots:
+        keep.add(snapshots[-1][1])  # Последний снимок хранится всегда
+
+    referenced = set()
+    for _, path in snapshots:
+        if path in keep:
+            referenced.update(item["Hash"] for item in load_manifest(path)["files"].values())
+        else:
+            os.remove(path)
+            print(f"Снимок {os.path.basename(path)} удалён по правилам хранения.")
+
+    removed = 0
+    objects_dir = os.path.join(snapshot_root(flash_drive_path), OBJECTS_DIR)
+    for path, _ in iter_files(objects_dir) if os.path.isdir(objects_dir) else []:
+        if os.path.basename(path) not in referenced:
+            os.remove(path)
+            removed += 1
+    if removed:
+        print(f"Удалено неиспользуемых объектов: {removed}")
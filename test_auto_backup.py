@@ -0,0 +1,69 @@
+import sys
+from types import SimpleNamespace
+import auto_backup
+from auto_backup import update_all_files
+from backup_manager import BackupManager
+from change_recorder import STICK_ID_FILENAME, CHANGE_LOG_FILENAME
+
+
+def _manager(tmp_path, monkeypatch):
+    monkeypatch.setenv("AUTOMATIC_BACKUP_TO_FLASH_DRIVE", str(tmp_path))
+    return BackupManager()
+
+
+# Обновление всех файлов сообщает, что скопировано не всё, если копирование одного из них не удалось
+def test_update_all_reports_failed_copies(tmp_path, monkeypatch):
+    manager = _manager(tmp_path, monkeypatch)
+    (tmp_path / "a.txt").write_text("a")
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    entries = [{"Name": "a.txt", "From": str(tmp_path / "a.txt"), "To": "backup"},
+               {"Name": "lost.txt", "From": str(tmp_path / "lost.txt"), "To": "backup"}]
+    changes = [(entry, "Добавить") for entry in entries]
+
+    assert not update_all_files(changes, manager, str(flash))
+    assert (flash / "backup" / "a.txt").read_text() == "a"
+    assert update_all_files(changes[:1], manager, str(flash))
+
+
+# Файлы, не поместившиеся на флешку, не считаются скопированными
+def test_update_all_reports_deferred_copies(tmp_path, monkeypatch):
+    manager = _manager(tmp_path, monkeypatch)
+    for name in ("a.txt", "b.txt"):
+        (tmp_path / name).write_text(name)
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    monkeypatch.setattr(auto_backup, "fit_files", lambda pairs, flash_drive_path: pairs[:1])
+    changes = [({"Name": name, "From": str(tmp_path / name), "To": "backup"}, "Добавить") for name in ("a.txt", "b.txt")]
+
+    copied, deferred = auto_backup.copy_files([entry for entry, _ in changes], manager, str(flash))
+    assert [entry["Name"] for entry in copied] == ["a.txt"]
+    assert [entry["Name"] for entry in deferred] == ["b.txt"]
+    assert not update_all_files(changes, manager, str(flash))
+    assert not (flash / "backup" / "b.txt").exists()
+
+
+# Флешка определяется по точке монтирования, а не по имени устройства; без журнала изменений
+# идентификатор на флешку не записывается
+def test_auto_backup_uses_mountpoint(tmp_path, monkeypatch):
+    manager = _manager(tmp_path, monkeypatch)
+    (tmp_path / "a.txt").write_text("a")
+    manager.write_backup_info([{"Name": "a.txt", "From": str(tmp_path / "a.txt"), "To": "backup"}])
+    device = tmp_path / "sdb1"
+    device.write_text("")  # Файл устройства: путь внутри него не может существовать
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    partition = SimpleNamespace(device=str(device), mountpoint=str(flash), opts="rw,removable")
+    monkeypatch.setitem(sys.modules, "psutil", SimpleNamespace(disk_partitions=lambda: [partition]))
+    answers = iter(["*", "0"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+
+    auto_backup.auto_backup()
+    assert (flash / "backup" / "a.txt").read_text() == "a"
+    assert not (flash / STICK_ID_FILENAME).exists()
+
+    # С журналом изменений позиция хранится по идентификатору, записанному в корень флешки
+    (tmp_path / CHANGE_LOG_FILENAME).write_text("")
+    answers = iter(["0"])
+    auto_backup.auto_backup()
+    assert (flash / STICK_ID_FILENAME).exists()
@@ -0,0 +1,35 @@
+import os
+import sys
+import json
+import subprocess
+
+IMPORT_TIME_BUDGET = 1.0  # Допустимое время импорта консольного запуска, секунд
+GUI_AND_PLATFORM_MODULES = ("tkinter", "win32gui", "win32con", "win32com", "psutil")
+
+PROGRAM_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _measure_import():
+    """Импорт backup_cli в отдельном процессе: время импорта и список загруженных модулей."""
+    code = (
+        "import sys, time, json\n"
+        "start = time.perf_counter()\n"
+        "import backup_cli\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(json.dumps({'seconds': elapsed, 'modules': sorted(sys.modules)}))\n"
+    )
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=PROGRAM_DIR, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# Импорт консольного запуска не должен загружать графику и платформенные библиотеки
+def test_import_does_not_load_gui_or_platform_modules():
+    result = _measure_import()
+    loaded = [name for name in result["modules"] if name.split(".")[0] in GUI_AND_PLATFORM_MODULES]
+    assert loaded == []
+
+
+# Время импорта укладывается в бюджет
+def test_import_time_within_budget():
+    result = _measure_import()
+    assert result["seconds"] < IMPORT_TIME_BUDGET, f"Импорт занял {result['seconds']:.3f} с"
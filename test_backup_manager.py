@@ -0,0 +1,93 @@
+import os
+import pytest
+from backup_manager import BackupManager
+from hashers import DEFAULT_ALGORITHM
+from metadata_store import MetadataStore, BACKUP_INFO_LIST
+
+
+def _manager(tmp_path, monkeypatch):
+    monkeypatch.setenv("AUTOMATIC_BACKUP_TO_FLASH_DRIVE", str(tmp_path))
+    return BackupManager()
+
+
+# Недописанная при сбое запись журнала удаляется и не портит следующую запись
+def test_torn_journal_tail_is_truncated(tmp_path, monkeypatch):
+    manager = _manager(tmp_path, monkeypatch)
+    manager.add_new_entry({"Name": "a.txt", "From": "a", "To": "x"})
+    with open(manager.journal_file, "a", encoding="utf-8") as journal:
+        journal.write('{"op": "add", "entry": {"Name": "b.t')  # Сбой посреди записи
+
+    manager = _manager(tmp_path, monkeypatch)
+    assert [entry["Name"] for entry in manager.read_backup_info()] == ["a.txt"]
+    manager.add_new_entry({"Name": "c.txt", "From": "c", "To": "x"})
+
+    manager = _manager(tmp_path, monkeypatch)
+    assert [entry["Name"] for entry in manager.read_backup_info()] == ["a.txt", "c.txt"]
+
+
+# Удаление и обновление записей восстанавливаются из журнала, сворачивание сохраняет то же состояние
+def test_journal_replay_remove_update_compact(tmp_path, monkeypatch):
+    manager = _manager(tmp_path, monkeypatch)
+    manager.add_new_entries([{"Name": name, "From": name, "To": "x"} for name in ("a.txt", "b.txt", "c.txt")])
+    manager.remove_entry("b.txt")
+    manager.update_entry({"Name": "c.txt", "From": "c", "To": "y"})
+    expected = [{"Name": "a.txt", "From": "a.txt", "To": "x"}, {"Name": "c.txt", "From": "c", "To": "y"}]
+
+    manager = _manager(tmp_path, monkeypatch)
+    assert manager.read_backup_info() == expected
+    manager.compact()
+    assert not os.path.exists(manager.journal_file)
+    assert _manager(tmp_path, monkeypatch).read_backup_info() == expected
+
+
+# Сбой между записью основного файла и удалением журнала не дублирует записи при повторном применении
+def test_journal_replay_after_crash_before_unlink(tmp_path, monkeypatch):
+    manager = _manager(tmp_path, monkeypatch)
+    manager.add_new_entries([{"Name": name, "From": name, "To": "x"} for name in ("a.txt", "b.txt", "c.txt")])
+    manager.remove_entry("b.txt")
+    manager.update_entry({"Name": "c.txt", "From": "c", "To": "y"})
+    expected = manager.read_backup_info()
+
+    def crash(path):
+        raise OSError("сбой питания")
+
+    monkeypatch.setattr(os, "remove", crash)
+    with pytest.raises(OSError):
+        manager.compact()
+    monkeypatch.undo()
+    assert os.path.exists(manager.journal_file)
+
+    manager = _manager(tmp_path, monkeypatch)
+    assert manager.read_backup_info() == expected
+    manager.add_new_entry({"Name": "d.txt", "From": "d", "To": "x"})
+    assert [entry["Name"] for entry in _manager(tmp_path, monkeypatch).read_backup_info()] == \
+        ["a.txt", "c.txt", "d.txt"]
+
+
+# Журнал записей не записывает кэш хэшей: его сохраняет вызывающий код в конце работы
+def test_journal_does_not_save_hash_cache(tmp_path, monkeypatch):
+    manager = _manager(tmp_path, monkeypatch)
+    saves = []
+    monkeypatch.setattr(manager.hash_cache, "save", lambda: saves.append(1))
+    entries = []
+    for name in ("a.txt", "b.txt", "c.txt"):
+        path = tmp_path / name
+        path.write_text(name)
+        entries.append({"Name": name, "From": str(path), "To": "x",
+                        "Hash": manager.calculate_file_hash(str(path))})
+    manager.add_new_entries(entries)
+    manager.remove_entry("a.txt")
+    manager.compact()
+    assert saves == []
+    assert manager.hash_cache.get(str(tmp_path / "b.txt"), DEFAULT_ALGORITHM) is not None
+
+
+# Существующий backup_info.txt при загрузке однократно импортируется в базу метаданных
+def test_load_imports_backup_info(tmp_path, monkeypatch):
+    (tmp_path / "backup_info.txt").write_text("Name: a.txt\nFrom: a\nTo: /\n\nName: b.txt\nFrom: b\nTo: /",
+                                              encoding="utf-8")
+    manager = _manager(tmp_path, monkeypatch)
+    assert [entry["Name"] for entry in manager.read_backup_info()] == ["a.txt", "b.txt"]
+    with MetadataStore(manager.metadata_db) as store:
+        assert store.count(BACKUP_INFO_LIST) == 2
+        assert store.find_by_name("b.txt", BACKUP_INFO_LIST)["From"] == "b"
@@ -0,0 +1,35 @@
+from backup_plan import build_plan, select_items, parse_choices, plan_choices, ACTION_ADD, ACTION_UPDATE, ACTION_SKIP
+
+
+def _metadata(tmp_path):
+    entries = []
+    for name, size in (("a.txt", 10), ("b.txt", 2000), ("c.txt", 5)):
+        path = tmp_path / name
+        path.write_bytes(b"x" * size)
+        entries.append({"Name": name, "From": str(path), "To": name})
+    entries[1]["Tags"] = "critical, docs"
+    return entries
+
+
+# Действия и объём плана по статусам проверки
+def test_build_plan_actions_and_totals(tmp_path):
+    plan = build_plan(_metadata(tmp_path), ["отсутствует", "неактуален", "актуален"], str(tmp_path / "flash"))
+
+    assert [item["action"] for item in plan["items"]] == [ACTION_ADD, ACTION_UPDATE, ACTION_SKIP]
+    assert plan["totals"] == {ACTION_ADD: 10, ACTION_UPDATE: 2000, ACTION_SKIP: 0}
+    assert plan["items"][1]["tags"] == ["critical", "docs"]
+
+
+# Правила выбора записей и ручной ввод
+def test_policies_and_manual_choice(tmp_path):
+    metadata = _metadata(tmp_path)
+    plan = build_plan(metadata, ["отсутствует", "неактуален", "актуален"], str(tmp_path / "flash"))
+
+    assert [item["name"] for item in select_items(plan, "all")] == ["a.txt", "b.txt"]
+    assert [item["name"] for item in select_items(plan, "critical")] == ["b.txt"]
+    assert select_items(plan, "max-mb:0.001") == []
+    assert [item["name"] for item in parse_choices(plan, "1, 3")] == ["a.txt", "c.txt"]
+    assert parse_choices(plan, "-") == []
+
+    # План применяется по имени и пути, даже если порядок записей изменился
+    assert plan_choices(select_items(plan, "all"), list(reversed(metadata))) == ["3", "2"]
@@ -0,0 +1,98 @@
+import os
+import json
+import change_recorder
+from change_recorder import (read_changes, commit_changes, ChangeRecorder, CHANGE_LOG_FILENAME, EVENT_HEADER,
+                             IN_MODIFY, STICK_ID_FILENAME)
+from metadata_store import MetadataStore
+from backupFilesToFlashDrive import make_plan
+
+
+def _write_log(base_dir, lines):
+    with open(os.path.join(base_dir, CHANGE_LOG_FILENAME), "w", encoding="utf-8") as file:
+        file.write(f'START {json.dumps({"generation": "g1", "pid": os.getpid()})}\n')
+        for line in lines:
+            file.write(line + "\n")
+
+
+# Без сохранённой позиции нужна полная проверка, после неё — только изменения
+def test_dirty_paths_after_checkpoint(tmp_path):
+    base_dir = str(tmp_path)
+    _write_log(base_dir, ['WATCH "/data/a.txt"', 'WATCH "/data/docs"', 'DIRTY "/data/a.txt"'])
+
+    changes, token = read_changes(base_dir, "metadata:stick")
+    assert changes is None
+    commit_changes(base_dir, "metadata:stick", token)
+
+    with open(os.path.join(base_dir, CHANGE_LOG_FILENAME), "a", encoding="utf-8") as file:
+        file.write('DIRTY "/data/docs/report.odt"\n')
+    changes, token = read_changes(base_dir, "metadata:stick")
+    assert changes.dirty == {"/data/docs/report.odt"}
+    assert changes.affects("/data/docs")  # Изменение внутри папки-записи
+    assert not changes.affects("/data/a.txt")  # Изменение до позиции уже перенесено
+    assert changes.affects("/data/new.txt")  # За путём не следили — проверяется всегда
+
+
+# Переполнение очереди событий означает потерю изменений — нужна полная проверка
+def test_overflow_requires_full_scan(tmp_path):
+    base_dir = str(tmp_path)
+    _write_log(base_dir, ['WATCH "/data/a.txt"'])
+    _, token = read_changes(base_dir, "metadata:stick")
+    commit_changes(base_dir, "metadata:stick", token)
+
+    with open(os.path.join(base_dir, CHANGE_LOG_FILENAME), "a", encoding="utf-8") as file:
+        file.write("OVERFLOW\n")
+    changes, _ = read_changes(base_dir, "metadata:stick")
+    assert changes is None
+
+
+# Журнал сворачивается до наименьшей позиции потребителей, а их позиции остаются действительными
+def test_journal_compacted_past_min_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(change_recorder, "JOURNAL_COMPACT_SIZE", 200)
+    data = tmp_path / "data"
+    data.mkdir()
+    base_dir = str(tmp_path)
+    recorder = ChangeRecorder(base_dir, [str(data)])
+    recorder.start()
+    wd = next(iter(recorder.watches))
+
+    def modified(name):
+        encoded = name.encode().ljust(16, b"\0")
+        recorder._handle_events(EVENT_HEADER.pack(wd, IN_MODIFY, 0, len(encoded)) + encoded)
+
+    try:
+        for consumer in ("metadata:a", "metadata:b"):
+            commit_changes(base_dir, consumer, read_changes(base_dir, consumer)[1])
+        for number in range(10):
+            modified(f"old{number}.txt")
+        _, token = read_changes(base_dir, "metadata:a")
+        commit_changes(base_dir, "metadata:a", token)
+        size = os.path.getsize(os.path.join(base_dir, CHANGE_LOG_FILENAME))
+        modified("new.txt")  # Потребитель b ещё не прочитал старые строки — сворачивать нельзя
+        assert os.path.getsize(os.path.join(base_dir, CHANGE_LOG_FILENAME)) > size
+
+        changes, token = read_changes(base_dir, "metadata:b")
+        assert len(changes) == 11
+        commit_changes(base_dir, "metadata:b", token)
+        modified("newest.txt")  # Старые строки прочитаны обоими потребителями
+        assert os.path.getsize(os.path.join(base_dir, CHANGE_LOG_FILENAME)) < size
+
+        assert read_changes(base_dir, "metadata:a")[0].dirty == {str(data / "new.txt"), str(data / "newest.txt")}
+        assert read_changes(base_dir, "metadata:b")[0].dirty == {str(data / "newest.txt")}
+        assert read_changes(base_dir, "metadata:new")[0] is None  # Новому потребителю — полная проверка
+    finally:
+        recorder.log.close()
+        os.close(recorder.fd)
+
+
+# Проверка флешки ничего не регистрирует на ней
+def test_check_does_not_register_stick(tmp_path):
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    source = tmp_path / "a.txt"
+    source.write_text("data")
+    store = MetadataStore(str(tmp_path / "metadata.db"))
+    store.add_entries([{"Name": "a.txt", "From": str(source), "To": "a.txt"}])
+
+    plan = make_plan(store.entries(), str(flash), store=store)
+    assert len(plan["items"]) == 1
+    assert not (flash / STICK_ID_FILENAME).exists()
@@ -0,0 +1,46 @@
+import os
+import gzip
+import hashlib
+import pytest
+from compression import (choose_codec, compress_copy, decompress_blocks, open_stored, stored_path,
+                         CODEC_GZIP)
+
+
+# Сжатая копия распаковывается в исходное содержимое, хэш считается по исходному
+def test_gzip_round_trip(tmp_path):
+    data = b"line of text\n" * 20000
+    source = tmp_path / "report.txt"
+    source.write_bytes(data)
+    target = stored_path(str(tmp_path / "copy" / "report.txt"), CODEC_GZIP)
+    os.makedirs(os.path.dirname(target))
+
+    file_hash, copied, stored_size = compress_copy(str(source), target, "sha256")
+    assert target.endswith(".gz")
+    assert file_hash == hashlib.sha256(data).hexdigest()
+    assert copied == len(data) and stored_size == os.path.getsize(target) < len(data)
+    with open_stored(target, CODEC_GZIP) as f:
+        assert f.read() == data
+    with open(target, "rb") as f:
+        stored = f.read()
+    chunks = [stored[offset:offset + 1000] for offset in range(0, len(stored), 1000)]
+    assert b"".join(decompress_blocks(chunks, CODEC_GZIP)) == data
+
+    # Обрезанная копия обнаруживается
+    with pytest.raises(EOFError):
+        b"".join(decompress_blocks(chunks[:-1], CODEC_GZIP))
+
+
+# Сжимаются только хорошо сжимаемые файлы не из списка сжатых форматов
+def test_choose_codec(tmp_path):
+    text, random_data, small, archive = (tmp_path / name for name in ("a.txt", "b.bin", "c.txt", "d.zip"))
+    text.write_bytes(b"abc" * 100000)
+    random_data.write_bytes(os.urandom(100000))
+    small.write_bytes(b"abc" * 10)
+    archive.write_bytes(gzip.compress(b"abc" * 100000) + b"abc" * 100000)
+
+    codec, ratio = choose_codec(str(text))
+    assert codec == CODEC_GZIP and ratio < 0.1
+    codec, ratio = choose_codec(str(random_data))
+    assert codec is None and ratio > 0.8
+    assert choose_codec(str(small)) == (None, None)
+    assert choose_codec(str(archive)) == (None, None)
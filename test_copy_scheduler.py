@@ -0,0 +1,67 @@
+import os
+from copy_scheduler import CopyScheduler
+
+
+# Результаты выдаются в порядке заданий, ошибка одного задания не прерывает остальные
+def test_run_order_and_errors(tmp_path):
+    jobs = []
+    for index in range(12):
+        source = tmp_path / f"source{index}.bin"
+        source.write_bytes(os.urandom(1000 * index))
+        jobs.append((index, str(source), str(tmp_path / "flash" / "dir" / f"copy{index}.bin")))
+    jobs.insert(5, ("missing", str(tmp_path / "missing.bin"), str(tmp_path / "flash" / "missing.bin")))
+
+    scheduler = CopyScheduler(read_workers=2, writers_per_device=1)
+    results = list(scheduler.run(jobs))
+    assert [key for key, _, _ in results] == [key for key, _, _ in jobs]
+    for (key, source, target), (_, result, error) in zip(jobs, results):
+        if key == "missing":
+            assert isinstance(error, FileNotFoundError) and result is None
+            assert not os.path.exists(target)
+        else:
+            assert error is None and result[1] == os.path.getsize(source)
+            with open(source, "rb") as src, open(target, "rb") as dst:
+                assert src.read() == dst.read()
+
+
+# Ошибка записи в одно назначение не мешает записи в остальные
+def test_run_fanout_write_error(tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(os.urandom(5000))
+    targets = [str(tmp_path / "first" / "copy.bin"), str(tmp_path / "second" / "copy.bin")]
+
+    def copy_function(source_path, target, blocks):
+        data = b"".join(blocks)
+        if "first" in target:
+            raise OSError("флешка извлечена")
+        with open(target, "wb") as file:
+            file.write(data)
+        return len(data)
+
+    results = list(CopyScheduler(copy_function, read_workers=1).run_fanout([("a", str(source), targets)]))
+    assert len(results) == 1 and results[0][0] == "a"
+    (first, first_result, first_error), (second, second_result, second_error) = results[0][1]
+    assert isinstance(first_error, OSError) and first_result is None
+    assert second_error is None and second_result == 5000
+    assert open(second, "rb").read() == source.read_bytes()
+
+
+# Ошибка чтения не из OSError передаётся писателю, а не оставляет его ждать блоков
+def test_run_reader_non_oserror(tmp_path, monkeypatch):
+    import copy_scheduler
+    source = tmp_path / "source.bin"
+    source.write_bytes(os.urandom(5000))
+
+    def broken_blocks(path):
+        yield b"x" * 100
+        raise ValueError("сбой чтения")
+
+    monkeypatch.setattr(copy_scheduler, "iter_file_blocks", broken_blocks)
+    scheduler = CopyScheduler(read_workers=1)
+    pool = copy_scheduler.ThreadPoolExecutor(max_workers=1)
+    future = pool.submit(lambda: list(scheduler.run([("a", str(source), str(tmp_path / "flash" / "copy.bin"))])))
+    results = future.result(timeout=10)
+    pool.shutdown()
+    assert len(results) == 1
+    key, result, error = results[0]
+    assert key == "a" and result is None and isinstance(error, ValueError)
@@ -0,0 +1,91 @@
+import os
+import hashlib
+import pytest
+import delta_sync
+from delta_sync import delta_copy, compute_signature, load_signature, signature_path
+
+
+# Дельта-копирование переписывает только изменившиеся блоки и даёт точную копию
+def test_delta_copy_round_trip(tmp_path):
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    block_size = 4096
+    data = bytearray(os.urandom(8 * block_size + 100))
+    source, target = tmp_path / "source.bin", flash / "copy.bin"
+    source.write_bytes(data)
+
+    file_hash, total, written = delta_copy(str(source), str(target), str(flash), "sha256", block_size)
+    assert target.read_bytes() == data and total == written == len(data)
+    assert file_hash == hashlib.sha256(data).hexdigest()
+
+    # Меняем один блок и укорачиваем файл
+    data[3 * block_size + 10] ^= 0xFF
+    data = data[:7 * block_size + 5]
+    source.write_bytes(data)
+    file_hash, total, written = delta_copy(str(source), str(target), str(flash), "sha256", block_size)
+    assert target.read_bytes() == data
+    assert file_hash == hashlib.sha256(data).hexdigest()
+    assert written == block_size + 5  # Изменённый блок и укороченный последний блок
+    assert not os.path.exists(str(target) + delta_sync.PART_SUFFIX)
+
+
+# Сохранённая сигнатура совпадает с пересчитанной и устаревает вместе с копией
+def test_signature_matches_copy(tmp_path):
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    source, target = tmp_path / "source.bin", flash / "copy.bin"
+    source.write_bytes(os.urandom(3 * 1024 + 7))
+    delta_copy(str(source), str(target), str(flash), None, 1024)
+
+    sig_path = signature_path(str(target), str(flash))
+    assert os.path.exists(sig_path)
+    assert load_signature(sig_path, str(target), 1024) == compute_signature(str(target), 1024)
+
+    target.write_bytes(b"changed")
+    assert load_signature(sig_path, str(target), 1024)["size"] == len(b"changed")
+
+
+# Прерванное обновление не трогает прежнюю копию, следующий запуск продолжает с временного файла
+def test_delta_copy_interrupted_keeps_old_copy(tmp_path):
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    block_size = 1024
+    old_data = os.urandom(8 * block_size)
+    source, target = tmp_path / "source.bin", flash / "copy.bin"
+    source.write_bytes(old_data)
+    delta_copy(str(source), str(target), str(flash), None, block_size)
+
+    new_data = os.urandom(8 * block_size)
+    source.write_bytes(new_data)
+
+    def interrupted_blocks():
+        for index in range(3):
+            yield new_data[index * block_size:(index + 1) * block_size]
+        raise OSError("флешка извлечена")
+
+    with pytest.raises(OSError):
+        delta_copy(str(source), str(target), str(flash), None, block_size, interrupted_blocks())
+    assert target.read_bytes() == old_data
+    assert os.path.exists(str(target) + delta_sync.PART_SUFFIX)
+
+    _, total, written = delta_copy(str(source), str(target), str(flash), None, block_size)
+    assert target.read_bytes() == new_data and total == len(new_data)
+    assert written == 5 * block_size  # Первые три блока уже записаны до прерывания
+    assert not os.path.exists(str(target) + delta_sync.PART_SUFFIX)
+
+
+# Первая копия большого файла идёт через возобновляемое полное копирование
+def test_sync_file_first_copy_is_full(tmp_path, monkeypatch):
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    source, target = tmp_path / "source.bin", flash / "copy.bin"
+    source.write_bytes(os.urandom(10000))
+    monkeypatch.setattr(delta_sync, "DELTA_MIN_SIZE", 1000)
+    calls = []
+    full_copy = delta_sync.copy_file_with_hash
+    monkeypatch.setattr(delta_sync, "copy_file_with_hash", lambda *args: calls.append(args) or full_copy(*args))
+
+    delta_sync.sync_file(str(source), str(target), str(flash), None)
+    assert len(calls) == 1 and target.read_bytes() == source.read_bytes()
+    delta_sync.sync_file(str(source), str(target), str(flash), None)
+    assert len(calls) == 1 and target.read_bytes() == source.read_bytes()
@@ -0,0 +1,37 @@
+import os
+from dir_walker import walk_tree, iter_stale_files, iter_files
+
+
+def _tree(tmp_path):
+    source, target = tmp_path / "source", tmp_path / "flash" / "source"
+    (source / "sub" / "deep").mkdir(parents=True)
+    (source / "a.txt").write_text("a")
+    (source / "sub" / "b.txt").write_text("b")
+    (source / "sub" / "deep" / "c.txt").write_text("c")
+    (target / "sub").mkdir(parents=True)
+    (target / "a.txt").write_text("a")
+    (target / "sub" / "b.txt").write_text("old b")
+    os.utime(target / "a.txt", (2_000_000_000, 2_000_000_000))  # Копия новее источника
+    os.utime(target / "sub" / "b.txt", (1_000_000_000, 1_000_000_000))  # Копия старше источника
+    return source, target
+
+
+# Обход выдаёт каждый файл источника с путём на флешке и stat копии (None, если копии нет)
+def test_walk_tree(tmp_path):
+    source, target = _tree(tmp_path)
+    found = {os.path.relpath(source_path, source): (target_path, target_stat is not None)
+             for source_path, target_path, _, target_stat in walk_tree(str(source), str(target))}
+    assert found == {
+        "a.txt": (str(target / "a.txt"), True),
+        os.path.join("sub", "b.txt"): (str(target / "sub" / "b.txt"), True),
+        os.path.join("sub", "deep", "c.txt"): (str(target / "sub" / "deep" / "c.txt"), False),
+    }
+
+
+# Устаревшими считаются отсутствующие копии и копии старше источника
+def test_iter_stale_files(tmp_path):
+    source, target = _tree(tmp_path)
+    stale = sorted(os.path.relpath(path, source) for path, _, _, _ in iter_stale_files(str(source), str(target)))
+    assert stale == [os.path.join("sub", "b.txt"), os.path.join("sub", "deep", "c.txt")]
+    assert sorted(os.path.relpath(path, source) for path, _ in iter_files(str(source))) == \
+        ["a.txt", os.path.join("sub", "b.txt"), os.path.join("sub", "deep", "c.txt")]
@@ -0,0 +1,93 @@
+import os
+import backupFilesToFlashDrive
+from drive_manifest import DriveManifest, write_manifest, drive_state, MANIFEST_FILENAME
+from metadata_store import MetadataStore
+from backupFilesToFlashDrive import apply_target_choices, make_plan
+from hash_cache import HashCache, HASH_CACHE_FILENAME
+from verify import TIER_FULL
+from hashers import file_digest
+
+
+# Записи находятся двоичным поиском в отображённом файле, изменения записываются атомарно
+def test_manifest_lookup_and_update(tmp_path):
+    records = {f"папка/{number:04d}.txt": (number, number * 1000, f"blake2b:{number:032x}") for number in range(500)}
+    write_manifest(str(tmp_path), records)
+    with DriveManifest(str(tmp_path)) as manifest:
+        assert manifest.lookup("папка/0137.txt") == records["папка/0137.txt"]
+        assert manifest.lookup("папка/9999.txt") is None
+        assert len(manifest) == 500
+
+    manifest = DriveManifest(str(tmp_path))
+    manifest.remove("папка/0000.txt")
+    manifest.record("a.txt", os.stat(tmp_path / MANIFEST_FILENAME), "blake2b:00")
+    manifest.save()
+    with DriveManifest(str(tmp_path)) as manifest:
+        assert manifest.lookup("папка/0000.txt") is None
+        assert manifest.lookup("a.txt")[2] == "blake2b:00"
+        assert len(manifest) == 500
+
+
+# На другом компьютере (без кэша хэшей флешки) проверка не читает копии, хэши которых есть в манифесте
+def test_check_uses_manifest_instead_of_hashing(tmp_path, monkeypatch):
+    monkeypatch.setattr(backupFilesToFlashDrive, "COMPRESS_COPIES", False)
+    sources = []
+    for name in ("a.txt", "b.txt"):
+        path = tmp_path / name
+        path.write_text(name * 1000)
+        sources.append(path)
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    store = MetadataStore(str(tmp_path / "metadata.db"))
+    store.add_entries([{"Name": path.name, "From": str(path), "To": path.name} for path in sources])
+    apply_target_choices(store, store.entries(), {str(flash): ["1", "2"]},
+                         HashCache(str(tmp_path / "hash_cache.json")))
+    assert drive_state(str(flash)) == {"a.txt": "актуален", "b.txt": "актуален"}
+
+    # Первая проверка полная: копии хэшируются, манифест остаётся прежним
+    saved = store.entries()
+    assert [item["status"] for item in make_plan(saved, str(flash), store=store, tier=TIER_FULL)["items"]] == \
+        ["актуален", "актуален"]
+
+    def no_hashing(paths, *args, **kwargs):
+        assert not paths, f"Копии прочитаны: {paths}"
+        return []
+
+    if os.path.exists(flash / HASH_CACHE_FILENAME):
+        os.remove(flash / HASH_CACHE_FILENAME)
+    monkeypatch.setattr(backupFilesToFlashDrive, "hash_files", no_hashing)
+    sampled = []
+    quick_matches = backupFilesToFlashDrive.quick_matches
+    monkeypatch.setattr(backupFilesToFlashDrive, "quick_matches",
+                        lambda entry, path: sampled.append(entry["Name"]) or quick_matches(entry, path))
+    # Очередная полная проверка в этом запуске не нужна
+    monkeypatch.setattr(backupFilesToFlashDrive, "select_full_rotation", lambda entries: [])
+    assert [item["status"] for item in make_plan(saved, str(flash), store=store)["items"]] == \
+        ["актуален", "актуален"]
+    # Участки копий с отпечатком сверяются и при известном по манифесту хэше
+    assert sorted(sampled) == ["a.txt", "b.txt"]
+
+    # Подмена с тем же размером и временем изменения не видна манифесту, но видна по участкам
+    copy_stat = os.stat(flash / "a.txt")
+    (flash / "a.txt").write_text("x" * copy_stat.st_size)
+    os.utime(flash / "a.txt", ns=(copy_stat.st_atime_ns, copy_stat.st_mtime_ns))
+    assert [item["status"] for item in make_plan(saved, str(flash), store=store)["items"]] == \
+        ["неактуален", "актуален"]
+
+    # Изменённая копия видна по stat
+    (flash / "b.txt").write_text("испорчен")
+    assert drive_state(str(flash))["b.txt"] == "изменён"
+
+
+# Файлы записей-папок записываются в манифест с хэшем содержимого
+def test_directory_files_recorded_with_hash(tmp_path):
+    source_dir = tmp_path / "docs"
+    source_dir.mkdir()
+    (source_dir / "a.txt").write_text("содержимое")
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    store = MetadataStore(str(tmp_path / "metadata.db"))
+    store.add_entries([{"Name": "docs", "From": str(source_dir), "To": "docs"}])
+    apply_target_choices(store, store.entries(), {str(flash): ["1"]},
+                         HashCache(str(tmp_path / "hash_cache.json")))
+    with DriveManifest(str(flash)) as manifest:
+        assert manifest.lookup("docs/a.txt")[2] == file_digest(str(source_dir / "a.txt"))
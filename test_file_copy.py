@@ -0,0 +1,77 @@
+import os
+import hashlib
+import file_copy
+from file_copy import files_equal
+
+
+# Сравнение файлов обычным чтением и через mmap
+def test_files_equal(tmp_path, monkeypatch):
+    data = os.urandom(256 * 1024)
+    first, same, changed, shorter = (tmp_path / name for name in ("a.bin", "b.bin", "c.bin", "d.bin"))
+    first.write_bytes(data)
+    same.write_bytes(data)
+    changed.write_bytes(data[:-1] + bytes([data[-1] ^ 1]))
+    shorter.write_bytes(data[:-1])
+
+    for threshold in (1024 * 1024 * 1024, 1024):
+        monkeypatch.setattr(file_copy, "MMAP_THRESHOLD", threshold)
+        assert files_equal(str(first), str(same), block_size=4096)
+        assert not files_equal(str(first), str(changed), block_size=4096)
+        assert not files_equal(str(first), str(shorter), block_size=4096)
+
+
+# Прерванное копирование не трогает прежнюю копию и продолжается с контрольной точки
+def test_copy_resumes_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_copy, "RESUME_MIN_SIZE", 64 * 1024)
+    monkeypatch.setattr(file_copy, "CHECKPOINT_INTERVAL", 64 * 1024)
+    data = os.urandom(1024 * 1024 + 100)
+    source, target = tmp_path / "source.bin", tmp_path / "copy.bin"
+    source.write_bytes(data)
+    target.write_bytes(b"old copy")
+
+    def interrupted(block_size=48 * 1024, limit=600 * 1024):
+        for offset in range(0, limit, block_size):
+            yield data[offset:offset + block_size]
+        raise OSError("флешка извлечена")
+
+    try:
+        file_copy.copy_file_with_hash(str(source), str(target), blocks=interrupted())
+    except OSError:
+        pass
+    assert target.read_bytes() == b"old copy"
+    checkpoint = file_copy.load_checkpoint(str(target) + file_copy.PART_SUFFIX, os.stat(source))
+    assert 0 < checkpoint["offset"] <= 600 * 1024
+
+    writes = []
+    monkeypatch.setattr(file_copy.run_report, "enabled", lambda: True)
+    monkeypatch.setattr(file_copy.run_report, "record_file", lambda *args: writes.append(args[4]))
+    file_hash, copied = file_copy.copy_file_with_hash(str(source), str(target))
+    assert target.read_bytes() == data and copied == len(data)
+    assert writes == [len(data) - checkpoint["offset"]]
+    assert file_hash == hashlib.blake2b(data).hexdigest()
+    assert not os.path.exists(str(target) + file_copy.PART_SUFFIX + file_copy.CHECKPOINT_SUFFIX)
+
+
+# Потоковое копирование: хэш считается за тот же проход, время изменения переносится
+def test_copy_file_with_hash_streams(tmp_path):
+    data = os.urandom(3 * file_copy.COPY_BLOCK_SIZE + 123)
+    source, target = tmp_path / "source.bin", tmp_path / "copy.bin"
+    source.write_bytes(data)
+    os.utime(source, ns=(1_000_000_000, 1_500_000_000_000_000_000))
+
+    file_hash, copied = file_copy.copy_file_with_hash(str(source), str(target), "sha256")
+    assert file_hash == hashlib.sha256(data).hexdigest() and copied == len(data)
+    assert target.read_bytes() == data
+    assert os.stat(target).st_mtime_ns == os.stat(source).st_mtime_ns
+    assert not os.path.exists(str(target) + file_copy.PART_SUFFIX)
+
+    # Без хэша копия та же
+    assert file_copy.copy_file_with_hash(str(source), str(tmp_path / "plain.bin"), None) == (None, len(data))
+
+
+# Перенарезка блоков произвольного размера на блоки фиксированного размера
+def test_rechunk():
+    blocks = [b"abc", b"", b"defgh", b"i", b"jklmnopq"]
+    assert list(file_copy.rechunk(blocks, 4)) == [b"abcd", b"efgh", b"ijkl", b"mnop", b"q"]
+    assert list(file_copy.rechunk([b"abcd"], 4)) == [b"abcd"]
+    assert list(file_copy.rechunk([], 4)) == []
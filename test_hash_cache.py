@@ -0,0 +1,65 @@
+import os
+import hashlib
+from hash_cache import HashCache, cached_file_hash
+
+
+# Тестирование повторного использования хэша без чтения файла
+def test_cached_hash_is_reused(tmp_path):
+    test_file = tmp_path / "test.txt"
+    test_file.write_bytes(b"Hello, World!")
+    cache = HashCache(str(tmp_path / "hash_cache.json"))
+
+    first = cached_file_hash(str(test_file), "md5", cache)
+    assert first == hashlib.md5(b"Hello, World!").hexdigest()
+
+    # Второй вызов не должен вычислять хэш заново
+    calls = []
+    second = cache.get_or_compute(str(test_file), "md5", lambda path: calls.append(path))
+    assert second == first
+    assert calls == []
+
+
+# Тестирование сброса записи при изменении файла
+def test_cache_invalidated_on_change(tmp_path):
+    test_file = tmp_path / "test.txt"
+    test_file.write_bytes(b"old")
+    cache = HashCache(str(tmp_path / "hash_cache.json"))
+    cached_file_hash(str(test_file), "md5", cache)
+
+    test_file.write_bytes(b"new content")
+    stat_result = os.stat(test_file)
+    os.utime(test_file, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 1_000_000))
+
+    assert cache.get(str(test_file), "md5") is None
+    assert cached_file_hash(str(test_file), "md5", cache) == hashlib.md5(b"new content").hexdigest()
+
+
+# Тестирование сохранения кэша между запусками
+def test_cache_persists(tmp_path):
+    test_file = tmp_path / "test.txt"
+    test_file.write_bytes(b"data")
+    cache_path = str(tmp_path / "hash_cache.json")
+
+    cache = HashCache(cache_path)
+    cached_file_hash(str(test_file), "sha256", cache)
+    cache.save()
+
+    reloaded = HashCache(cache_path)
+    assert reloaded.get(str(test_file), "sha256") == hashlib.sha256(b"data").hexdigest()
+    # Хэши разных алгоритмов хранятся раздельно
+    assert reloaded.get(str(test_file), "md5") is None
+
+
+# Кэш на флешке не зависит от точки монтирования: ключ — путь относительно корня, кортеж — размер и mtime_ns
+def test_flash_cache_survives_remount(tmp_path):
+    first_mount = tmp_path / "E"
+    first_mount.mkdir()
+    (first_mount / "test.txt").write_bytes(b"data")
+    cache = HashCache(str(first_mount / "hash_cache.json"), root=str(first_mount))
+    cached_file_hash(str(first_mount / "test.txt"), "md5", cache)
+    cache.save()
+
+    second_mount = tmp_path / "F"
+    os.rename(first_mount, second_mount)
+    reloaded = HashCache(str(second_mount / "hash_cache.json"), root=str(second_mount))
+    assert reloaded.get(str(second_mount / "test.txt"), "md5") == hashlib.md5(b"data").hexdigest()
@@ -0,0 +1,49 @@
+import gzip
+import hashlib
+from hash_cache import HashCache
+from hash_engine import hash_files
+
+
+# Хэши возвращаются в порядке путей, отсутствующий файл даёт None
+def test_hash_files_keeps_order(tmp_path):
+    paths = []
+    for index in range(10):
+        path = tmp_path / f"file{index}.txt"
+        path.write_bytes(b"x" * index)
+        paths.append(str(path))
+    paths.insert(3, str(tmp_path / "missing.txt"))
+
+    results = hash_files(paths, "sha256", workers_per_device=3)
+    expected = [hashlib.sha256(b"x" * index).hexdigest() for index in range(10)]
+    expected.insert(3, None)
+    assert results == expected
+
+
+# Настройка потоков словарём по устройству и повторное использование кэша
+def test_hash_files_per_device_workers_and_cache(tmp_path):
+    paths = []
+    for index in range(4):
+        path = tmp_path / f"file{index}.bin"
+        path.write_bytes(bytes([index]) * 1000)
+        paths.append(str(path))
+    cache = HashCache(str(tmp_path / "hash_cache.json"))
+
+    first = hash_files(paths, "md5", cache, workers_per_device={str(tmp_path): 2, None: 1})
+    assert first == [hashlib.md5(bytes([index]) * 1000).hexdigest() for index in range(4)]
+    assert all(cache.get(path, "md5") == file_hash for path, file_hash in zip(paths, first))
+    assert hash_files(paths, "md5", cache, workers_per_device=1) == first
+
+
+# Повреждённая или обрезанная сжатая копия даёт None, а не прерывает расчёт остальных хэшей
+def test_hash_files_corrupt_gzip(tmp_path):
+    data = gzip.compress(b"a" * 1000)
+    corrupt = tmp_path / "corrupt.txt.gz"
+    corrupt.write_bytes(data[:10] + b"\xff" * 40)
+    truncated = tmp_path / "truncated.txt.gz"
+    truncated.write_bytes(data[:len(data) // 2])
+    valid = tmp_path / "valid.txt.gz"
+    valid.write_bytes(data)
+
+    paths = [str(corrupt), str(truncated), str(valid)]
+    results = hash_files(paths, "sha256", codecs=["gzip"] * 3)
+    assert results == [None, None, hashlib.sha256(b"a" * 1000).hexdigest()]
@@ -0,0 +1,36 @@
+import os
+import hashlib
+from hashers import file_digest, parse_digest, digest_matches, format_digest
+
+
+# Хэш с префиксом алгоритма
+def test_file_digest_is_tagged(tmp_path):
+    test_file = tmp_path / "test.txt"
+    test_file.write_bytes(b"Hello, World!")
+
+    assert file_digest(str(test_file)) == "blake2b:" + hashlib.blake2b(b"Hello, World!").hexdigest()
+    assert file_digest(str(test_file), "sha256") == format_digest("sha256", hashlib.sha256(b"Hello, World!").hexdigest())
+
+
+# Старые хэши без префикса распознаются по длине
+def test_legacy_digests_are_recognised():
+    md5 = hashlib.md5(b"data").hexdigest()
+    sha256 = hashlib.sha256(b"data").hexdigest()
+
+    assert parse_digest(md5) == ("md5", md5)
+    assert parse_digest(sha256) == ("sha256", sha256)
+    assert parse_digest("null") == (None, "null")
+    assert digest_matches(md5, "md5", md5)
+    assert not digest_matches(md5, "blake2b", md5)
+
+
+# Хэш большого файла через mmap совпадает с обычным чтением
+def test_mmap_hash_matches_stream(tmp_path, monkeypatch):
+    import hashers
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    test_file = tmp_path / "big.bin"
+    test_file.write_bytes(data)
+    monkeypatch.setattr(hashers, "MMAP_THRESHOLD", 1024)
+    monkeypatch.setattr(hashers, "MMAP_CHUNK_SIZE", 1024 * 1024)
+
+    assert hashers.hash_file(str(test_file), "blake2b") == (hashlib.blake2b(data).hexdigest(), len(data))
@@ -0,0 +1,57 @@
+import shutil
+import main
+from change_recorder import stick_id
+from multi_target import is_registered
+
+
+def _sources(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "b.txt").write_text("b")
+    flashes = [tmp_path / "flash1", tmp_path / "flash2"]
+    for flash in flashes:
+        flash.mkdir()
+    return [str(tmp_path / "a.txt"), str(docs)], flashes
+
+
+# Выбор по правилу плана копирует устаревшие копии на все флешки без вопросов пользователю
+def test_update_files_policy(tmp_path, monkeypatch):
+    file_list, flashes = _sources(tmp_path)
+    shutil.copy2(file_list[0], flashes[1] / "a.txt")  # На второй флешке копия актуальна
+
+    def no_input(*args):
+        raise AssertionError("Вопрос пользователю при запуске по правилу")
+
+    monkeypatch.setattr("builtins.input", no_input)
+
+    main.update_files(file_list, [str(flash) for flash in flashes], "all")
+    for flash in flashes:
+        assert (flash / "a.txt").read_text() == "a"
+        assert (flash / "docs" / "b.txt").read_text() == "b"
+
+
+# Номера, введённые пользователем, разбираются по плану: номер папки копирует её устаревшие файлы
+def test_update_files_choice(tmp_path, monkeypatch):
+    file_list, flashes = _sources(tmp_path)
+    monkeypatch.setattr("builtins.input", lambda *args: "2")
+
+    main.update_files(file_list, [str(flash) for flash in flashes])
+    for flash in flashes:
+        assert not (flash / "a.txt").exists()
+        assert (flash / "docs" / "b.txt").read_text() == "b"
+
+
+# Первая флешка регистрируется при копировании на неё и при следующих запусках выбирается вместе с другими
+def test_first_drive_registered_on_copy(tmp_path, monkeypatch):
+    file_list, flashes = _sources(tmp_path)
+    monkeypatch.setattr(main, "get_flash_drives", lambda: [str(flash) for flash in flashes])
+    assert main.get_backup_targets() == [str(flashes[0])]
+
+    main.update_files(file_list[:1], main.get_backup_targets(), "all")
+    assert is_registered(str(flashes[0])) and not is_registered(str(flashes[1]))
+    assert main.get_backup_targets() == [str(flashes[0])]
+
+    # Вторая флешка, зарегистрированная другим движком, тоже получает копии
+    stick_id(str(flashes[1]))
+    assert main.get_backup_targets() == [str(flash) for flash in flashes]
@@ -0,0 +1,80 @@
+import pytest
+import sqlite3
+from metadata_store import MetadataStore, BACKUP_INFO_LIST
+
+
+def make_entry(name, size=0):
+    return {
+        "Name": name,
+        "From": f"C:/Work/{name}",
+        "Modified": "2024-11-23 12:27:51",
+        "To": name,
+        "Backup": "null",
+        "Size": f"{size} bytes",
+        "Hash": "",
+    }
+
+
+# Тестирование добавления и поиска записей
+def test_add_and_find(tmp_path):
+    store = MetadataStore(str(tmp_path / "metadata.db"))
+    store.add_entries([make_entry("a.txt"), make_entry("b.txt"), make_entry("c.txt")])
+
+    assert [entry["Name"] for entry in store.entries()] == ["a.txt", "b.txt", "c.txt"]
+    assert store.find_by_path("C:/Work/b.txt")["Name"] == "b.txt"
+    assert store.find_by_name("c.txt")["From"] == "C:/Work/c.txt"
+    assert store.find_by_name("missing.txt") is None
+
+
+# Тестирование пакетного обновления после копирования
+def test_update_entries(tmp_path):
+    store = MetadataStore(str(tmp_path / "metadata.db"))
+    store.add_entries([make_entry("a.txt"), make_entry("b.txt")])
+
+    entries = store.entries()
+    entries[1]["Backup"] = "2024-11-26 21:54:36"
+    entries[1]["Hash"] = "a6e5566de83c1945723af0e9e020b95e"
+    entries[1]["Codec"] = "gzip"  # Дополнительное поле сохраняется в extra
+    store.update_entries(entries)
+
+    updated = store.find_by_name("b.txt")
+    assert updated["Backup"] == "2024-11-26 21:54:36"
+    assert updated["Hash"] == "a6e5566de83c1945723af0e9e020b95e"
+    assert updated["Codec"] == "gzip"
+    assert store.find_by_name("a.txt")["Backup"] == "null"
+
+
+# Тестирование однократного импорта backup_info.txt
+def test_import_backup_info(tmp_path):
+    backup_info = tmp_path / "backup_info.txt"
+    backup_info.write_text(
+        "Name: PSW.docx\nFrom: C:\\Work\\PSW.docx\nTo: /\nSize: 12803\n\n"
+        "Name: Вес.xlsb\nFrom: C:\\Work\\Вес.xlsb\nTo: /\nSize: 376980",
+        encoding="utf-8",
+    )
+    store = MetadataStore(str(tmp_path / "metadata.db"))
+
+    assert store.import_backup_info(str(backup_info)) == 2
+    # Повторный импорт не дублирует записи
+    assert store.import_backup_info(str(backup_info)) == 0
+    assert store.find_by_name("Вес.xlsb", BACKUP_INFO_LIST)["Size"] == "376980"
+    assert store.count() == 0
+
+
+# Тестирование однократного импорта metadata.txt
+def test_import_metadata_txt(tmp_path):
+    metadata = tmp_path / "metadata.txt"
+    metadata.write_text(
+        "Name: PSW.docx\nFrom: C:\\Work\\PSW.docx\nSize: 12803 bytes\n"
+        "----------------------------------------\n"
+        "Name: Plan.xlsb\nFrom: C:\\Work\\Plan.xlsb\nSize: 376980 bytes\n"
+        "----------------------------------------\n"
+    )
+    with MetadataStore(str(tmp_path / "metadata.db")) as store:
+        assert store.import_metadata_txt(str(metadata)) == 2
+        # Повторный импорт не дублирует записи
+        assert store.import_metadata_txt(str(metadata)) == 0
+        assert store.find_by_name("Plan.xlsb")["Size"] == "376980 bytes"
+    # После выхода из блока with соединение закрыто
+    with pytest.raises(sqlite3.ProgrammingError):
+        store.count()
@@ -0,0 +1,60 @@
+import os
+import mount_watcher
+from mount_watcher import BackupWatcher, read_mounts, is_removable_device, _unescape_mount_path
+
+
+# Пробелы и другие спецсимволы в mountinfo записаны восьмеричными кодами; остальные символы не меняются
+def test_unescape_mount_path():
+    assert _unescape_mount_path("/media/user/MY\\040DISK") == "/media/user/MY DISK"
+    assert _unescape_mount_path("/media/user/Флешка\\011new") == "/media/user/Флешка\tnew"
+
+
+def test_read_mounts(tmp_path):
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(
+        "22 1 8:2 / / rw,relatime shared:1 - ext4 /dev/sda2 rw\n"
+        "95 22 8:17 / /media/user/MY\\040DISK rw,nosuid shared:50 - vfat /dev/sdb1 rw,uid=1000\n"
+        "96 22 0:45 / /run/user rw - tmpfs tmpfs rw\n"
+        "поломанная строка\n",
+        encoding="utf-8",
+    )
+    assert read_mounts(str(mountinfo)) == {
+        "/": "/dev/sda2",
+        "/media/user/MY DISK": "/dev/sdb1",
+        "/run/user": "tmpfs",
+    }
+
+
+# Признак removable раздела берётся у родительского диска
+def test_is_removable_device(tmp_path):
+    devices = tmp_path / "devices"
+    for disk, removable in (("sdb", "1"), ("sda", "0")):
+        (devices / disk / f"{disk}1").mkdir(parents=True)
+        (devices / disk / "removable").write_text(removable + "\n")
+    block = tmp_path / "block"
+    block.mkdir()
+    for disk in ("sda", "sdb"):
+        os.symlink(devices / disk, block / disk)
+        os.symlink(devices / disk / f"{disk}1", block / f"{disk}1")
+
+    assert is_removable_device("/dev/sdb1", str(block))
+    assert is_removable_device("/dev/sdb", str(block))
+    assert not is_removable_device("/dev/sda1", str(block))
+    assert not is_removable_device("/dev/sdc1", str(block))
+
+
+# Ошибка резервирования на одну флешку не останавливает наблюдение
+def test_run_survives_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(mount_watcher, "iter_new_removable_mounts", lambda: iter([["/media/a"], ["/media/b"]]))
+    monkeypatch.setattr(mount_watcher, "select_targets", lambda mount_points: mount_points)
+    attempts = []
+
+    def backup_to_targets(targets):
+        attempts.append(targets)
+        if targets == ["/media/a"]:
+            raise ValueError("повреждённый манифест")
+
+    with BackupWatcher(str(tmp_path)) as watcher:
+        monkeypatch.setattr(watcher, "backup_to_targets", backup_to_targets)
+        watcher.run()
+    assert attempts == [["/media/a"], ["/media/b"]]
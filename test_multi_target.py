@@ -0,0 +1,108 @@
+import os
+import copy_scheduler
+from copy_scheduler import CopyScheduler
+from metadata_store import MetadataStore
+from multi_target import target_entries, store_target_entries, TARGETS_FIELD
+import backupFilesToFlashDrive
+from backupFilesToFlashDrive import apply_target_choices, make_plan, commit_targets
+from change_recorder import stick_id
+from hash_cache import HashCache
+
+
+# Источник читается один раз и записывается во все назначения, даже на одном устройстве
+def test_fanout_reads_source_once(tmp_path, monkeypatch):
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    source = tmp_path / "source.bin"
+    source.write_bytes(data)
+    reads = []
+
+    def counting_blocks(file_path, block_size=64 * 1024):
+        reads.append(file_path)
+        with open(file_path, "rb") as f:
+            yield from iter(lambda: f.read(block_size), b"")
+
+    monkeypatch.setattr(copy_scheduler, "iter_file_blocks", counting_blocks)
+    targets = [str(tmp_path / name / "source.bin") for name in ("flash1", "flash2", "flash3")]
+    results = list(CopyScheduler().run_fanout([("source", str(source), targets)]))
+
+    assert reads == [str(source)]
+    assert [(target, error) for target, _, error in results[0][1]] == [(target, None) for target in targets]
+    assert all(open(target, "rb").read() == data for target in targets)
+
+
+# Сведения о копиях хранятся для каждой флешки отдельно
+def test_per_target_metadata(tmp_path):
+    sources = []
+    for name in ("a.txt", "b.txt"):
+        path = tmp_path / name
+        path.write_text(name * 100)
+        sources.append(path)
+    flashes = [tmp_path / "flash1", tmp_path / "flash2"]
+    for flash in flashes:
+        flash.mkdir()
+    store = MetadataStore(str(tmp_path / "metadata.db"))
+    store.add_entries([{"Name": path.name, "From": str(path), "To": path.name} for path in sources])
+    metadata = store.entries()
+    local_cache = HashCache(str(tmp_path / "hash_cache.json"))
+
+    # На первую флешку копируются обе записи, на вторую — только первая
+    apply_target_choices(store, metadata, {str(flashes[0]): ["1", "2"], str(flashes[1]): ["1"]}, local_cache)
+    assert (flashes[1] / "a.txt").read_text() == "a.txt" * 100
+    assert not (flashes[1] / "b.txt").exists()
+
+    saved = store.entries()
+    first, second = (stick_id(str(flash)) for flash in flashes)
+    assert set(saved[0][TARGETS_FIELD]) == {first, second}
+    assert set(saved[1][TARGETS_FIELD]) == {first}
+
+    # Вторая флешка видит, что второй записи на ней нет, первая — что всё актуально
+    statuses = [item["status"] for item in make_plan(saved, str(flashes[1]), store=store)["items"]]
+    assert statuses == ["актуален", "отсутствует"]
+    statuses = [item["status"] for item in make_plan(saved, str(flashes[0]), store=store)["items"]]
+    assert statuses == ["актуален", "актуален"]
+
+    # Проверка одной флешки не меняет сведения о другой
+    entries = target_entries(saved, first)
+    entries[0]["Verified"] = "2000-01-01 00:00:00"
+    assert store_target_entries(saved, [(first, entries)]) == [saved[0]]
+    assert saved[0][TARGETS_FIELD][second].get("Verified") != "2000-01-01 00:00:00"
+
+
+# Позиция журнала не сдвигается у флешки, на которую копирование завершилось с ошибкой
+def test_failed_target_keeps_journal_position(tmp_path, monkeypatch):
+    source = tmp_path / "a.txt"
+    source.write_text("a" * 100)
+    flashes = [tmp_path / "flash1", tmp_path / "flash2"]
+    for flash in flashes:
+        flash.mkdir()
+    (flashes[1] / "a.txt").mkdir()  # Копию на вторую флешку записать нельзя
+    store = MetadataStore(str(tmp_path / "metadata.db"))
+    store.add_entries([{"Name": "a.txt", "From": str(source), "To": "a.txt"}])
+    failed = set()
+    apply_target_choices(store, store.entries(), {str(flash): ["1"] for flash in flashes},
+                         HashCache(str(tmp_path / "hash_cache.json")), failed)
+    assert failed == {str(flashes[1])}
+
+    committed = []
+    monkeypatch.setattr(backupFilesToFlashDrive, "commit_changes",
+                        lambda base_dir, consumer, token: committed.append(consumer))
+    plan = {"items": [{"index": 1, "action": "add"}]}
+    checked = [(str(flash), plan, f"metadata:{flash.name}", 1) for flash in flashes]
+    commit_targets(str(tmp_path), checked, [plan["items"], plan["items"]], failed)
+    assert committed == ["metadata:flash1"]
+
+
+# Запись metadata.txt не копируется и не получает хэш устаревшего (или отсутствующего) файла
+def test_metadata_entry_left_untouched(tmp_path):
+    source = tmp_path / "a.txt"
+    source.write_text("data")
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    store = MetadataStore(str(tmp_path / "metadata.db"))
+    store.add_entries([{"Name": "metadata.txt", "To": "metadata.txt", "Backup": "never"},
+                       {"Name": "a.txt", "From": str(source), "To": "a.txt"}])
+    apply_target_choices(store, store.entries(), {str(flash): ["*"]}, HashCache(str(tmp_path / "hash_cache.json")))
+
+    saved = store.entries()
+    assert saved[0] == {"Name": "metadata.txt", "To": "metadata.txt", "Backup": "never"}
+    assert (flash / "a.txt").read_text() == "data"
@@ -0,0 +1,66 @@
+import os
+import backupFilesToFlashDrive
+from packs import PackStore, PACK_DIR, pack_reference
+from metadata_store import MetadataStore
+from backupFilesToFlashDrive import apply_target_choices, make_plan
+from hash_cache import HashCache
+
+
+# Файлы дописываются в пакет, читаются и проверяются по хэшу; пакет с мусором пересобирается
+def test_pack_add_verify_repack(tmp_path):
+    sources = {}
+    for name in ("a.txt", "b.txt"):
+        sources[name] = tmp_path / name
+        sources[name].write_bytes(name.encode() * 1000)
+    flash = tmp_path / "flash"
+    store = PackStore(str(flash))
+    for name, path in sources.items():
+        store.add(name, str(path))
+    store.save()
+
+    store = PackStore(str(flash))
+    assert store.read("b.txt") == b"b.txt" * 1000
+    assert store.verify("a.txt")
+    store.extract("b.txt", str(tmp_path / "restored" / "b.txt"))
+    assert (tmp_path / "restored" / "b.txt").read_bytes() == b"b.txt" * 1000
+    # Новая версия файла и удалённый файл становятся мусором, и пакет пересобирается
+    sources["a.txt"].write_bytes(b"new" * 300)
+    store.add("a.txt", str(sources["a.txt"]))
+    store.discard("b.txt")
+    assert store.repack() == 1
+    store = PackStore(str(flash))
+    assert store.read("a.txt") == b"new" * 300
+    assert "b.txt" not in store and store.verify("a.txt")
+    assert len(os.listdir(flash / PACK_DIR)) == 2  # Один пакет и индекс
+
+
+# Мелкие файлы записей и папок хранятся в пакетах, и проверка флешки видит их актуальными
+def test_backup_packs_small_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(backupFilesToFlashDrive, "PACK_SMALL_FILES", True)
+    source_file = tmp_path / "note.txt"
+    source_file.write_text("заметка")
+    source_dir = tmp_path / "docs"
+    source_dir.mkdir()
+    for number in range(5):
+        (source_dir / f"{number}.txt").write_text(str(number) * 100)
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    store = MetadataStore(str(tmp_path / "metadata.db"))
+    store.add_entries([{"Name": "note.txt", "From": str(source_file), "To": "note.txt"},
+                       {"Name": "docs", "From": str(source_dir), "To": "docs"}])
+    metadata = store.entries()
+    apply_target_choices(store, metadata, {str(flash): ["1", "2"]},
+                         HashCache(str(tmp_path / "hash_cache.json")))
+
+    saved = store.entries()
+    assert saved[0]["To"] == pack_reference("note.txt")
+    assert not (flash / "note.txt").exists() and not (flash / "docs").exists()
+    assert os.listdir(flash / PACK_DIR)
+    statuses = [item["status"] for item in make_plan(saved, str(flash), store=store)["items"]]
+    assert statuses == ["актуален", "актуален"]
+
+    (source_dir / "3.txt").write_text("изменён")
+    os.utime(source_dir / "3.txt", ns=(0, 2 ** 62))
+    plan = make_plan(saved, str(flash), store=store)
+    assert plan["items"][1]["status"] == "неактуален (файлов: 1)"
+    assert plan["items"][1]["bytes"] == len("изменён".encode())
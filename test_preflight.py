@@ -0,0 +1,36 @@
+import time
+from preflight import select_fitting, recency_weight
+
+MB = 1024 * 1024
+
+
+def _item(name, size, priority=1, replaced=0, modified=None):
+    return {"name": name, "bytes": size, "replaced": replaced, "priority": priority, "modified": modified}
+
+
+# Если всё помещается, выбираются все записи; замена копии учитывает освобождаемое место
+def test_everything_fits_with_replacements():
+    items = [_item("a", 5 * MB, replaced=4 * MB), _item("b", 2 * MB)]
+    assert select_fitting(items, 3 * MB) == items
+    # Обе записи равноценны: выбирается та, что занимает меньше места
+    assert select_fitting(items, 2 * MB) == [items[0]]
+
+
+# При нехватке места выбирается самый ценный набор по приоритету, свежести и размеру
+def test_knapsack_prefers_value():
+    now = time.time()
+    items = [
+        _item("big", 8 * MB, modified=now),
+        _item("small1", 4 * MB, modified=now),
+        _item("small2", 4 * MB, modified=now),
+        _item("critical", 6 * MB, priority=10, modified=now - 365 * 86400),
+        _item("shrinks", 1 * MB, replaced=3 * MB),
+    ]
+    # Старая критичная запись весит меньше, чем две свежие обычные
+    assert recency_weight(now - 365 * 86400, now) * 10 < 2
+    names = [item["name"] for item in select_fitting(items, 17 * MB // 2, now=now)]
+    assert names == ["small1", "small2", "shrinks"]
+
+    items[3]["modified"] = now
+    names = [item["name"] for item in select_fitting(items, 17 * MB // 2, now=now)]
+    assert names == ["small1", "critical", "shrinks"]
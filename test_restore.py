@@ -0,0 +1,90 @@
+import os
+import backupFilesToFlashDrive
+from metadata_store import MetadataStore
+from backupFilesToFlashDrive import apply_target_choices
+from hash_cache import HashCache
+import restore
+from restore import metadata_items, snapshot_items, restore_items
+from snapshot import create_snapshot
+
+
+def _backup(tmp_path, monkeypatch):
+    """Копирует на флешку обычный файл, сжимаемый файл, мелкий файл в пакете и папку."""
+    monkeypatch.setattr(backupFilesToFlashDrive, "COMPRESS_COPIES", True)
+    monkeypatch.setattr(backupFilesToFlashDrive, "PACK_SMALL_FILES", True)
+    source = tmp_path / "source"
+    (source / "docs").mkdir(parents=True)
+    files = {
+        "big.bin": os.urandom(300 * 1024),
+        "text.txt": b"compressible line\n" * 50000,
+        "small.txt": b"small",
+        "docs/a.txt": b"a" * 10,
+        "docs/b.bin": os.urandom(400 * 1024),
+    }
+    for name, data in files.items():
+        (source / name).write_bytes(data)
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    store = MetadataStore(str(tmp_path / "metadata.db"))
+    store.add_entries([{"Name": name, "From": str(source / name), "To": name}
+                       for name in ("big.bin", "text.txt", "small.txt", "docs")])
+    apply_target_choices(store, store.entries(), {str(flash): ["*"]},
+                         HashCache(str(tmp_path / "hash_cache.json")))
+    return source, flash, store, files
+
+
+# Восстанавливаются все виды копий; совпадающие локальные файлы не перезаписываются, повреждённые копии не применяются
+def test_restore_metadata_entries(tmp_path, monkeypatch):
+    source, flash, store, files = _backup(tmp_path, monkeypatch)
+    assert (flash / "text.txt.gz").exists()
+
+    target_root = tmp_path / "restored"
+    items = metadata_items(store.entries(), str(flash), target_root=str(target_root))
+    assert restore_items(items, str(flash)) == (5, 0)
+    assert all((target_root / name).read_bytes() == data for name, data in files.items())
+
+    # Всё уже на месте: восстанавливать нечего
+    assert restore_items(metadata_items(store.entries(), str(flash), target_root=str(target_root)), str(flash)) == (0, 0)
+
+    # Локальный файл, изменённый после копирования, не перезаписывается без force
+    (source / "big.bin").write_bytes(b"edited")
+    os.utime(source / "big.bin", (2 ** 31, 2 ** 31))
+    assert restore_items(metadata_items(store.entries(), str(flash), ["big.bin"]), str(flash)) == (0, 0)
+    assert (source / "big.bin").read_bytes() == b"edited"
+
+    # Испорченная копия не применяется даже с force
+    corrupted = bytearray((flash / "big.bin").read_bytes())
+    corrupted[0] ^= 0xFF
+    (flash / "big.bin").write_bytes(bytes(corrupted))
+    assert restore_items(metadata_items(store.entries(), str(flash), ["big.bin"]), str(flash), force=True) == (0, 1)
+    assert (source / "big.bin").read_bytes() == b"edited"
+    (flash / "big.bin").write_bytes(files["big.bin"])
+    assert restore_items(metadata_items(store.entries(), str(flash), ["big.bin"]), str(flash), force=True) == (1, 0)
+    assert (source / "big.bin").read_bytes() == files["big.bin"]
+
+
+# Копии без известного хэша восстанавливаются, но учитываются как непроверенные
+def test_restore_reports_unverified(tmp_path, monkeypatch):
+    source, flash, store, files = _backup(tmp_path, monkeypatch)
+    os.remove(flash / "manifest.bin")  # Хэши файлов папки неизвестны (как у копий до появления манифеста)
+    items = metadata_items(store.entries(), str(flash), ["docs"], str(tmp_path / "restored"))
+    unverified = []
+    monkeypatch.setattr(restore.run_report, "count",
+                        lambda name, value=1: unverified.append(value) if name == "files_unverified" else None)
+    assert restore_items(items, str(flash)) == (2, 0)
+    assert len(unverified) == 1  # Файл в пакете проверяется по хэшу из индекса пакетов
+
+
+# Снимок восстанавливается целиком в указанную папку
+def test_restore_snapshot(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "a.txt").write_text("первая версия")
+    flash = tmp_path / "flash"
+    flash.mkdir()
+    create_snapshot([{"Name": "a.txt", "From": str(source / "a.txt")}], str(flash))
+    (source / "a.txt").write_text("испорчено")
+    os.utime(source / "a.txt", (0, 0))  # Изменён раньше снимка
+
+    assert restore_items(snapshot_items(str(flash)), str(flash)) == (1, 0)
+    assert (source / "a.txt").read_text() == "первая версия"
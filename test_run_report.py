@@ -0,0 +1,33 @@
+import os
+import json
+import run_report
+import auto_backup
+
+
+# Отчёт запуска: этапы, счётчики, байты по устройствам и самые медленные файлы
+def test_report_saved(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_report, "SLOWEST_FILES", 2)
+    run_report.start_run("test")
+    with run_report.phase("copy"):
+        for index, seconds in enumerate((0.5, 2.0, 1.0)):
+            run_report.record_file(f"file{index}", "copy", seconds, bytes_read=100, bytes_written=50,
+                                   read_device="C:", write_device="E:")
+    run_report.count("files_copied", 3)
+    report_path = run_report.finish_run(str(tmp_path))
+
+    assert not run_report.enabled()
+    assert os.path.dirname(report_path) == str(tmp_path / run_report.REPORTS_DIR)
+    with open(report_path, encoding="utf-8") as file:
+        report = json.load(file)
+    assert report["engine"] == "test" and "copy" in report["phases"]
+    assert report["counters"] == {"files_copied": 3, "bytes_read": 300, "bytes_written": 150}
+    assert report["devices"]["E:"]["bytes_written"] == 150 and report["devices"]["E:"]["seconds"] == 3.5
+    assert [item["path"] for item in report["slowest_files"]["copy"]] == ["file1", "file2"]
+
+
+# Отчёт auto_backup сохраняется в папке программы с backup_info.txt, а не рядом со скриптом
+def test_auto_backup_report_in_backup_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("AUTOMATIC_BACKUP_TO_FLASH_DRIVE", str(tmp_path))
+    monkeypatch.setattr(auto_backup, "auto_backup", lambda: None)
+    auto_backup.main()
+    assert len(os.listdir(tmp_path / run_report.REPORTS_DIR)) == 1
@@ -0,0 +1,52 @@
+import os
+from datetime import datetime
+import snapshot
+from snapshot import create_snapshot, list_snapshots, load_manifest, apply_retention, object_path
+
+
+class _FixedTime(datetime):
+    moment = datetime(2026, 1, 15, 18, 0, 0)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.moment
+
+
+def _snapshot_at(monkeypatch, metadata, flash, moment):
+    monkeypatch.setattr(_FixedTime, "moment", moment)
+    return create_snapshot(metadata, str(flash), "sha256")
+
+
+# Второй снимок за ту же секунду не заменяет первый
+def test_snapshots_in_same_second(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "datetime", _FixedTime)
+    source, flash = tmp_path / "a.txt", tmp_path / "flash"
+    metadata = [{"Name": "a.txt", "From": str(source)}]
+    source.write_text("first")
+    first = _snapshot_at(monkeypatch, metadata, flash, datetime(2026, 1, 15, 18, 0, 0))
+    source.write_text("second")
+    second = _snapshot_at(monkeypatch, metadata, flash, datetime(2026, 1, 15, 18, 0, 0))
+
+    assert first != second
+    assert [path for _, path in list_snapshots(str(flash))] == [first, second]
+    assert load_manifest(first)["files"] != load_manifest(second)["files"]
+
+
+# Хранятся последние снимки по дням и неделям; объекты удалённых снимков удаляются
+def test_apply_retention(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "datetime", _FixedTime)
+    source, flash = tmp_path / "a.txt", tmp_path / "flash"
+    metadata = [{"Name": "a.txt", "From": str(source)}]
+    moments = [datetime(2026, 1, 1, 10), datetime(2026, 1, 10, 10),  # Недели 1 и 2
+               datetime(2026, 1, 15, 9), datetime(2026, 1, 15, 18)]  # Один день недели 3
+    manifests = []
+    for version, moment in enumerate(moments):
+        source.write_text(f"version {version}")
+        manifests.append(_snapshot_at(monkeypatch, metadata, flash, moment))
+    hashes = [load_manifest(path)["files"]["a.txt"]["Hash"] for path in manifests]
+
+    apply_retention(str(flash), keep_daily=1, keep_weekly=2)
+
+    assert [path for _, path in list_snapshots(str(flash))] == [manifests[1], manifests[3]]
+    assert [os.path.exists(object_path(str(flash), file_hash)) for file_hash in hashes] == \
+        [False, True, False, True]
@@ -0,0 +1,31 @@
+import os
+from verify import quick_fingerprint, quick_matches, select_full_rotation, mark_verified, TIER_FULL
+
+
+# Быстрая проверка замечает изменения в начале, в конце файла и изменение размера
+def test_quick_fingerprint_detects_changes(tmp_path):
+    data = bytearray(os.urandom(2 * 1024 * 1024))
+    copy = tmp_path / "copy.bin"
+    copy.write_bytes(data)
+    entry = {"Name": "copy.bin"}
+    mark_verified(entry, TIER_FULL, str(copy))
+    assert quick_matches(entry, str(copy))
+
+    for position in (0, len(data) - 1):
+        changed = bytearray(data)
+        changed[position] ^= 1
+        copy.write_bytes(changed)
+        assert not quick_matches(entry, str(copy))
+
+    copy.write_bytes(data + b"x")
+    assert not quick_matches(entry, str(copy))
+    assert quick_fingerprint(str(copy)) != entry["QuickPrint"]
+
+
+# Полностью проверяются записи, которые дольше всех не проверялись полностью
+def test_full_rotation_prefers_oldest():
+    entries = [{"Name": str(index), "FullVerified": f"2026-01-{index + 10:02d} 00:00:00"} for index in range(19)]
+    entries.append({"Name": "never"})
+
+    selected = select_full_rotation(entries, runs=10)
+    assert [entry["Name"] for entry in selected] == ["never", "0"]
@@ -0,0 +1,88 @@
+"""
+Многоуровневая проверка копий на флешке.
+
+Быстрый уровень сравнивает размер и хэш нескольких участков файла: начала, конца и нескольких блоков
+в псевдослучайных местах (места зависят только от размера файла, поэтому одинаковы при копировании и проверке).
+Решение принимается за несколько операций чтения независимо от размера файла.
+
+Полный уровень — хэш всего файла. Он выполняется по требованию или по очереди для части записей
+при каждом запуске, так что со временем каждая копия проверяется целиком.
+
+В записи метаданных сохраняются:
+    QuickPrint    — отпечаток копии для быстрой проверки
+    VerifiedTier  — уровень последней успешной проверки (quick или full)
+    Verified      — время последней успешной проверки
+    FullVerified  — время последней полной проверки
+"""
+import os
+import math
+import random
+import hashlib
+from datetime import datetime
+
+TIER_QUICK = "quick"
+TIER_FULL = "full"
+QUICK_BLOCK_SIZE = 64 * 1024  # Размер проверяемого участка
+QUICK_SAMPLES = 4  # Число псевдослучайных участков помимо начала и конца
+FULL_ROTATION_RUNS = 10  # За столько запусков каждая запись проверяется полностью хотя бы раз
+
+
+def _sample_offsets(size, block_size=QUICK_BLOCK_SIZE, samples=QUICK_SAMPLES):
+    """Смещения проверяемых участков: начало, конец и псевдослучайные блоки (зависят только от размера)."""
+    if size <= block_size * (samples + 2):
+        return [0]  # Маленький файл проверяется целиком одним участком
+    last_block = (size - 1) // block_size
+    rng = random.Random(size)
+    middle = sorted(rng.sample(range(1, last_block), min(samples, last_block - 1)))
+    return [0] + [index * block_size for index in middle] + [size - block_size]
+
+
+def quick_fingerprint(file_path, block_size=QUICK_BLOCK_SIZE, samples=QUICK_SAMPLES):
+    """Отпечаток файла: размер и хэш выбранных участков."""
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        hasher = hashlib.blake2b(digest_size=16)
+        offsets = _sample_offsets(size, block_size, samples)
+        for offset in offsets:
+            f.seek(offset)
+            hasher.update(f.read(block_size if len(offsets) > 1 else size))
+    return f"q:{size}:{hasher.hexdigest()}"
+
+
+def quick_matches(entry, file_path):
+    """Быстрая проверка копии по сохранённому отпечатку."""
+    stored = entry.get("QuickPrint")
+    if not stored:
+        return False
+    # Разный размер виден без чтения файла
+    if stored.split(":")[1] != str(os.path.getsize(file_path)):
+        return False
+    return quick_fingerprint(file_path) == stored
+
+
+def can_verify_quick(entry):
+    """Быстрая проверка возможна для несжатых копий с сохранённым отпечатком."""
+    return bool(entry.get("QuickPrint")) and not entry.get("Codec")
+
+
+def select_full_rotation(entries, runs=FULL_ROTATION_RUNS):
+    """
+    Записи для полной проверки в этом запуске: дольше всех не проверявшиеся полностью,
+    не меньше 1/runs от числа записей.
+    """
+    if not entries:
+        return []
+    count = math.ceil(len(entries) / runs)
+    # Записи без полной проверки идут первыми (пустая строка меньше любой даты)
+    return sorted(entries, key=lambda entry: entry.get("FullVerified") or "")[:count]
+
+
+def mark_verified(entry, tier, file_path=None):
+    """Запоминает уровень и время проверки; после полной проверки сохраняет отпечаток для быстрых проверок."""
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    entry["VerifiedTier"] = tier
+    entry["Verified"] = now
+    if tier == TIER_FULL:
+        entry["FullVerified"] = now
+        if file_path and not entry.get("Codec"):
+            entry["QuickPrint"] = quick_fingerprint(file_path)